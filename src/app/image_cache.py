@@ -0,0 +1,224 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtGui import QPixmap
+from app_config import app_config, APP_ROOT
+from app_db.image_utils import hash_image
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_DIR = os.path.join(APP_ROOT, 'image_cache')
+
+
+class ImageCache:
+    """
+    Decoded and pre-scaled pixmaps, shared by the widgets that show item images and avatars,
+    so an image BLOB is decoded and smooth-scaled once instead of on every reload or repaint.
+
+    Entries are keyed by an owner key (e.g. 'item:12', 'user:3'), the image's content hash and
+    the target size, so a changed image or another size never returns a stale pixmap and nothing
+    has to be invalidated. Pixmaps are kept in an in-memory LRU limited to `UI.image_cache_mb`.
+    Fixed-size images (card thumbnails, avatars) can also be persisted as small PNGs under
+    APP_ROOT/image_cache (`UI.image_disk_cache_enabled`), so the next start does not decode the
+    original BLOBs again. Writing a new image for an owner key removes that key's files for older
+    images, and the directory is trimmed to `UI.image_disk_cache_mb`, oldest files first.
+
+    QPixmap is GUI-thread only, so the cache must only be used from the GUI thread.
+    """
+
+    def __init__(self, max_bytes: int | None = None, disk_cache_dir: str | None = None, max_disk_bytes: int | None = None):
+        if max_bytes is None:
+            max_bytes = app_config.getint('UI', 'image_cache_mb', fallback=64) * 1024 * 1024
+        if max_disk_bytes is None:
+            max_disk_bytes = app_config.getint('UI', 'image_disk_cache_mb', fallback=100) * 1024 * 1024
+        if disk_cache_dir is None and app_config.get('UI', 'image_disk_cache_enabled', 'True').lower() == 'true':
+            disk_cache_dir = DISK_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.disk_cache_dir = disk_cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        # Files in the disk cache, {owner key prefix: {file name: size}}, read from the directory on
+        # the first write and kept current afterwards, so a write never has to list the directory.
+        self._disk_index: dict[str, dict[str, int]] | None = None
+        self._disk_bytes = 0
+        self._entries: OrderedDict[tuple, QPixmap] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def pixmap(self, key: str, image_data: bytes | None, size: QSize, content_hash: str | None = None,
+               device_pixel_ratio: float = 1.0, mode=Qt.AspectRatioMode.KeepAspectRatio, persist: bool = False) -> QPixmap:
+        """
+        Returns `image_data` decoded and scaled to `size` (device-independent pixels) with `mode`.
+        Returns a null QPixmap if there is no data or it can't be decoded.
+
+        `content_hash` is computed from the data if the caller doesn't have it (e.g. items.image_hash).
+        `persist` also stores the scaled image on disk; only use it for fixed sizes, not for
+        labels that follow the window size.
+        """
+        if not image_data:
+            return QPixmap()
+        cache_key = (key, content_hash or hash_image(image_data), size.width(), size.height(),
+                     round(device_pixel_ratio, 2), mode.value)
+        pixmap = self._entries.get(cache_key)
+        if pixmap is not None:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return pixmap
+
+        self.misses += 1
+        pixmap = self._load_from_disk(cache_key, device_pixel_ratio) if persist else None
+        if pixmap is None:
+            pixmap = QPixmap()
+            if not pixmap.loadFromData(bytes(image_data)):
+                return QPixmap()
+            target = QSize(round(size.width() * device_pixel_ratio), round(size.height() * device_pixel_ratio))
+            pixmap = pixmap.scaled(target, mode, Qt.TransformationMode.SmoothTransformation)
+            pixmap.setDevicePixelRatio(device_pixel_ratio)
+            if persist:
+                self._save_to_disk(cache_key, pixmap)
+        self._insert(cache_key, pixmap)
+        return pixmap
+
+    def clear(self, disk: bool = False):
+        """Drops all cached pixmaps, and with `disk` also the on-disk thumbnails."""
+        self._entries.clear()
+        self._bytes = 0
+        if disk and self.disk_cache_dir and os.path.isdir(self.disk_cache_dir):
+            for filename in os.listdir(self.disk_cache_dir):
+                if filename.endswith('.png'):
+                    try:
+                        os.remove(os.path.join(self.disk_cache_dir, filename))
+                    except OSError as e:
+                        logger.warning(f"Could not remove cached image {filename}: {e}")
+            self._disk_index = None
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+    def _insert(self, cache_key: tuple, pixmap: QPixmap):
+        cost = self._cost(pixmap)
+        if cost > self.max_bytes:
+            return # Larger than the whole budget; don't evict everything else for it
+        self._entries[cache_key] = pixmap
+        self._bytes += cost
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._cost(evicted)
+
+    @staticmethod
+    def _cost(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    @staticmethod
+    def _disk_prefix(key: str) -> str:
+        """File name prefix shared by every cached image of an owner key."""
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '-'
+
+    def _disk_path(self, cache_key: tuple) -> str:
+        # '<owner key>-<content hash>-<size/ratio/mode>.png', so older images of a key can be found by name.
+        key, content_hash, *variant = cache_key
+        filename = (self._disk_prefix(key) + hashlib.sha1(content_hash.encode('utf-8')).hexdigest()[:16] + '-'
+                    + hashlib.sha1(repr(variant).encode('utf-8')).hexdigest()[:16] + '.png')
+        return os.path.join(self.disk_cache_dir, filename)
+
+    def _load_from_disk(self, cache_key: tuple, device_pixel_ratio: float) -> QPixmap | None:
+        if not self.disk_cache_dir:
+            return None
+        path = self._disk_path(cache_key)
+        if not os.path.exists(path):
+            return None
+        pixmap = QPixmap()
+        if not pixmap.load(path):
+            return None
+        try:
+            os.utime(path) # Mark as recently used, so trimming removes it last
+        except OSError:
+            pass
+        pixmap.setDevicePixelRatio(device_pixel_ratio)
+        return pixmap
+
+    def _save_to_disk(self, cache_key: tuple, pixmap: QPixmap):
+        if not self.disk_cache_dir:
+            return
+        try:
+            os.makedirs(self.disk_cache_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Disabling the image disk cache, cannot create {self.disk_cache_dir}: {e}")
+            self.disk_cache_dir = None
+            return
+        path = self._disk_path(cache_key)
+        if not pixmap.save(path, 'PNG'):
+            logger.warning(f"Could not write cached image for {cache_key[0]} to {self.disk_cache_dir}.")
+            return
+        if self._disk_index is None:
+            self._load_disk_index()
+        filename = os.path.basename(path)
+        prefix = self._name_prefix(filename)
+        files = self._disk_index.setdefault(prefix, {})
+        # Older images of the same owner key are stale; other sizes of this image stay.
+        current = filename[:filename.rindex('-') + 1] # owner key + content hash
+        for name in [name for name in files if not name.startswith(current)]:
+            self._remove_file(name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        self._disk_bytes += size - files.get(filename, 0)
+        files[filename] = size
+        if self._disk_bytes > self.max_disk_bytes:
+            self._trim_disk_cache()
+
+    @staticmethod
+    def _name_prefix(filename: str) -> str:
+        """Owner key part of a cache file name ('' for files written before names carried it)."""
+        return filename[:filename.index('-') + 1] if '-' in filename else ''
+
+    def _disk_files(self) -> list:
+        """Returns (file name, size, mtime) for every cached PNG."""
+        files = []
+        for entry in os.scandir(self.disk_cache_dir):
+            if entry.name.endswith('.png'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.name, stat.st_size, stat.st_mtime))
+        return files
+
+    def _load_disk_index(self, files: list | None = None):
+        """(Re)builds the in-memory index of the disk cache from a directory listing."""
+        self._disk_index = {}
+        self._disk_bytes = 0
+        for name, size, _ in (self._disk_files() if files is None else files):
+            self._disk_index.setdefault(self._name_prefix(name), {})[name] = size
+            self._disk_bytes += size
+
+    def _remove_file(self, filename: str):
+        try:
+            os.remove(os.path.join(self.disk_cache_dir, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove cached image {filename}: {e}")
+            return
+        files = self._disk_index.get(self._name_prefix(filename), {})
+        self._disk_bytes -= files.pop(filename, 0)
+
+    def _trim_disk_cache(self):
+        """
+        Removes the least recently used files until the directory is below 90% of max_disk_bytes.
+        This lists the directory for the files' access times, but only runs once per 10% of the cap written.
+        """
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        self._load_disk_index(files)
+        target = self.max_disk_bytes * 0.9
+        for name, _, _ in files:
+            if self._disk_bytes <= target:
+                break
+            self._remove_file(name)
+
+# Shared cache for the GUI. Use from the GUI thread only.
+image_cache = ImageCache()
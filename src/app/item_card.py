@@ -1,17 +1,20 @@
+import time
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel
-from PyQt6.QtGui import QPixmap, QPainter, QColor, QIcon, QLinearGradient, QPainterPath, QPen, QPainterPath
+from PyQt6.QtGui import QPixmap, QPainter, QColor, QIcon, QLinearGradient, QPainterPath, QPen
 from PyQt6.QtWidgets import QStyleOption, QStyle, QGraphicsDropShadowEffect
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QDateTime, QPropertyAnimation, QEasingCurve, QPoint, QParallelAnimationGroup, QRectF, QPointF, QEvent
-from app_config import app_config
-from .utils import set_image_on_label
+from PyQt6.QtCore import Qt, pyqtSignal, QPropertyAnimation, QEasingCurve, QPoint, QParallelAnimationGroup, QRectF, QPointF, QEvent
+from .image_cache import image_cache
+from .rental_ticker import rental_ticker, rent_timestamp, format_rental_duration
 class ImageContainer(QWidget):
     """A custom widget to display and clip a pixmap."""
     def __init__(self, pixmap, parent=None):
         super().__init__(parent)
         self.pixmap = pixmap
+        self._scaled = None # (size, pixmap) for pixmaps that were not pre-scaled to this widget
 
     def setPixmap(self, pixmap):
         self.pixmap = pixmap
+        self._scaled = None
         self.update() # Trigger a repaint
 
     def paintEvent(self, event):
@@ -27,12 +30,19 @@ class ImageContainer(QWidget):
         painter.setClipPath(path)
 
         if not self.pixmap.isNull():
-            # Scale the pixmap to fit inside the widget while keeping aspect ratio
-            scaled_pixmap = self.pixmap.scaled(widget_rect.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            # Pixmaps from the image cache already fit and are drawn as they are (no scaling per repaint).
+            scaled_pixmap = self.pixmap
+            pixmap_size = scaled_pixmap.deviceIndependentSize()
+            if pixmap_size.width() > widget_rect.width() or pixmap_size.height() > widget_rect.height():
+                # Scale the pixmap to fit inside the widget while keeping aspect ratio, once per widget size
+                if self._scaled is None or self._scaled[0] != widget_rect.size():
+                    self._scaled = (widget_rect.size(), self.pixmap.scaled(widget_rect.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+                scaled_pixmap = self._scaled[1]
+                pixmap_size = scaled_pixmap.deviceIndependentSize()
             
             # Calculate the top-left position to center the scaled pixmap
-            x = (widget_rect.width() - scaled_pixmap.width()) / 2
-            y = (widget_rect.height() - scaled_pixmap.height()) / 2
+            x = (widget_rect.width() - pixmap_size.width()) / 2
+            y = (widget_rect.height() - pixmap_size.height()) / 2
             
             # Draw the centered and scaled pixmap
             painter.drawPixmap(QPointF(x, y), scaled_pixmap)
@@ -47,7 +57,8 @@ class ItemCard(QWidget):
     def __init__(self, item_data, parent=None):
         super().__init__(parent)
         self.item_id = item_data['id']
-        self.item_data = item_data
+        self.item_data = None
+        self.rent_timestamp = None # rent_date in epoch seconds, parsed once per rent
         self.setFixedSize(200, 280)
         self.setCursor(Qt.CursorShape.PointingHandCursor)
         # This is required for the custom paintEvent to work with stylesheets
@@ -64,16 +75,8 @@ class ItemCard(QWidget):
         image_layout = QHBoxLayout(image_container)
         image_layout.setContentsMargins(0, 10, 0, 5) # เพิ่มระยะห่างบน-ล่าง
         
-        # สร้าง QPixmap จากข้อมูล BLOB
-        pixmap = QPixmap()
-        image_data_blob = item_data.get('image_path')
-        if image_data_blob:
-            pixmap.loadFromData(image_data_blob)
-        
-        # if pixmap.isNull():
-        #     pixmap = QPixmap(180, 180)
-        #     pixmap.fill(Qt.GlobalColor.transparent)
-        self.image_label = ImageContainer(pixmap)
+        # The thumbnail is set by set_item_data() (รูปเต็มจะถูกโหลดเมื่อเปิดหน้ารายละเอียดเท่านั้น)
+        self.image_label = ImageContainer(QPixmap())
         self.image_label.setFixedSize(180, 180)
         
         image_layout.addWidget(self.image_label)
@@ -85,12 +88,12 @@ class ItemCard(QWidget):
         info_layout.setContentsMargins(10, 5, 10, 10)
         info_layout.setSpacing(3)
 
-        self.name_label = QLabel(item_data['name'])
+        self.name_label = QLabel()
         self.name_label.setStyleSheet("font-weight: bold; font-size: 12pt;")
         self.name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.name_label.setWordWrap(True)
 
-        self.brand_label = QLabel(item_data['brand'] or "N/A")
+        self.brand_label = QLabel()
         self.brand_label.setProperty("class", "secondary-text")
         self.brand_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.brand_label.setWordWrap(True)
@@ -100,65 +103,16 @@ class ItemCard(QWidget):
         self.renter_info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.renter_info_label.setWordWrap(True)
         self.renter_info_label.setVisible(False)
-        
-        # --- NEW: Improved Price Display Logic ---
-        price_per_minute = float(item_data.get('price_per_minute', 0.0))
-        price_unit = item_data.get('price_unit', 'ต่อวัน')
-        price_model = item_data.get('price_model', 'per_minute')
-        fixed_fee = float(item_data.get('fixed_fee', 0.0))
-        minimum_charge = float(item_data.get('minimum_charge', 0.0))
-        grace_period_minutes = int(item_data.get('grace_period_minutes', 0))
-
-        # --- Build Main Price Text (for status label) ---
-        main_price_text = ""
-        if (price_model == 'fixed_fee_only' or price_model == 'fixed_plus_overdue') and fixed_fee > 0:
-            main_price_text = f"{fixed_fee:.2f} บ./ครั้ง"
-        
-        if (price_model == 'fixed_plus_overdue' or price_model == 'per_minute') and price_per_minute > 0:
-            prefix = " +ค่าปรับ " if price_model == 'fixed_plus_overdue' and main_price_text else ""
-            if price_unit == "ต่อวัน":
-                main_price_text += f"{prefix}{price_per_minute * 1440:.2f} บ./วัน"
-            elif price_unit == "ต่อชั่วโมง":
-                main_price_text += f"{prefix}{price_per_minute * 60:.2f} บ./ชม."
-            else: # ต่อนาที
-                main_price_text += f"{prefix}{price_per_minute:.2f} บ./นาที"
-
-        # --- FIX: If no price text is generated, check for minimum charge before declaring it "Free" ---
-        if not main_price_text and price_model == 'per_minute' and minimum_charge > 0:
-            main_price_text = f"ขั้นต่ำ {minimum_charge:.2f} บ."
-        elif not main_price_text:
-            main_price_text = "ฟรี"
-
-        # --- Build Price Details Text (for the new label) ---
-        details_parts = []
-        if price_model == 'per_minute' and minimum_charge > 0:
-            details_parts.append(f"ขั้นต่ำ {minimum_charge:.2f} บ.")
-        
-        if price_model == 'fixed_plus_overdue' and grace_period_minutes > 0:
-            grace_text = self._format_grace_period(grace_period_minutes)
-            details_parts.append(f"ได้ไม่เกิน {grace_text}")
-
-        price_details_text = " | ".join(details_parts)
 
-        self.price_details_label = QLabel(price_details_text)
+        self.price_details_label = QLabel()
         self.price_details_label.setObjectName("PriceDetailsLabel")
         self.price_details_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.price_details_label.setWordWrap(True)
-        # Hide if there are no details to show
-        if not price_details_text:
-            self.price_details_label.setVisible(False)
-        # --- END NEW ---
 
-        # --- NEW: Combine Price and Status Display ---
-        status_text = item_data['status'].capitalize()
-        # If the item is available, show the price in the status label.
-        if item_data['status'] == 'available':
-            status_text = main_price_text
-        self.status_label = QLabel(status_text)
+        self.status_label = QLabel()
         self.status_label.setObjectName("status")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.status_label.setWordWrap(True) # Allow text to wrap
-        self.status_label.setProperty("status", item_data['status'])
 
         info_layout.addWidget(self.name_label)
         info_layout.addWidget(self.brand_label)
@@ -170,33 +124,59 @@ class ItemCard(QWidget):
         layout.addWidget(image_container)
         layout.addWidget(info_widget)
 
-        if self.item_data['status'] == 'rented':
+        self.set_item_data(item_data)
+
+    def set_item_data(self, item_data):
+        """
+        Shows (new) data for this card's item. Used when the card is created and when the
+        grid patches an existing card after the item changed, instead of rebuilding it.
+        """
+        previous = self.item_data
+        self.item_data = item_data
+
+        # Only look up the thumbnail again if the image actually changed.
+        if previous is None or previous.get('image_hash') != item_data.get('image_hash'):
+            self.image_label.setPixmap(image_cache.pixmap(
+                f"item:{self.item_id}", item_data.get('thumbnail'), self.image_label.size(),
+                item_data.get('image_hash'), self.image_label.devicePixelRatioF(), persist=True
+            ))
+
+        self.name_label.setText(item_data['name'])
+        self.brand_label.setText(item_data['brand'] or "N/A")
+
+        main_price_text, price_details_text = format_item_price(item_data)
+        self.price_details_label.setText(price_details_text)
+        # Hide if there are no details to show
+        self.price_details_label.setVisible(bool(price_details_text))
+
+        # --- NEW: Combine Price and Status Display ---
+        self.status_label.setText(format_item_status(item_data, main_price_text))
+        if self.status_label.property("status") != item_data['status']:
+            self.status_label.setProperty("status", item_data['status'])
+            # Re-apply the stylesheet rules that depend on the status property
+            self.status_label.style().unpolish(self.status_label)
+            self.status_label.style().polish(self.status_label)
+
+        if item_data['status'] == 'rented':
+            self.rent_timestamp = rent_timestamp(item_data.get('rent_date'))
             self.update_renter_info()
-            self.timer = QTimer(self)
-            self.timer.timeout.connect(self.update_renter_info)
-            self.timer.start(60000)
+            # The shared ticker refreshes the rental duration every minute while the card is on screen.
+            rental_ticker.subscribe(self)
+        else:
+            self.rent_timestamp = None
+            self.renter_info_label.setVisible(False)
+            rental_ticker.unsubscribe(self)
 
-    def update_renter_info(self):
+    def update_renter_info(self, now: float | None = None):
+        if self.rent_timestamp is None:
+            return
         renter = self.item_data.get('renter_username', 'N/A')
-        rent_date = self.item_data.get('rent_date')
-        if rent_date:
-            now = QDateTime.currentDateTime()
-            # The datetime from SQLite is a string, so we must parse it.
-            # The format is 'yyyy-MM-dd HH:mm:ss'. We also specify it's in UTC.
-            rent_datetime = QDateTime.fromString(str(rent_date).split('.')[0], "yyyy-MM-dd HH:mm:ss")
-            rent_datetime.setTimeSpec(Qt.TimeSpec.UTC)
-
-            offset_hours = app_config.getint('TIME', 'utc_offset_hours', fallback=7)
-            offset_seconds = offset_hours * 3600
-            local_rent_datetime = rent_datetime.toOffsetFromUtc(offset_seconds)
-
-            days = local_rent_datetime.daysTo(now)
-            hours = (local_rent_datetime.secsTo(now) // 3600) % 24
-            minutes = (local_rent_datetime.secsTo(now) // 60) % 60
-            
-            duration_str = f"{days}d {hours}h {minutes}m"
-            self.renter_info_label.setText(f"<b>ผู้เช่า-ยืม:</b> {renter or 'N/A'}")
-            self.renter_info_label.setVisible(True)
+        duration_str = format_rental_duration((now or time.time()) - self.rent_timestamp)
+        self.renter_info_label.setText(f"<b>ผู้เช่า-ยืม:</b> {renter or 'N/A'} ({duration_str})")
+        self.renter_info_label.setVisible(True)
+
+    def on_rental_tick(self, now: float):
+        self.update_renter_info(now)
 
     def mousePressEvent(self, event):
         self.clicked.emit(self.item_id)
@@ -210,23 +190,123 @@ class ItemCard(QWidget):
     def mouseDoubleClickEvent(self, event):
         self.doubleClicked.emit(self.item_id)
 
-    def _format_grace_period(self, total_minutes: int) -> str:
-        """Formats total minutes into a human-readable string (days, hours, minutes)."""
-        if total_minutes <= 0:
-            return ""
-        
-        days = total_minutes // 1440
-        hours = (total_minutes % 1440) // 60
-        minutes = total_minutes % 60
-        
-        parts = []
-        if days > 0: parts.append(f"{days}วัน")
-        if hours > 0: parts.append(f"{hours}ชม.")
-        return " ".join(parts) if parts else f"{minutes}นาที"
-
     def paintEvent(self, event):
         # This is necessary to allow stylesheets to work on a custom QWidget.
         opt = QStyleOption()
         opt.initFrom(self)
         painter = QPainter(self)
         self.style().drawPrimitive(QStyle.PrimitiveElement.PE_Widget, opt, painter, self)
+        rental_ticker.catch_up(self) # Refresh the duration if ticks were skipped while off screen
+
+
+def format_grace_period(total_minutes: int) -> str:
+    """Formats total minutes into a human-readable string (days, hours, minutes)."""
+    if total_minutes <= 0:
+        return ""
+
+    days = total_minutes // 1440
+    hours = (total_minutes % 1440) // 60
+    minutes = total_minutes % 60
+
+    parts = []
+    if days > 0: parts.append(f"{days}วัน")
+    if hours > 0: parts.append(f"{hours}ชม.")
+    return " ".join(parts) if parts else f"{minutes}นาที"
+
+
+def format_item_price(item_data) -> tuple[str, str]:
+    """
+    Returns (main price text, price details text) for an item card.
+    The main text is shown in the status badge of available items; the details
+    (minimum charge, grace period) are shown above it and may be empty.
+    """
+    price_per_minute = float(item_data.get('price_per_minute', 0.0))
+    price_unit = item_data.get('price_unit', 'ต่อวัน')
+    price_model = item_data.get('price_model', 'per_minute')
+    fixed_fee = float(item_data.get('fixed_fee', 0.0))
+    minimum_charge = float(item_data.get('minimum_charge', 0.0))
+    grace_period_minutes = int(item_data.get('grace_period_minutes', 0))
+
+    # --- Build Main Price Text (for status label) ---
+    main_price_text = ""
+    if (price_model == 'fixed_fee_only' or price_model == 'fixed_plus_overdue') and fixed_fee > 0:
+        main_price_text = f"{fixed_fee:.2f} บ./ครั้ง"
+
+    if (price_model == 'fixed_plus_overdue' or price_model == 'per_minute') and price_per_minute > 0:
+        prefix = " +ค่าปรับ " if price_model == 'fixed_plus_overdue' and main_price_text else ""
+        if price_unit == "ต่อวัน":
+            main_price_text += f"{prefix}{price_per_minute * 1440:.2f} บ./วัน"
+        elif price_unit == "ต่อชั่วโมง":
+            main_price_text += f"{prefix}{price_per_minute * 60:.2f} บ./ชม."
+        else: # ต่อนาที
+            main_price_text += f"{prefix}{price_per_minute:.2f} บ./นาที"
+
+    # --- FIX: If no price text is generated, check for minimum charge before declaring it "Free" ---
+    if not main_price_text and price_model == 'per_minute' and minimum_charge > 0:
+        main_price_text = f"ขั้นต่ำ {minimum_charge:.2f} บ."
+    elif not main_price_text:
+        main_price_text = "ฟรี"
+
+    # --- Build Price Details Text ---
+    details_parts = []
+    if price_model == 'per_minute' and minimum_charge > 0:
+        details_parts.append(f"ขั้นต่ำ {minimum_charge:.2f} บ.")
+
+    if price_model == 'fixed_plus_overdue' and grace_period_minutes > 0:
+        details_parts.append(f"ได้ไม่เกิน {format_grace_period(grace_period_minutes)}")
+
+    return main_price_text, " | ".join(details_parts)
+
+
+def format_item_status(item_data, main_price_text: str) -> str:
+    """Text of the status badge: the price for available items, otherwise the status itself."""
+    if item_data['status'] == 'available':
+        return main_price_text
+    return item_data['status'].capitalize()
+
+
+def _sort_value_before(a, b, descending: bool) -> bool:
+    """Whether sort value `a` comes before `b` in the catalog order (NULLs last, like the SQL ORDER BY)."""
+    if a is None or b is None:
+        return b is None and a is not None
+    return a > b if descending else a < b
+
+
+def patch_item_list(items: list, changed_rows: list, removed_ids=(), filter_status: str | None = None,
+                    sort_by: str = 'name', sort_order: str = 'ASC') -> list:
+    """
+    Returns `items` (a loaded, sorted catalog list) with `changed_rows` applied and
+    `removed_ids` dropped, so a grid can follow a change to a few items without
+    refetching the whole catalog.
+
+    Changed rows replace their old entry in place. Rows that are new to the list, or
+    whose sort column changed, are moved to their sorted position. Rows that no longer
+    match `filter_status` are dropped.
+    """
+    removed = set(removed_ids)
+    changed_by_id = {row['id']: row for row in changed_rows}
+    result = []
+    to_place = []
+    for item in items:
+        if item['id'] in removed:
+            continue
+        row = changed_by_id.pop(item['id'], None)
+        if row is None:
+            result.append(item)
+        elif filter_status and row['status'] != filter_status:
+            continue
+        elif row.get(sort_by) != item.get(sort_by):
+            to_place.append(row)
+        else:
+            result.append(row)
+    to_place.extend(row for row in changed_by_id.values() if not filter_status or row['status'] == filter_status)
+
+    descending = sort_order.upper() == 'DESC'
+    for row in to_place:
+        value = row.get(sort_by)
+        position = next(
+            (i for i, item in enumerate(result) if _sort_value_before(value, item.get(sort_by), descending)),
+            len(result)
+        )
+        result.insert(position, row)
+    return result
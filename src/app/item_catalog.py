@@ -0,0 +1,219 @@
+import time
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyle, QFrame, QAbstractItemView
+from PyQt6.QtGui import QPixmap, QPainter, QColor, QPainterPath, QPen, QFont, QFontMetrics
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRectF, QPointF, QSize, pyqtSignal
+from theme import theme
+from .item_card import format_item_price, format_item_status
+from .image_cache import image_cache
+from .rental_ticker import rental_ticker, rent_timestamp, format_rental_duration
+
+# Same width and thumbnail as ItemCard; a little taller so brand, renter and price details
+# still fit under the name with the app's (tall) Kanit font.
+CARD_SIZE = QSize(200, 300)
+THUMBNAIL_SIZE = 180
+CARD_RADIUS = 8
+LINE_SPACING = 2
+
+
+class ItemListModel(QAbstractListModel):
+    """
+    List model over catalog rows (dicts as returned by get_all_items()).
+    The whole row is available through ItemRole; the delegate paints the card from it.
+    """
+    ItemRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._items = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._items):
+            return None
+        item = self._items[index.row()]
+        if role == self.ItemRole:
+            return item
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return item['name']
+        return None
+
+    def set_items(self, items: list):
+        """
+        Shows `items`. When the rows are the same items in the same order (e.g. after a
+        status change was patched in), only the rows whose data changed are repainted;
+        otherwise the model is reset.
+        """
+        items = list(items)
+        if [item['id'] for item in items] != [item['id'] for item in self._items]:
+            self.beginResetModel()
+            self._items = items
+            self.endResetModel()
+            return
+        old_items, self._items = self._items, items
+        for row, (old, new) in enumerate(zip(old_items, items)):
+            if old is not new:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+
+class ItemCardDelegate(QStyledItemDelegate):
+    """Paints an item card (thumbnail, name, brand, renter, price and status badge) for ItemListModel rows."""
+
+    def sizeHint(self, option, index):
+        return CARD_SIZE
+
+    def paint(self, painter: QPainter, option, index):
+        item = index.data(ItemListModel.ItemRole)
+        if item is None:
+            return
+        colors = theme.current_colors
+        rect = QRectF(option.rect)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+
+        # --- Card background and border (mirrors the ItemCard stylesheet rules) ---
+        border_color, border_width = colors['disabled_button_bg'], 1
+        if option.state & QStyle.StateFlag.State_Selected:
+            border_color, border_width = colors['highlight'], 2
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            border_color = colors['highlight']
+        painter.setPen(QPen(QColor(border_color), border_width))
+        painter.setBrush(QColor(colors['base']))
+        inset = border_width / 2
+        painter.drawRoundedRect(rect.adjusted(inset, inset, -inset, -inset), CARD_RADIUS, CARD_RADIUS)
+
+        # --- Thumbnail, centered in a rounded 180x180 box ---
+        image_rect = QRectF(rect.x() + (rect.width() - THUMBNAIL_SIZE) / 2, rect.y() + 10, THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        pixmap = self._thumbnail(item, painter.device().devicePixelRatioF())
+        if not pixmap.isNull():
+            painter.save()
+            clip_path = QPainterPath()
+            clip_path.addRoundedRect(image_rect, CARD_RADIUS, CARD_RADIUS)
+            painter.setClipPath(clip_path)
+            size = pixmap.deviceIndependentSize()
+            painter.drawPixmap(QPointF(image_rect.x() + (image_rect.width() - size.width()) / 2,
+                                       image_rect.y() + (image_rect.height() - size.height()) / 2), pixmap)
+            painter.restore()
+
+        # --- Texts: name from the top, status badge and price details from the bottom, ---
+        # --- then brand/renter in between as far as they fit (the renter is kept before the brand) ---
+        text_rect = QRectF(rect.x() + 10, image_rect.bottom() + 6, rect.width() - 20, rect.bottom() - image_rect.bottom() - 14)
+        name_font = QFont(option.font)
+        name_font.setPointSize(12)
+        name_font.setBold(True)
+        small_font = QFont(option.font)
+        small_font.setPointSize(9)
+        y = self._draw_line(painter, text_rect, text_rect.y(), item['name'], name_font, colors['text'])
+
+        main_price_text, price_details_text = format_item_price(item)
+        bottom = self._draw_status_badge(painter, text_rect, option.font, item['status'], format_item_status(item, main_price_text), colors)
+        line_height = QFontMetrics(small_font).height() + LINE_SPACING
+        if price_details_text and bottom - line_height >= y:
+            bottom -= line_height
+            self._draw_line(painter, text_rect, bottom, price_details_text, small_font, colors['text'])
+
+        lines = [(item['brand'] or "N/A", small_font, colors['disabled_text'])]
+        if item['status'] == 'rented':
+            renter_font = QFont(option.font)
+            renter_font.setPointSize(8)
+            renter_text = f"ผู้เช่า-ยืม: {item.get('renter_username') or 'N/A'}"
+            rented_at = rent_timestamp(item.get('rent_date'))
+            if rented_at is not None:
+                renter_text += f" ({format_rental_duration(time.time() - rented_at)})"
+            lines.append((renter_text, renter_font, colors['text']))
+        while lines and y + sum(QFontMetrics(font).height() + LINE_SPACING for _, font, _ in lines) > bottom:
+            lines.pop(0)
+        for text, font, color in lines:
+            y = self._draw_line(painter, text_rect, y, text, font, color)
+        painter.restore()
+
+    @staticmethod
+    def _draw_line(painter, text_rect: QRectF, y: float, text: str, font: QFont, color: str) -> float:
+        """Draws one centered, elided line of text at `y` and returns the y of the next line."""
+        metrics = QFontMetrics(font)
+        painter.setFont(font)
+        painter.setPen(QColor(color))
+        elided = metrics.elidedText(text, Qt.TextElideMode.ElideRight, int(text_rect.width()))
+        painter.drawText(QRectF(text_rect.x(), y, text_rect.width(), metrics.height()), Qt.AlignmentFlag.AlignCenter, elided)
+        return y + metrics.height() + LINE_SPACING
+
+    @staticmethod
+    def _draw_status_badge(painter, text_rect: QRectF, base_font: QFont, status: str, text: str, colors: dict) -> float:
+        """Draws the status badge at the bottom of the card and returns its top y."""
+        badge_colors = {
+            'available': colors['success'],
+            'rented': colors['disabled_text'],
+            'suspended': colors['warning'],
+            'pending': colors['warning'],
+            'pending_return': colors['warning'],
+        }
+        font = QFont(base_font)
+        font.setBold(True)
+        metrics = QFontMetrics(font)
+        text = metrics.elidedText(text, Qt.TextElideMode.ElideRight, int(text_rect.width()) - 16)
+        width = min(text_rect.width(), metrics.horizontalAdvance(text) + 16)
+        height = metrics.height() + 4
+        badge_rect = QRectF(text_rect.center().x() - width / 2, text_rect.bottom() - height, width, height)
+        background = badge_colors.get(status)
+        if background:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(background))
+            painter.drawRoundedRect(badge_rect, 10, 10)
+        painter.setFont(font)
+        painter.setPen(QColor('white') if background else QColor(colors['text']))
+        painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, text)
+        return badge_rect.top()
+
+    @staticmethod
+    def _thumbnail(item: dict, device_pixel_ratio: float) -> QPixmap:
+        """Returns the item's thumbnail scaled to the card (shared with ItemCard through the image cache)."""
+        return image_cache.pixmap(
+            f"item:{item['id']}", item.get('thumbnail'), QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE),
+            item.get('image_hash'), device_pixel_ratio, persist=True
+        )
+
+
+class ItemCatalogView(QListView):
+    """
+    Scrollable, wrapping grid of item cards backed by ItemListModel.
+    Only the visible cards are painted, so the whole catalog can be shown without pagination
+    and a resize only moves cells around instead of creating widgets.
+    """
+    itemDoubleClicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("ItemCatalogView")
+        self.setViewMode(QListView.ViewMode.ListMode)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True) # Every card has the same size, so layout needs no per-item size hints
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setSpacing(8)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(Qt.WidgetAttribute.WA_Hover, True)
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor)
+        self.setItemDelegate(ItemCardDelegate(self))
+        self.doubleClicked.connect(self._on_double_clicked)
+        rental_ticker.subscribe(self)
+
+    def on_rental_tick(self, now: float):
+        # Rental durations are computed while painting; repaint the visible cards.
+        self.viewport().update()
+
+    def _on_double_clicked(self, index):
+        item = index.data(ItemListModel.ItemRole)
+        if item is not None:
+            self.itemDoubleClicked.emit(item['id'])
@@ -10,6 +10,7 @@ from PyQt6.QtCore import Qt, QDateTime, QDate, QTime, QSize, QLocale
 from .base_dialog import BaseDialog
 from app_config import app_config
 from app_db.db_management import get_db_instance, db_signals
+from app_db.db_executor import db_executor
 from theme import PALETTES
 from .rental_history import RentalHistoryDialog
 from .image_viewer import ImageViewerDialog
@@ -231,9 +232,9 @@ class ItemDetailWindow(BaseDialog):
         if not self.item_data:
             return
 
-        # Update Image
-        image_data_blob = self.item_data.get('image_path')
-        set_image_on_label(self.image_label, image_data_blob, "No Image Available")
+        # Update Image (the thumbnail is sharp enough for this panel; the full image is loaded on demand)
+        image_data_blob = self.item_data.get('thumbnail')
+        set_image_on_label(self.image_label, image_data_blob, "No Image Available", f"item:{self.item_id}", self.item_data.get('image_hash'))
 
         # Update General Info
         self.name_label.setText(self.item_data['name'])
@@ -356,7 +357,11 @@ class ItemDetailWindow(BaseDialog):
         reply = CustomMessageBox.show(self, CustomMessageBox.Question, "ยืนยัน", f"คุณ {self.current_user['first_name']}, ต้องการเช่า-ยืมใช่หรือไม่?",
                                       buttons=CustomMessageBox.Yes | CustomMessageBox.No)
         if reply == CustomMessageBox.Yes:
-            self.db_instance.rent_item(self.item_id, self.current_user['id'])
+            if not self.db_instance.rent_item(self.item_id, self.current_user['id']):
+                # Another kiosk rented it between opening this dialog and confirming.
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่พร้อมใช้งาน", "ของชิ้นนี้เพิ่งถูกเช่า-ยืมไปแล้ว กรุณาเลือกชิ้นอื่น")
+                self.accept()
+                return
             CustomMessageBox.show(self.main_window, CustomMessageBox.Information, "สำเร็จ", f"คุณ {self.current_user['first_name']} ได้เช่า-ยืมเรียบร้อยแล้ว")
 
     def return_item(self):
@@ -423,6 +428,11 @@ class ItemDetailWindow(BaseDialog):
             transaction_ref=transaction_ref,
             slip_data=None # FIX: Add missing required argument
         )
+        if history_id is None:
+            # The item was already returned (e.g. force-returned by an admin) in the meantime.
+            CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถคืนได้", "รายการนี้ถูกส่งคืนไปแล้ว")
+            self.accept()
+            return
 
         # 4. Handle payment.
         if amount_to_charge <= 0:
@@ -626,8 +636,11 @@ class ItemDetailWindow(BaseDialog):
             self.future_cost_label.setText(f"ค่าบริการโดยประมาณ: {calculated_amount:.2f} บาท")
 
     def view_full_image(self, event=None):
-        if self.item_data.get('image_path'):
-            dialog = ImageViewerDialog(self.item_data['image_path'], self)
+        if not self.item_data.get('image_hash'):
+            return
+        full_image = self.db_instance.get_item_image(self.item_id)
+        if full_image:
+            dialog = ImageViewerDialog(full_image, self)
             dialog.exec()
 
     def show_rental_history(self):
@@ -641,23 +654,25 @@ class ItemDetailWindow(BaseDialog):
     def resizeEvent(self, event):
         super().resizeEvent(event)
         # Rescale image on window resize
-        image_data_blob = self.item_data.get('image_path')
-        set_image_on_label(self.image_label, image_data_blob, "No Image")
+        image_data_blob = self.item_data.get('thumbnail')
+        set_image_on_label(self.image_label, image_data_blob, "No Image", f"item:{self.item_id}", self.item_data.get('image_hash'))
 
     def showEvent(self, event):
         super().showEvent(event)
         # Ensure button is positioned correctly when the dialog is first shown
-        image_data_blob = self.item_data.get('image_path')
-        set_image_on_label(self.image_label, image_data_blob, "No Image Available")
+        image_data_blob = self.item_data.get('thumbnail')
+        set_image_on_label(self.image_label, image_data_blob, "No Image Available", f"item:{self.item_id}", self.item_data.get('image_hash'))
 
-    def _handle_data_change(self, table_name: str):
-        """Reloads item data if the 'items' table has changed."""
-        if table_name == 'items':
+    def _handle_data_change(self, table_name: str, operation: str = '', ids: list | None = None):
+        """Reloads item data if this item (or, when the ids are unknown, any item) has changed."""
+        if table_name == 'items' and (not ids or self.item_id in ids):
             self._reload_data()
 
     def _reload_data(self):
-        """Fetches the latest data for the current item and updates the UI."""
-        latest_item_data = self.db_instance.get_item_by_id(self.item_id)
+        """Fetches the latest data for the current item in the background and updates the UI."""
+        db_executor.submit(self.db_instance.get_item_by_id, self.item_id, key=f"item_detail.{id(self)}", on_result=self._on_item_reloaded)
+
+    def _on_item_reloaded(self, latest_item_data):
         if latest_item_data:
             self.item_data = latest_item_data
             self._update_ui()
@@ -668,4 +683,5 @@ class ItemDetailWindow(BaseDialog):
             db_signals.data_changed.disconnect(self._handle_data_change)
         except TypeError: # Signal was not connected or already disconnected
             pass
+        db_executor.cancel(f"item_detail.{id(self)}")
         super().closeEvent(event)
@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime, timedelta
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from app_config import app_config
+from app_db.db_executor import db_executor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def utc_datetime_formatter(display_format: str = "%Y-%m-%d %H:%M:%S", default_text: str = "-"):
+    """
+    Returns a function that formats a UTC datetime from the database (a string from SQLite,
+    a naive datetime from PostgreSQL) in the configured local time (TIME.utc_offset_hours).
+    The offset is read once here, not for every cell; create a new formatter after a reload.
+    """
+    offset = timedelta(hours=app_config.getint('TIME', 'utc_offset_hours', fallback=7))
+
+    def format_datetime(dt_obj) -> str:
+        if not dt_obj:
+            return default_text
+        if not isinstance(dt_obj, datetime):
+            try:
+                dt_obj = datetime.fromisoformat(str(dt_obj).split('.')[0])
+            except ValueError:
+                return default_text # Return default if parsing fails
+        return (dt_obj.replace(tzinfo=None) + offset).strftime(display_format)
+
+    return format_datetime
+
+
+class LazyTableModel(QAbstractTableModel):
+    """
+    Read-only table model that streams its rows from the database in batches while the view
+    scrolls (canFetchMore()/fetchMore()), instead of filling a QTableWidget with every row.
+
+    Rows are kept as returned by the database; cell text is only formatted in data(), for the
+    cells the view actually paints. Batches run on db_executor, so scrolling never waits on a query.
+
+    `columns` is a list of (header, formatter) pairs; formatter(record) returns the cell text.
+    A query is set with set_query(fetch_batch, row_key): fetch_batch(after_key, limit) returns up
+    to `limit` rows following the row whose key is `after_key` (None for the first rows), and
+    row_key(record) returns that key, so each batch is a keyset page no matter how far down it is.
+    """
+    RecordRole = Qt.ItemDataRole.UserRole + 1
+    # Emitted with the number of loaded rows after every batch or reload.
+    rowsLoaded = pyqtSignal(int)
+
+    def __init__(self, columns: list, batch_size: int = DEFAULT_BATCH_SIZE, parent=None):
+        super().__init__(parent)
+        self._columns = columns
+        self.batch_size = batch_size
+        self._rows = []
+        self._fetch_batch = None
+        self._row_key = None
+        self._exhausted = True
+        self._loading = False
+        self._generation = 0 # Bumped for every new query so late batches of an old one are dropped
+        self._request_key = f"lazy_table.{id(self)}"
+
+    # --- QAbstractTableModel ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal and 0 <= section < len(self._columns):
+            return self._columns[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        record = self._rows[index.row()]
+        if role == self.RecordRole:
+            return record
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self._columns[index.column()][1](record)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        after_key = self._row_key(self._rows[-1]) if self._rows else None
+        self._request(after_key, self.batch_size, replace=False)
+
+    # --- Queries ---
+    def set_query(self, fetch_batch, row_key):
+        """Clears the table and starts streaming the rows of a new query (e.g. after a filter change)."""
+        self._generation += 1
+        self.beginResetModel()
+        self._rows = []
+        self._fetch_batch = fetch_batch
+        self._row_key = row_key
+        self.endResetModel()
+        self._request(None, self.batch_size, replace=True)
+
+    def reload(self):
+        """
+        Fetches the query again from the top, as many rows as are loaded now, and swaps them in
+        when they arrive, so the table doesn't empty out or jump to the top after a data change.
+        """
+        if self._fetch_batch is None:
+            return
+        self._generation += 1
+        self._request(None, max(self.batch_size, len(self._rows)), replace=True)
+
+    def record(self, row: int):
+        """Returns the database row shown at `row`, or None."""
+        return self._rows[row] if 0 <= row < len(self._rows) else None
+
+    def is_loading(self) -> bool:
+        return self._loading
+
+    def is_complete(self) -> bool:
+        """True once every row of the query has been loaded."""
+        return self._exhausted and not self._loading
+
+    def _request(self, after_key, limit: int, replace: bool):
+        self._loading = True
+        self._exhausted = False
+        generation = self._generation
+        db_executor.submit(
+            self._fetch_batch, after_key, limit, key=self._request_key,
+            on_result=lambda rows: self._on_batch(generation, rows or [], limit, replace),
+            on_error=lambda e: self._on_batch_failed(generation, e)
+        )
+
+    def _on_batch(self, generation: int, rows: list, limit: int, replace: bool):
+        if generation != self._generation:
+            return
+        self._loading = False
+        self._exhausted = len(rows) < limit
+        if replace:
+            self.beginResetModel()
+            self._rows = list(rows)
+            self.endResetModel()
+        elif rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        self.rowsLoaded.emit(len(self._rows))
+
+    def _on_batch_failed(self, generation: int, e):
+        if generation != self._generation:
+            return
+        logger.warning(f"Could not load table rows: {e}")
+        # Stop here instead of retrying on every scroll; the next set_query()/reload() starts over.
+        self._loading = False
+        self._exhausted = True
+        self.rowsLoaded.emit(len(self._rows))
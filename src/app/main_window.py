@@ -1,21 +1,23 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QApplication,
-    QLabel, QLineEdit, QPushButton, QMessageBox, QScrollArea, QGridLayout,
-    QMenu, QSpacerItem, QSizePolicy, QFrame, QScroller, QScrollerProperties
+    QLabel, QLineEdit, QPushButton, QMessageBox, QStackedWidget,
+    QMenu, QSpacerItem, QSizePolicy, QScroller, QScrollerProperties
 )
 from PyQt6.QtCore import Qt, QTimer, QSize, pyqtSignal, QEvent, pyqtSlot, QPoint, QPointF, QElapsedTimer, QPropertyAnimation, QEasingCurve
-from PyQt6.QtGui import QPixmap, QIcon, QWheelEvent, QMouseEvent
-import math
+from PyQt6.QtGui import QIcon, QWheelEvent, QMouseEvent
 import qtawesome as qta
 import cv2
 from theme import theme, PALETTES
 from app_config import app_config
 from app_db.db_management import db_manager, db_signals, get_db_instance, initialize_databases
+from app_db.db_executor import db_executor
 from app_admin.login import AdminLoginWindow
 from app_admin.admin import AdminPanel
 from .login import UserLoginWindow
 from .profile_view import UserProfileViewWindow
-from .item_card import ItemCard
+from .item_card import patch_item_list
+from .item_catalog import ItemListModel, ItemCatalogView
+from .image_cache import image_cache
 from .item_detail import ItemDetailWindow
 from app_admin.console import AdminConsole
 from app_user.my_rentals_dialog import MyRentalsDialog
@@ -77,12 +79,10 @@ class MainWindow(QMainWindow):
         self.payment_history_window = None
         self.about_dialog = None
         # --- End Window Management ---
-        self.item_cards = [] # สำหรับเก็บ ItemCard widgets เพื่อ re-layout
-        self.grid_spacer = None # สำหรับป้องกันการหดของ layout
-        self.last_num_cols = 0 # สำหรับตรวจสอบว่าต้อง relayout หรือไม่
         self.all_items = []
-        self.current_page = 1
-        self.items_per_page = 27 # 3 rows * 9 columns
+        self.search_results = None # (search_text, matching items) for the current all_items
+        self._items_loading = False # A full catalog load is in flight
+        self._pending_patch_ids = set() # Items whose changes are being fetched by _patch_items
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -124,27 +124,6 @@ class MainWindow(QMainWindow):
 
         header_layout.addWidget(self.search_input, 2) # ให้ช่องค้นหายืดได้มากขึ้น
 
-        # --- Pagination Controls (moved to header) ---
-        pagination_container = QWidget()
-        pagination_layout = QHBoxLayout(pagination_container)
-        pagination_layout.setContentsMargins(10, 0, 10, 0) # Add horizontal margins
-        pagination_layout.setSpacing(5)
-        self.prev_page_button = QPushButton(" < ก่อนหน้า")
-        self.prev_page_button.setFixedWidth(100)
-        self.prev_page_button.clicked.connect(self.prev_page)
-        self.page_label = QLabel("หน้า 1/1")
-        self.next_page_button = QPushButton("ถัดไป > ")
-        self.next_page_button.setFixedWidth(100)
-        self.next_page_button.clicked.connect(self.next_page)
-        pagination_layout.addStretch() # *** จัดให้อยู่ตรงกลาง ***
-        pagination_layout.addWidget(self.prev_page_button)
-        pagination_layout.addWidget(self.page_label)
-        pagination_layout.addWidget(self.next_page_button)
-        pagination_layout.addStretch()
-        
-        self.pagination_widget = pagination_container
-        self.pagination_widget.setVisible(False) # Hide by default
-
         # --- สร้าง Layout สำหรับกลุ่มองค์ประกอบด้านขวา ---
         right_header_layout = QHBoxLayout()
         right_header_layout.setSpacing(10)
@@ -197,31 +176,27 @@ class MainWindow(QMainWindow):
         # --- End Theme Toggle Button ---
         header_layout.addWidget(self.sort_button)
         header_layout.addWidget(self.filter_button)
-        header_layout.addWidget(self.pagination_widget, 1) # ให้พื้นที่น้อยกว่าช่องค้นหา
 
         header_layout.addLayout(right_header_layout) # เพิ่มกลุ่มองค์ประกอบด้านขวาเข้าไปใน Header หลัก
 
         main_layout.addWidget(header_widget)
 
-        # --- REVERT: Use a standard QScrollArea and QGridLayout ---
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setObjectName("MainScrollArea")
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setFrameShape(QFrame.Shape.NoFrame)
-
-        self.grid_container = QWidget()
-        self.grid_container.setObjectName("GridContainer")
-        self.grid_layout = QGridLayout(self.grid_container)
-        self.grid_layout.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
-        self.grid_layout.setContentsMargins(10, 10, 10, 10)
-        self.grid_layout.setSpacing(15)
-
-        self.scroll_area.setWidget(self.grid_container)
-        # --- END REVERT ---
-        
-        main_layout.addWidget(self.scroll_area)
+        # --- Item catalog: a model/view list that only paints the visible cards ---
+        self.catalog_model = ItemListModel(self)
+        self.catalog_view = ItemCatalogView()
+        self.catalog_view.setModel(self.catalog_model)
+        self.catalog_view.itemDoubleClicked.connect(self.open_item_detail)
 
-        QScroller.grabGesture(self.scroll_area.viewport(), QScroller.ScrollerGestureType.LeftMouseButtonGesture)
+        # Loading/error messages are shown in place of the catalog
+        self.grid_message_label = QLabel()
+        self.grid_message_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.catalog_stack = QStackedWidget()
+        self.catalog_stack.addWidget(self.catalog_view)
+        self.catalog_stack.addWidget(self.grid_message_label)
+        main_layout.addWidget(self.catalog_stack)
+
+        QScroller.grabGesture(self.catalog_view.viewport(), QScroller.ScrollerGestureType.LeftMouseButtonGesture)
         QTimer.singleShot(0, self.initial_load)
 
         # อัปเดต UI ทั้งหมดหลังจากสร้าง widget ทั้งหมดแล้ว
@@ -309,35 +284,90 @@ class MainWindow(QMainWindow):
         self.update_user_status() # อัปเดตสถานะครั้งแรก
 
     def load_items(self):
-
+        """Fetches the catalog in the background; the grid is refreshed when the result arrives."""
         try:
             current_db_instance = self._get_db_instance_for_refresh()
+        except Exception as e:
+            self._on_items_load_failed(e)
+            return
 
-            # Ensure we call get_all_items on the correct instance
-            sort_by = self.current_sort_criteria['by']
-            sort_order = self.current_sort_criteria['order']
-            if self.current_filter_status:
-                items = current_db_instance.get_items_by_status(self.current_filter_status, get_all_columns=True, sort_by=sort_by, sort_order=sort_order)
-            else:
-                items = current_db_instance.get_all_items(sort_by=sort_by, sort_order=sort_order)
-            
-            # Handle case where DB connection is fine but no items are returned
-            if items is None:
-                items = []
-
-            self.all_items = items
-            self.current_page = 1 # Reset to first page
+        # Ensure we call get_all_items on the correct instance
+        sort_by = self.current_sort_criteria['by']
+        sort_order = self.current_sort_criteria['order']
+        filter_status = self.current_filter_status
+        if filter_status:
+            fetch = lambda: current_db_instance.get_items_by_status(filter_status, get_all_columns=True, sort_by=sort_by, sort_order=sort_order)
+        else:
+            fetch = lambda: current_db_instance.get_all_items(sort_by=sort_by, sort_order=sort_order)
+
+        if self.catalog_model.rowCount() == 0:
+            self._show_grid_message("กำลังโหลดข้อมูล...")
+        # The full load includes any change still being patched in, and must not be overwritten by it.
+        db_executor.cancel('main_window.items_patch')
+        self._pending_patch_ids.clear()
+        self._items_loading = True
+        # A newer load (e.g. a quick filter change) supersedes one still in flight.
+        db_executor.submit(fetch, key='main_window.items', on_result=self._on_items_loaded, on_error=self._on_items_load_failed)
+
+    def _on_items_loaded(self, items):
+        self._items_loading = False
+        # Handle case where DB connection is fine but no items are returned
+        self.all_items = items if items is not None else []
+        self.search_results = None
+        if self.search_input.text().strip():
+            self._request_search()
+        self.display_items()
+        self.catalog_view.scrollToTop()
+
+    def _patch_items(self, operation: str, ids: list):
+        """Applies a change to a few items to the loaded catalog, instead of reloading all of it."""
+        if self._items_loading:
+            # The load in flight may have read the catalog before this change; start it over.
+            self.load_items()
+            return
+        if operation == 'delete':
+            self._on_items_patched(ids, [])
+            return
+        try:
+            db_instance = self._get_db_instance_for_refresh()
+        except Exception:
+            return
+        # A newer patch replaces the one in flight, so it also fetches the items that one was fetching.
+        self._pending_patch_ids.update(ids)
+        patch_ids = sorted(self._pending_patch_ids)
+        db_executor.submit(
+            db_instance.get_items_by_ids, patch_ids, key='main_window.items_patch',
+            on_result=lambda rows, ids=patch_ids: self._on_items_patched(ids, rows),
+            on_error=lambda e: self.load_items() # Fall back to a full reload
+        )
 
-        except ConnectionError as e:
+    def _on_items_patched(self, ids: list, rows: list):
+        self._pending_patch_ids.difference_update(ids)
+        # Requested items that are not returned anymore have been deleted.
+        removed_ids = set(ids) - {row['id'] for row in rows}
+        loaded_ids = {item['id'] for item in self.all_items}
+        is_new = any(row['id'] not in loaded_ids for row in rows)
+        self.all_items = patch_item_list(
+            self.all_items, rows, removed_ids, self.current_filter_status,
+            self.current_sort_criteria['by'], self.current_sort_criteria['order']
+        )
+        if self.search_results is not None:
+            if is_new:
+                self._request_search() # A new item may match the current search
+            items_by_id = {item['id']: item for item in self.all_items}
+            search_text, matches = self.search_results
+            self.search_results = (search_text, [items_by_id[item['id']] for item in matches if item['id'] in items_by_id])
+        self.display_items() # Only cards whose item changed are repainted
+
+    def _on_items_load_failed(self, e):
+        self._items_loading = False
+        self.all_items = []
+        self.search_results = None
+        self.display_items() # This will clear the grid
+        if isinstance(e, ConnectionError):
             # This specific error is raised when the local DB file is not found.
-            error_label = QLabel(str(e)) # Display the specific error message from db_management
-            error_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            error_label.setStyleSheet("font-size: 14pt; color: #f39c12;") # Warning color
-            self.grid_layout.addWidget(error_label, 0, 0, 1, 5)
-            self.all_items = []
-            self.display_current_page() # This will clear the grid
-            return # Stop further processing
-        except Exception as e:
+            display_text = str(e) # Display the specific error message from db_management
+        else:
             # Differentiate between a connection error and a table-not-found error.
             error_message = str(e).lower()
             if 'relation' in error_message and 'does not exist' in error_message:
@@ -346,101 +376,58 @@ class MainWindow(QMainWindow):
             else:
                 # For other errors, assume it's a connection issue.
                 display_text = f"ไม่สามารถเชื่อมต่อฐานข้อมูลเซิร์ฟเวอร์ได้\nกรุณาตรวจสอบการตั้งค่าหรือการเชื่อมต่อเครือข่าย"
-            
-            error_label = QLabel(display_text)
-            # ... error handling for UI ...
             print(f"Database Error in load_items: ไม่สามารถดึงข้อมูลได้ (อาจเกิดจากปัญหาการเชื่อมต่อ)")
-            self.all_items = []
-            self.display_current_page() # This will update pagination
-            return
-        
-        self.display_current_page()
-
-    def display_current_page(self):
-        """Clears and repopulates the grid with items for the current page."""
-        # --- REVERT: Back to simple grid population ---
-        # Clear existing items
-        while self.grid_layout.count():
-            child = self.grid_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        self.item_cards.clear()
-
-        # Apply search filter
-        search_text = self.search_input.text().lower()
-        filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-
-        # Pagination logic
-        start_index = (self.current_page - 1) * self.items_per_page
-        end_index = start_index + self.items_per_page
-        items_to_display = filtered_items[start_index:end_index]
-
-        # Layout logic
-        self._relayout_items(items_to_display)
-
-        # Update pagination controls
-        self.update_pagination_controls(len(filtered_items))
-        # --- END REVERT ---
-
-    def update_pagination_controls(self, total_items):
-        """Updates the visibility and state of pagination buttons and label."""
-        total_pages = max(1, math.ceil(total_items / self.items_per_page))
-
-        if total_pages > 1:
-            self.pagination_widget.setVisible(True)
-            self.page_label.setText(f"หน้า {self.current_page} / {total_pages}")
-            self.prev_page_button.setEnabled(self.current_page > 1)
-            self.next_page_button.setEnabled(self.current_page < total_pages)
-        else:
-            self.pagination_widget.setVisible(False)
-        return total_pages
-
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.display_current_page()
-
-    def next_page(self):
-        total_items = len([item for item in self.all_items if self.search_input.text().lower() in item['name'].lower()] if self.search_input.text() else self.all_items)
-        total_pages = max(1, math.ceil(total_items / self.items_per_page))
-        if self.current_page < total_pages:
-            self.current_page += 1
-            self.display_current_page()
-
-    def _relayout_items(self, items_to_display=None):
+        self._show_grid_message(display_text, color="#f39c12") # Warning color
+
+    def _show_grid_message(self, text: str, color: str | None = None):
+        """Shows a centered message (loading placeholder or error) in place of the catalog."""
+        self.grid_message_label.setText(text)
+        self.grid_message_label.setStyleSheet(f"font-size: 14pt; color: {color};" if color else "font-size: 14pt;")
+        self.catalog_stack.setCurrentWidget(self.grid_message_label)
+
+    def display_items(self):
+        """Shows the (searched) catalog. The view only paints the cards that are scrolled into sight."""
+        self.catalog_model.set_items(self._get_filtered_items())
+        self.catalog_stack.setCurrentWidget(self.catalog_view)
+
+    def _get_filtered_items(self) -> list:
         """
-        Re-arranges existing ItemCard widgets in the grid without reloading data.
-        This is much faster and avoids flickering on resize.
+        Returns all_items narrowed to the search box text, best matches first.
+        Ranked matches come from the database search index (see _request_search); until
+        they arrive, a plain name match is used so typing never waits on the database.
         """
-        if items_to_display is None:
-            search_text = self.search_input.text().lower()
-            filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-            start_index = (self.current_page - 1) * self.items_per_page
-            items_to_display = filtered_items[start_index : start_index + self.items_per_page]
-
-        # Clear grid layout
-        while self.grid_layout.count():
-            child = self.grid_layout.takeAt(0)
-            if child.widget():
-                child.widget().setParent(None) # Use setParent(None) for safety
-        self.item_cards.clear()
-
-        # Calculate number of columns based on window width
-        num_cols = 9
-
-        # Re-populate grid
-        for i, item_data in enumerate(items_to_display):
-            row = i // num_cols
-            col = i % num_cols
-            card = ItemCard(item_data)
-            card.doubleClicked.connect(self.open_item_detail)
-            self.grid_layout.addWidget(card, row, col)
-            self.item_cards.append(card)
+        search_text = self.search_input.text().strip()
+        if not search_text:
+            return self.all_items
+        if self.search_results is not None and self.search_results[0] == search_text:
+            return self.search_results[1]
+        return [item for item in self.all_items if search_text.lower() in item['name'].lower()]
+
+    def _request_search(self):
+        """Runs the item search for the current text in the background."""
+        search_text = self.search_input.text().strip()
+        if not search_text:
+            db_executor.cancel('main_window.search')
+            return
+        db_instance = self._get_db_instance_for_refresh()
+        db_executor.submit(
+            db_instance.search_items, search_text, limit=None, ids_only=True,
+            key='main_window.search',
+            on_result=lambda matches, text=search_text: self._on_search_results(text, matches)
+        )
+
+    def _on_search_results(self, search_text: str, matches: list):
+        if search_text != self.search_input.text().strip():
+            return
+        items_by_id = {item['id']: item for item in self.all_items}
+        self.search_results = (search_text, [items_by_id[row['id']] for row in matches if row['id'] in items_by_id])
+        self.display_items()
 
     def filter_items(self):
         self.reset_auto_logout_timer() # Reset timer on search
-        self.current_page = 1 # Reset to first page on new search
-        self.display_current_page()
+        self.display_items()
+        self.catalog_view.scrollToTop() # New search starts from the top
+        self._request_search()
 
     def open_item_detail(self, item_id, return_instance=False):
         self.reset_auto_logout_timer() # Reset timer when user interacts
@@ -662,12 +649,15 @@ class MainWindow(QMainWindow):
             self.check_current_rentals() # ตรวจสอบรายการที่ยืมอยู่ทันทีหลัง login
 
             avatar_data = self.current_user.get('avatar_path')
-            pixmap = QPixmap()
-            if avatar_data and pixmap.loadFromData(avatar_data):
+            pixmap = image_cache.pixmap(
+                f"user:{self.current_user['id']}", avatar_data, avatar_size,
+                device_pixel_ratio=self.avatar_label.devicePixelRatioF(),
+                mode=Qt.AspectRatioMode.KeepAspectRatioByExpanding, persist=True
+            )
+            if not pixmap.isNull():
                 # กรณีมีรูปโปรไฟล์: แสดงรูป, เพิ่มกรอบ
                 self.avatar_label.show()
-                scaled_pixmap = pixmap.scaled(avatar_size, Qt.AspectRatioMode.KeepAspectRatioByExpanding, Qt.TransformationMode.SmoothTransformation)
-                self.avatar_label.setPixmap(scaled_pixmap)
+                self.avatar_label.setPixmap(pixmap)
                 self.avatar_label.setProperty("class", "avatar-image") # ใช้ class จาก theme
             else:
                 # กรณีไม่มีรูปโปรไฟล์: ซ่อน QLabel ของ avatar ไปเลย
@@ -692,21 +682,36 @@ class MainWindow(QMainWindow):
         self.update_user_status()
 
     def check_current_rentals(self):
-        """Checks if the user has currently rented items and updates the button."""
+        """Checks in the background if the user has currently rented items and updates the button."""
         if not self.current_user: return
+        user_id = self.current_user['id']
         db_instance = self._get_db_instance_for_refresh()
+        db_executor.submit(
+            db_instance.has_rented_items, user_id, key='main_window.rentals_check',
+            on_result=lambda has_rentals: self._on_current_rentals_checked(user_id, has_rentals)
+        )
 
-        if db_instance.has_rented_items(self.current_user['id']):
+    def _on_current_rentals_checked(self, user_id: int, has_rentals: bool):
+        if not self.current_user or self.current_user['id'] != user_id: return
+        if has_rentals:
             # มีรายการที่กำลังยืม: แสดงไอคอนพร้อมเครื่องหมายแจ้งเตือน
             self.my_rentals_button.setText("⚠ รายการที่ยืม")
         else:
             self.my_rentals_button.setText("รายการที่ยืม")
 
     def check_pending_payments(self):
+        """Checks in the background if the user has pending payments and updates the button."""
         if not self.current_user: return
+        user_id = self.current_user['id']
         db_instance = self._get_db_instance_for_refresh()
+        db_executor.submit(
+            db_instance.has_pending_payments, user_id, key='main_window.payments_check',
+            on_result=lambda has_pending: self._on_pending_payments_checked(user_id, has_pending)
+        )
 
-        if db_instance.has_pending_payments(self.current_user['id']):
+    def _on_pending_payments_checked(self, user_id: int, has_pending: bool):
+        if not self.current_user or self.current_user['id'] != user_id: return
+        if has_pending:
             # มีรายการค้างชำระ: แสดงไอคอนพร้อมเครื่องหมายแจ้งเตือน
             self.payment_history_button.setText("⚠ การชำระเงิน (ค้างชำระ)")
         else:
@@ -737,6 +742,7 @@ class MainWindow(QMainWindow):
         # อัปเดตไอคอนปุ่ม Filter
         self.update_filter_button_state()
         self.update_sort_button_state()
+        self.catalog_view.viewport().update() # Cards are painted with the theme colors
 
         # แจ้งเตือนหน้าต่างอื่นๆ ที่เปิดอยู่ให้ทำการอัปเดต UI ตามธีม
         for widget in QApplication.topLevelWidgets():
@@ -769,11 +775,6 @@ class MainWindow(QMainWindow):
         
         app_config.update_config('UI', 'theme', self.current_theme)
 
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        # Call relayout directly. The logic inside _relayout_items now prevents unnecessary work.
-        QTimer.singleShot(50, self._relayout_items) # Use a timer to debounce
-
     def keyPressEvent(self, event):
         # --- NEW: Use configurable shortcuts ---
         key_map = {
@@ -869,20 +870,33 @@ class MainWindow(QMainWindow):
         if self.current_user and self.current_user['id'] == user_id:
             self.check_pending_payments()
 
-    @pyqtSlot(str)
-    def on_data_changed(self, table_name: str):
+    @pyqtSlot(str, str, list)
+    def on_data_changed(self, table_name: str, operation: str = '', ids: list | None = None):
         """Slot to refresh UI when data changes in the database."""
-        print(f"MainWindow received data_changed signal for table: {table_name}")
+        print(f"MainWindow received data_changed signal for table: {table_name} ({operation or 'reload'} {ids or ''})")
         if table_name == 'items':
-            self.load_items()
+            if ids:
+                self._patch_items(operation, ids)
+            else:
+                self.load_items()
             # When an item is returned, it can create a pending payment, so we need to check both.
             self.check_pending_payments()
             self.check_current_rentals()
         elif table_name == 'users':
             # Refresh current user data if a profile window is open or after edits
             if self.current_user:
-                self.current_user = self._get_db_instance_for_refresh().get_user_by_id(self.current_user['id'])
-                self.update_user_status()
+                user_id = self.current_user['id']
+                db_executor.submit(
+                    self._get_db_instance_for_refresh().get_user_by_id, user_id, key='main_window.current_user',
+                    on_result=lambda user: self._on_current_user_reloaded(user_id, user)
+                )
+
+    def _on_current_user_reloaded(self, user_id: int, user):
+        # Ignore the result if the user logged out or someone else logged in meanwhile.
+        if not self.current_user or self.current_user['id'] != user_id:
+            return
+        self.current_user = user
+        self.update_user_status()
 
     def execute_test_command(self, command: str, args: list, config_source=None) -> str:
         """
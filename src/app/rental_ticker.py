@@ -0,0 +1,106 @@
+import time
+import weakref
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+from PyQt6.QtCore import QObject, QTimer
+
+logger = logging.getLogger(__name__)
+
+TICK_INTERVAL_MS = 60_000
+
+
+@lru_cache(maxsize=4096)
+def rent_timestamp(rent_date) -> float | None:
+    """
+    Converts a rent_date as stored by the database (a UTC 'YYYY-MM-DD HH:MM:SS[.ffffff]'
+    string from SQLite, a naive UTC datetime from PostgreSQL) to epoch seconds.
+    Cached, so each distinct rent_date is parsed only once.
+    """
+    if not rent_date:
+        return None
+    try:
+        if not isinstance(rent_date, datetime):
+            rent_date = datetime.fromisoformat(str(rent_date).split('.')[0])
+    except ValueError:
+        logger.warning(f"Unrecognized rent_date: {rent_date!r}")
+        return None
+    if rent_date.tzinfo is None:
+        rent_date = rent_date.replace(tzinfo=timezone.utc)
+    return rent_date.timestamp()
+
+
+def format_rental_duration(seconds: float) -> str:
+    """Formats a rental duration as '1d 2h 3m'."""
+    total_minutes = max(0, int(seconds)) // 60
+    return f"{total_minutes // 1440}d {(total_minutes // 60) % 24}h {total_minutes % 60}m"
+
+
+class RentalTicker(QObject):
+    """
+    One application-wide timer for the rental durations shown on item cards.
+
+    Widgets subscribe with `subscribe(widget)` and implement `on_rental_tick(now)`, `now`
+    being epoch seconds. Each tick only calls the subscribers that are actually on screen;
+    hidden or scrolled-away widgets are marked stale instead and catch up through
+    `catch_up(widget)` (e.g. from their paintEvent) once they are shown again.
+    The timer only runs while there are subscribers. Use from the GUI thread only.
+    """
+
+    def __init__(self, interval_ms: int = TICK_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self._subscribers = weakref.WeakSet()
+        self._stale = weakref.WeakSet()
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+
+    def subscribe(self, widget):
+        self._subscribers.add(widget)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def unsubscribe(self, widget):
+        self._subscribers.discard(widget)
+        self._stale.discard(widget)
+        if not self._subscribers:
+            self._timer.stop()
+
+    def catch_up(self, widget):
+        """Updates `widget` soon if it missed ticks while it was not on screen."""
+        if widget in self._stale:
+            self._stale.discard(widget)
+            widget_ref = weakref.ref(widget)
+            QTimer.singleShot(0, lambda: self._notify(widget_ref(), time.time()))
+
+    @staticmethod
+    def is_on_screen(widget) -> bool:
+        return widget.isVisible() and not widget.window().isMinimized() and not widget.visibleRegion().isEmpty()
+
+    def _notify(self, widget, now: float):
+        if widget is None:
+            return
+        try:
+            widget.on_rental_tick(now)
+        except RuntimeError:
+            # The underlying Qt widget was deleted before its Python wrapper.
+            self.unsubscribe(widget)
+
+    def _tick(self):
+        now = time.time()
+        for widget in list(self._subscribers):
+            try:
+                on_screen = self.is_on_screen(widget)
+            except RuntimeError:
+                self.unsubscribe(widget) # Deleted Qt widget, see _notify()
+                continue
+            if on_screen:
+                self._notify(widget, now)
+            else:
+                self._stale.add(widget)
+        if not self._subscribers:
+            self._timer.stop()
+
+
+# Shared ticker for the GUI.
+rental_ticker = RentalTicker()
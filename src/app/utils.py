@@ -1,8 +1,8 @@
 import sys
 import os
-from PyQt6.QtGui import QIcon, QPixmap
+from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import QLabel
-from PyQt6.QtCore import Qt
+from .image_cache import image_cache
 
 def get_base_path():
     """
@@ -34,23 +34,22 @@ def get_icon(icon_filename: str) -> QIcon:
     """
     return QIcon(resource_path(icon_filename))
 
-def set_image_on_label(label: QLabel, image_data: bytes | None, fallback_text: str = "No Image"):
+def set_image_on_label(label: QLabel, image_data: bytes | None, fallback_text: str = "No Image",
+                       cache_key: str = "image", content_hash: str | None = None):
     """
     Loads image data (bytes) onto a QLabel, scaling it to fit while maintaining aspect ratio.
+    The decoded, scaled pixmap comes from the shared image cache, so showing the same image
+    at the same size again (e.g. repeated resize events) does not decode it again.
     
     Args:
         label (QLabel): The label to display the image on.
         image_data (bytes | None): The image data in bytes.
         fallback_text (str): Text to display if image_data is None or invalid.
+        cache_key (str): Owner of the image in the cache, e.g. 'item:12'.
+        content_hash (str | None): Hash of image_data if already known (e.g. items.image_hash).
     """
-    pixmap = QPixmap()
-    if image_data and pixmap.loadFromData(image_data):
-        # Scale the pixmap to fit the label's size, keeping aspect ratio.
-        # The aspectRatioMode and transformationMode are not attributes of QLabel.
-        # We should use the Qt enums directly.
-        scaled_pixmap = pixmap.scaled(
-            label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
-        )
-        label.setPixmap(scaled_pixmap)
+    pixmap = image_cache.pixmap(cache_key, image_data, label.size(), content_hash, label.devicePixelRatioF())
+    if not pixmap.isNull():
+        label.setPixmap(pixmap)
     else:
         label.setText(fallback_text)
\ No newline at end of file
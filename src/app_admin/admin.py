@@ -20,6 +20,7 @@ from app_payment.payment_dialog import PaymentDialog
 from app.base_dialog import BaseDialog
 from .income_dashboard import IncomeDashboard # Import the new dashboard
 from app_db.db_management import db_signals
+from app_db.db_executor import db_executor
 import uuid
 
 class AdminPanel(QDialog):
@@ -42,7 +43,8 @@ class AdminPanel(QDialog):
         self.current_filter_status = None # สถานะการกรองปัจจุบัน
         self.grid_spacer = None # สำหรับป้องกันการหดของ layout
         self.last_num_cols = 0 # สำหรับตรวจสอบว่าต้อง relayout หรือไม่
-        self.all_items = []
+        self.page_items = [] # Rows of the page shown; only this page is fetched
+        self.total_items = 0 # Items matching the current filter and search, counted by the database
         self.current_page = 1
         self.items_per_page = 27 # 3 rows * 9 columns
 
@@ -305,55 +307,91 @@ class AdminPanel(QDialog):
         self.move(screen_geometry.center() - self.frameGeometry().center())
 
     def load_items(self):
-        try:
-            sort_by = self.current_sort_criteria['by']
-            sort_order = self.current_sort_criteria['order']
-            # โหลดข้อมูลตามสถานะฟิลเตอร์
-            if self.current_filter_status:
-                items = self.db_instance.get_items_by_status(self.current_filter_status, get_all_columns=True, sort_by=sort_by, sort_order=sort_order)
-            else:
-                items = self.db_instance.get_all_items(sort_by=sort_by, sort_order=sort_order)
-            
-            self.all_items = items if items else []
-            self.current_page = 1 # Reset to first page
-
-        except AttributeError:
-            # This can happen if db_instance is None after a failed re-connection attempt.
+        """Reloads the grid from the first page for the current filter, sort and search."""
+        self.current_page = 1
+        self._fetch_page(recount=True)
+
+    def _fetch_page(self, recount: bool = False, keep_selection: bool = False):
+        """
+        Fetches the current page in the background; the grid is refreshed when the result arrives.
+        Only the page's rows are read from the database. The total is counted again with `recount`
+        (new filter/search or changed items); page flips reuse it.
+        """
+        if self.db_instance is None:
+            # This can happen after a failed re-connection attempt.
             self.handle_connection_error()
             return
-        except Exception as e:
-            self.all_items = []
+        db_instance = self.db_instance
+        page = self.current_page
+        items_per_page = self.items_per_page
+        known_total = None if recount else self.total_items
+        filters = {'search_text': self.search_input.text(), 'status': self.current_filter_status}
+        sort_by = self.current_sort_criteria['by']
+        sort_order = self.current_sort_criteria['order']
+
+        def fetch():
+            total_items = db_instance.count_items(**filters) if known_total is None else known_total
+            # Items may have been deleted since the page was picked; stay within the last page.
+            page_to_fetch = min(page, max(1, math.ceil(total_items / items_per_page)))
+            items = db_instance.get_items_page(page_to_fetch, items_per_page, sort_by=sort_by, sort_order=sort_order, **filters)
+            return page_to_fetch, total_items, items
+
+        if not self.cards:
+            self._show_loading_placeholder()
+        db_executor.submit(
+            fetch, key=f"admin_panel.items.{id(self)}",
+            on_result=lambda result: self._on_page_loaded(result, keep_selection),
+            on_error=self._on_items_load_failed
+        )
+
+    def _on_page_loaded(self, result, keep_selection: bool = False):
+        self.current_page, self.total_items, items = result
+        self.page_items = items if items else []
+        if not keep_selection:
+            self.display_current_page()
             return
-        
+        # After a data change: keep the selection; only changed cards are updated or created.
+        self._relayout_items()
+        self.update_pagination_controls(self.total_items)
+
+        selected = next((item for item in self.page_items if item['id'] == self.selected_item_id), None)
+        if selected is None:
+            self.selected_item_id = None
+        self.force_return_button.setVisible(selected is not None and selected['status'] == 'rented')
+        self.confirm_return_button.setVisible(selected is not None and selected['status'] == 'pending_return')
+
+    def _on_items_load_failed(self, e):
+        self.page_items = []
+        self.total_items = 0
         self.display_current_page()
 
-    def display_current_page(self):
-        """Clears and repopulates the grid with items for the current page."""
-        # --- REVERT: Back to simple grid population ---
-        # Clear existing items
+    def _show_loading_placeholder(self):
         while self.grid_layout.count():
             child = self.grid_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
         self.cards.clear()
+        loading_label = QLabel("กำลังโหลดข้อมูล...")
+        loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        loading_label.setStyleSheet("font-size: 14pt;")
+        self.grid_layout.addWidget(loading_label, 0, 0, 1, 5)
+
+    def display_current_page(self):
+        """Repopulates the grid with the fetched page, reusing cards that are still shown."""
         self.selected_item_id = None
         self.force_return_button.setVisible(False)
         self.confirm_return_button.setVisible(False)
 
-        # Apply search filter
-        search_text = self.search_input.text().lower()
-        filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-
-        # Pagination logic
-        start_index = (self.current_page - 1) * self.items_per_page
-        end_index = start_index + self.items_per_page
-        items_to_display = filtered_items[start_index:end_index]
-
         # Layout logic
-        self._relayout_items(items_to_display)
+        self._relayout_items()
+        for card in self.cards:
+            if card.property("selected"): # Reused card of the previous selection
+                card.setProperty("selected", False)
+                card.style().unpolish(card)
+                card.style().polish(card)
 
         # Update pagination controls
-        self.update_pagination_controls(len(filtered_items))
+        self.update_pagination_controls(self.total_items)
         # --- END REVERT ---
 
     def update_pagination_controls(self, total_items):
@@ -370,21 +408,19 @@ class AdminPanel(QDialog):
         return total_pages
 
     def filter_items_by_name(self):
-        """Filters the visible item cards based on the search input text."""
-        self.current_page = 1 # Reset to first page on new search
-        self.display_current_page()
+        """Searches item names in the database; a newer keystroke supersedes a pending search."""
+        self.load_items() # Reset to first page on new search
 
     def prev_page(self):
         if self.current_page > 1:
             self.current_page -= 1
-            self.display_current_page()
+            self._fetch_page()
 
     def next_page(self):
-        total_items = len([item for item in self.all_items if self.search_input.text().lower() in item['name'].lower()] if self.search_input.text() else self.all_items)
-        total_pages = max(1, math.ceil(total_items / self.items_per_page))
+        total_pages = max(1, math.ceil(self.total_items / self.items_per_page))
         if self.current_page < total_pages:
             self.current_page += 1
-            self.display_current_page()
+            self._fetch_page()
 
     def add_item(self):
         # --- Non-Modal Logic ---
@@ -457,13 +493,16 @@ class AdminPanel(QDialog):
             calc_dialog = PaymentDialog(item_data, user_data, self, db_instance=self.db_instance)
             amount_to_charge = calc_dialog.get_amount()
             transaction_ref = f"MIKA{str(uuid.uuid4().hex)[:12].upper()}" if amount_to_charge > 0.01 else None
-            self.db_instance.return_item(
+            history_id = self.db_instance.return_item(
                 item_id=self.selected_item_id,
                 amount_due=amount_to_charge,
                 transaction_ref=transaction_ref, # Pass None for slip_data
                 slip_data=None,  # Pass None for slip_data
                 initiator='admin'
             )
+            if history_id is None:
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถบังคับคืนได้", "สินค้านี้ถูกส่งคืนไปแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บังคับคืนสินค้าเรียบร้อยแล้ว")
 
     def confirm_item_return(self):
@@ -475,7 +514,9 @@ class AdminPanel(QDialog):
                                       f"ยืนยันว่าได้รับสินค้า ID: {self.selected_item_id} คืนแล้วใช่หรือไม่?",
                                       buttons=CustomMessageBox.Yes | CustomMessageBox.No)
         if reply == CustomMessageBox.Yes:
-            self.db_instance.confirm_return(self.selected_item_id)
+            if not self.db_instance.confirm_return(self.selected_item_id):
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถยืนยันได้", "สินค้านี้ไม่ได้อยู่ในสถานะรอยืนยันการคืนแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"ยืนยันการรับคืนสินค้า ID: {self.selected_item_id} เรียบร้อยแล้ว")
 
     def show_filter_menu(self):
@@ -581,11 +622,15 @@ class AdminPanel(QDialog):
         # Ensure this panel's icons are also updated immediately.
         self.update_icons()
 
-    def handle_data_change(self, table_name: str):
+    def handle_data_change(self, table_name: str, operation: str = '', ids: list | None = None):
         """Slot to handle data changes from the database."""
-        print(f"AdminPanel received data_changed signal for table: {table_name}")
+        print(f"AdminPanel received data_changed signal for table: {table_name} ({operation or 'reload'} {ids or ''})")
         if table_name == 'items':
-            self.load_items()
+            if ids:
+                # Refetch just the page shown (and the total): the change may move items between pages.
+                self._fetch_page(recount=True, keep_selection=True)
+            else:
+                self.load_items()
 
     def on_card_clicked(self, item_id):
         self.selected_item_id = item_id
@@ -611,25 +656,31 @@ class AdminPanel(QDialog):
     def _relayout_items(self, items_to_display=None):
         """Re-arranges existing ItemCard widgets in the grid without reloading data."""
         if items_to_display is None:
-            search_text = self.search_input.text().lower()
-            filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-            start_index = (self.current_page - 1) * self.items_per_page
-            items_to_display = filtered_items[start_index : start_index + self.items_per_page]
+            items_to_display = self.page_items
 
+        # Cards for items that are still displayed are put back as they are instead of being rebuilt.
+        reusable_cards = {card.item_id: card for card in self.cards}
         while self.grid_layout.count():
             child = self.grid_layout.takeAt(0)
-            if child.widget():
-                child.widget().setParent(None)
-        self.cards.clear()
+            widget = child.widget()
+            if widget and reusable_cards.get(getattr(widget, 'item_id', None)) is not widget:
+                widget.deleteLater() # Loading placeholder
+        self.cards = []
 
         num_cols = 9
         for i, item_data in enumerate(items_to_display):
             row, col = divmod(i, num_cols)
-            card = ItemCard(item_data)
-            card.clicked.connect(self.on_card_clicked)
-            card.mouseDoubleClickEvent = lambda _event, item_id=item_data['id']: self.on_card_double_clicked(item_id)
+            card = reusable_cards.pop(item_data['id'], None)
+            if card is None:
+                card = ItemCard(item_data)
+                card.clicked.connect(self.on_card_clicked)
+                card.mouseDoubleClickEvent = lambda _event, item_id=item_data['id']: self.on_card_double_clicked(item_id)
+            elif card.item_data != item_data:
+                card.set_item_data(item_data)
             self.grid_layout.addWidget(card, row, col)
             self.cards.append(card)
+        for card in reusable_cards.values():
+            card.deleteLater()
 
     def on_card_double_clicked(self, item_id):
         self.selected_item_id = item_id
@@ -658,20 +709,11 @@ class AdminPanel(QDialog):
         self.force_return_button.setVisible(False)
         self.confirm_return_button.setVisible(False)
 
-        # Apply search filter
-        search_text = self.search_input.text().lower()
-        filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-
-        # Pagination logic
-        start_index = (self.current_page - 1) * self.items_per_page
-        end_index = start_index + self.items_per_page
-        items_to_display = filtered_items[start_index:end_index]
-
         # Layout logic
-        self._relayout_items(items_to_display)
+        self._relayout_items()
 
         # Update pagination controls
-        self.update_pagination_controls(len(filtered_items))
+        self.update_pagination_controls(self.total_items)
 
     def update_pagination_controls(self, total_items):
         """Updates the visibility and state of pagination buttons and label."""
@@ -687,21 +729,19 @@ class AdminPanel(QDialog):
         return total_pages
 
     def filter_items_by_name(self):
-        """Filters the visible item cards based on the search input text."""
-        self.current_page = 1 # Reset to first page on new search
-        self.display_current_page()
+        """Searches item names in the database; a newer keystroke supersedes a pending search."""
+        self.load_items() # Reset to first page on new search
 
     def prev_page(self):
         if self.current_page > 1:
             self.current_page -= 1
-            self.display_current_page()
+            self._fetch_page()
 
     def next_page(self):
-        total_items = len([item for item in self.all_items if self.search_input.text().lower() in item['name'].lower()] if self.search_input.text() else self.all_items)
-        total_pages = max(1, math.ceil(total_items / self.items_per_page))
+        total_pages = max(1, math.ceil(self.total_items / self.items_per_page))
         if self.current_page < total_pages:
             self.current_page += 1
-            self.display_current_page()
+            self._fetch_page()
 
     def add_item(self):
         # --- Non-Modal Logic ---
@@ -774,13 +814,16 @@ class AdminPanel(QDialog):
             calc_dialog = PaymentDialog(item_data, user_data, self, db_instance=self.db_instance)
             amount_to_charge = calc_dialog.get_amount()
             transaction_ref = f"MIKA{str(uuid.uuid4().hex)[:12].upper()}" if amount_to_charge > 0.01 else None
-            self.db_instance.return_item(
+            history_id = self.db_instance.return_item(
                 item_id=self.selected_item_id,
                 amount_due=amount_to_charge,
                 transaction_ref=transaction_ref, # Pass None for slip_data
                 slip_data=None,  # Pass None for slip_data
                 initiator='admin'
             )
+            if history_id is None:
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถบังคับคืนได้", "สินค้านี้ถูกส่งคืนไปแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บังคับคืนสินค้าเรียบร้อยแล้ว")
 
     def confirm_item_return(self):
@@ -792,7 +835,9 @@ class AdminPanel(QDialog):
                                       f"ยืนยันว่าได้รับสินค้า ID: {self.selected_item_id} คืนแล้วใช่หรือไม่?",
                                       buttons=CustomMessageBox.Yes | CustomMessageBox.No)
         if reply == CustomMessageBox.Yes:
-            self.db_instance.confirm_return(self.selected_item_id)
+            if not self.db_instance.confirm_return(self.selected_item_id):
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถยืนยันได้", "สินค้านี้ไม่ได้อยู่ในสถานะรอยืนยันการคืนแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"ยืนยันการรับคืนสินค้า ID: {self.selected_item_id} เรียบร้อยแล้ว")
 
     def show_filter_menu(self):
@@ -865,11 +910,15 @@ class AdminPanel(QDialog):
         # Ensure this panel's icons are also updated immediately.
         self.update_icons()
 
-    def handle_data_change(self, table_name: str):
+    def handle_data_change(self, table_name: str, operation: str = '', ids: list | None = None):
         """Slot to handle data changes from the database."""
-        print(f"AdminPanel received data_changed signal for table: {table_name}")
+        print(f"AdminPanel received data_changed signal for table: {table_name} ({operation or 'reload'} {ids or ''})")
         if table_name == 'items':
-            self.load_items()
+            if ids:
+                # Refetch just the page shown (and the total): the change may move items between pages.
+                self._fetch_page(recount=True, keep_selection=True)
+            else:
+                self.load_items()
 
     def on_card_clicked(self, item_id):
         self.selected_item_id = item_id
@@ -895,25 +944,31 @@ class AdminPanel(QDialog):
     def _relayout_items(self, items_to_display=None):
         """Re-arranges existing ItemCard widgets in the grid without reloading data."""
         if items_to_display is None:
-            search_text = self.search_input.text().lower()
-            filtered_items = [item for item in self.all_items if search_text in item['name'].lower()] if search_text else self.all_items
-            start_index = (self.current_page - 1) * self.items_per_page
-            items_to_display = filtered_items[start_index : start_index + self.items_per_page]
+            items_to_display = self.page_items
 
+        # Cards for items that are still displayed are put back as they are instead of being rebuilt.
+        reusable_cards = {card.item_id: card for card in self.cards}
         while self.grid_layout.count():
             child = self.grid_layout.takeAt(0)
-            if child.widget():
-                child.widget().setParent(None)
-        self.cards.clear()
+            widget = child.widget()
+            if widget and reusable_cards.get(getattr(widget, 'item_id', None)) is not widget:
+                widget.deleteLater() # Loading placeholder
+        self.cards = []
 
         num_cols = 9
         for i, item_data in enumerate(items_to_display):
             row, col = divmod(i, num_cols)
-            card = ItemCard(item_data)
-            card.clicked.connect(self.on_card_clicked)
-            card.mouseDoubleClickEvent = lambda _event, item_id=item_data['id']: self.on_card_double_clicked(item_id)
+            card = reusable_cards.pop(item_data['id'], None)
+            if card is None:
+                card = ItemCard(item_data)
+                card.clicked.connect(self.on_card_clicked)
+                card.mouseDoubleClickEvent = lambda _event, item_id=item_data['id']: self.on_card_double_clicked(item_id)
+            elif card.item_data != item_data:
+                card.set_item_data(item_data)
             self.grid_layout.addWidget(card, row, col)
             self.cards.append(card)
+        for card in reusable_cards.values():
+            card.deleteLater()
 
     def on_card_double_clicked(self, item_id):
         self.selected_item_id = item_id
@@ -981,13 +1036,16 @@ class AdminPanel(QDialog):
             calc_dialog = PaymentDialog(item_data, user_data, self, db_instance=self.db_instance)
             amount_to_charge = calc_dialog.get_amount()
             transaction_ref = f"MIKA{str(uuid.uuid4().hex)[:12].upper()}" if amount_to_charge > 0.01 else None
-            self.db_instance.return_item(
+            history_id = self.db_instance.return_item(
                 item_id=self.selected_item_id,
                 amount_due=amount_to_charge,
                 transaction_ref=transaction_ref, # Pass None for slip_data
                 slip_data=None,  # Pass None for slip_data
                 initiator='admin'
             )
+            if history_id is None:
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถบังคับคืนได้", "สินค้านี้ถูกส่งคืนไปแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บังคับคืนสินค้าเรียบร้อยแล้ว")
 
     def confirm_item_return(self):
@@ -999,7 +1057,9 @@ class AdminPanel(QDialog):
                                       f"ยืนยันว่าได้รับสินค้า ID: {self.selected_item_id} คืนแล้วใช่หรือไม่?",
                                       buttons=CustomMessageBox.Yes | CustomMessageBox.No)
         if reply == CustomMessageBox.Yes:
-            self.db_instance.confirm_return(self.selected_item_id)
+            if not self.db_instance.confirm_return(self.selected_item_id):
+                CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สามารถยืนยันได้", "สินค้านี้ไม่ได้อยู่ในสถานะรอยืนยันการคืนแล้ว")
+                return
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"ยืนยันการรับคืนสินค้า ID: {self.selected_item_id} เรียบร้อยแล้ว")
 
     def show_filter_menu(self):
@@ -1060,11 +1120,15 @@ class AdminPanel(QDialog):
         # Ensure this panel's icons are also updated immediately.
         self.update_icons()
 
-    def handle_data_change(self, table_name: str):
+    def handle_data_change(self, table_name: str, operation: str = '', ids: list | None = None):
         """Slot to handle data changes from the database."""
-        print(f"AdminPanel received data_changed signal for table: {table_name}")
+        print(f"AdminPanel received data_changed signal for table: {table_name} ({operation or 'reload'} {ids or ''})")
         if table_name == 'items':
-            self.load_items()
+            if ids:
+                # Refetch just the page shown (and the total): the change may move items between pages.
+                self._fetch_page(recount=True, keep_selection=True)
+            else:
+                self.load_items()
 
     def on_card_clicked(self, item_id):
         self.selected_item_id = item_id
@@ -14,7 +14,8 @@ from app_setting.server_settings_dialog import SystemSettingsDialog # Updated im
 from theme import theme
 import secrets
 from app.custom_message_box import CustomMessageBox
-from app_db.db_management import get_db_instance
+from app_db.db_management import get_db_instance, db_manager
+from app_db.query_stats import query_stats
 from app_payment.camera_capture_dialog import CameraCaptureDialog
 from theme import PALETTES
 from app_payment.ktb_api_handler import KTBApiHandler
@@ -238,10 +239,16 @@ class AdminConsole(BaseDialog):
                 elif sub_command in ["local", "server"]:
                     # Alias for 'mode' command for backward compatibility
                     self.handle_mode_switch(sub_command)
+                elif sub_command == "pool":
+                    self.handle_db_pool()
+                elif sub_command == "rebuild-revenue":
+                    self.handle_db_rebuild_revenue()
+                elif sub_command == "stats":
+                    self.handle_db_stats(parts[2].lower() if len(parts) > 2 else "")
                 else:
-                    self.append_text("Usage: db <init|local|server>", self._get_theme_color('warning'))
+                    self.append_text("Usage: db <init|local|server|pool|stats|rebuild-revenue>", self._get_theme_color('warning'))
             else:
-                self.append_text("Usage: db <init|local|server>", self._get_theme_color('warning'))
+                self.append_text("Usage: db <init|local|server|pool|stats|rebuild-revenue>", self._get_theme_color('warning'))
         elif command in ["help", "?", "h"]:
             self.show_help()
         elif command == "force_exit":
@@ -333,6 +340,10 @@ class AdminConsole(BaseDialog):
             
             remote_db.create_remote_tables()
             self.append_text("Successfully created tables on the remote server.", self._get_theme_color('success'))
+            if remote_db.uses_server_functions():
+                self.append_text("Installed server-side rental functions (rent/return/payment run in one call).", self._get_theme_color('success'))
+            else:
+                self.append_text("Warning: Could not install server-side rental functions; plain SQL will be used.", self._get_theme_color('warning'))
 
             # Create a default admin user on the server
             admin_pass = 'admin'
@@ -350,6 +361,68 @@ class AdminConsole(BaseDialog):
             if not was_enabled:
                 app_config.update_config('DATABASE', 'enabled', 'False')
 
+    def handle_db_pool(self):
+        """Handles the 'db pool' command by printing the remote connection pool statistics."""
+        try:
+            stats = get_db_instance(is_remote=True).get_pool_stats()
+        except Exception as e:
+            self.append_text(f"Error reading connection pool stats: {e}", self._get_theme_color('danger'))
+            return
+        if not stats:
+            self.append_text("The remote database is not using a connection pool.", self._get_theme_color('warning'))
+            return
+        self.append_text("--- Remote Connection Pool ---", self._get_theme_color('info'))
+        self.append_text(f"  Connections : {stats['size']}/{stats['max_size']} (in use: {stats['in_use']}, idle: {stats['idle']})")
+        self.append_text(f"  Waiters     : {stats['waiters']}")
+        self.append_text(f"  Checkouts   : {stats['checkouts']} (created: {stats['connections_created']}, reclaimed: {stats['reclaimed']})")
+        self.append_text(f"  Wait time   : {stats['waits']} waits, avg {stats['avg_wait_time'] * 1000:.1f} ms, max {stats['max_wait_time'] * 1000:.1f} ms")
+        self.append_text(f"  Failures    : {stats['timeouts']} timeouts, {stats['ping_failures']} failed pings")
+
+    def handle_db_stats(self, action: str):
+        """Handles 'db stats [on|off|reset]': shows the slowest DBManagement methods or controls instrumentation."""
+        if action in ("on", "off"):
+            enabled = action == "on"
+            query_stats.configure(enabled=enabled)
+            app_config.update_config('DATABASE', 'query_stats_enabled', str(enabled))
+            self.append_text(f"Query instrumentation {'enabled' if enabled else 'disabled'}.", self._get_theme_color('success'))
+            if enabled:
+                self.append_text(f"Queries slower than {query_stats.slow_query_ms} ms are written to slow_queries.log.", self._get_theme_color('info'))
+            return
+        if action == "reset":
+            query_stats.reset()
+            self.append_text("Query statistics have been reset.", self._get_theme_color('success'))
+            return
+        if action:
+            self.append_text("Usage: db stats [on|off|reset]", self._get_theme_color('warning'))
+            return
+
+        if not query_stats.enabled:
+            self.append_text("Query instrumentation is off. Use 'db stats on' to start collecting.", self._get_theme_color('warning'))
+        rows = query_stats.snapshot()
+        if not rows:
+            self.append_text("No queries recorded yet.", self._get_theme_color('info'))
+            return
+        self.append_text("--- Top database methods by total time ---", self._get_theme_color('info'))
+        self.append_text(f"  {'Method':<36}{'Calls':>7}{'Total ms':>11}{'Avg':>8}{'p95':>8}{'Max':>8}{'Rows':>8}{'KB':>8}{'Slow':>6}")
+        for row in rows[:15]:
+            self.append_text(
+                f"  {row['method'][:35]:<36}{row['calls']:>7}{row['total_ms']:>11.1f}{row['avg_ms']:>8.1f}"
+                f"{row['p95_ms']:>8.0f}{row['max_ms']:>8.1f}{row['rows']:>8}{row['bytes'] / 1024:>8.1f}{row['slow']:>6}"
+            )
+
+    def handle_db_rebuild_revenue(self):
+        """Handles the 'db rebuild-revenue' command by recomputing the daily revenue rollup of the active database."""
+        self.append_text("Rebuilding daily revenue rollup from rental history...", self._get_theme_color('info'))
+        QApplication.processEvents()
+        try:
+            db_instance = db_manager.get_active_instance()
+            rows_written = db_instance.rebuild_revenue_rollup()
+            total_paid = db_instance.get_total_income()
+        except Exception as e:
+            self.append_text(f"Error rebuilding revenue rollup: {e}", self._get_theme_color('danger'))
+            return
+        self.append_text(f"Revenue rollup rebuilt: {rows_written} daily rows, total paid {total_paid:,.2f}.", self._get_theme_color('success'))
+
     def handle_mode_switch(self, mode: str):
         """Handles the 'mode local' or 'mode server' command."""
         success, message = self.main_window_ref.switch_database_mode(mode == 'server')
@@ -441,8 +514,12 @@ class AdminConsole(BaseDialog):
                 self.append_text(f"Camera device index set to '{index}'.", "green")
             elif '.' in key: # Generic config setter: set section.key value
                 section, option = key.split('.', 1)
+                old_value = app_config.get(section.upper(), option, fallback=None)
                 app_config.update_config(section.upper(), option, value)
                 self.append_text(f"Config '{section.upper()}.{option}' set to '{value}'.", "green")
+                if (section.upper(), option) == ('TIME', 'utc_offset_hours') and old_value != value:
+                    # The revenue rollup is keyed by local day, so it has to move to the new day boundary.
+                    self.handle_db_rebuild_revenue()
             else:
                 self.append_text(f"Error: Unknown config key '{key}'.", "red")
         except ValueError:
@@ -566,7 +643,10 @@ class AdminConsole(BaseDialog):
             "Database & Admin": {
                 "db local": "สลับการใช้งานฐานข้อมูลเป็น Local (SQLite)",
                 "db server": "สลับการใช้งานฐานข้อมูลเป็น Server (ที่ตั้งค่าไว้)",
-                "db init-server": "สร้างตารางที่จำเป็นทั้งหมดบนฐานข้อมูลเซิร์ฟเวอร์",
+                "db init-server": "สร้างตารางและฟังก์ชันที่จำเป็นทั้งหมดบนฐานข้อมูลเซิร์ฟเวอร์",
+                "db pool": "แสดงสถิติ Connection Pool ของฐานข้อมูลเซิร์ฟเวอร์",
+                "db stats [on|off|reset]": "แสดง/เปิด/ปิด/รีเซ็ต สถิติเวลา query ของแต่ละเมธอด",
+                "db rebuild-revenue": "คำนวณตารางสรุปรายรับรายวันใหม่จากประวัติการเช่า",
             },
             "System & API Testing": {
                 "ping [host]": "ทดสอบการเชื่อมต่ออินเทอร์เน็ต (ค่าเริ่มต้น: google.com)",
@@ -1,17 +1,18 @@
 from PyQt6.QtWidgets import (
     QVBoxLayout, QHBoxLayout, QLabel, QWidget, QFrame, QGridLayout, QPushButton, QGroupBox,
-    QDateEdit, QTableWidget, QHeaderView, QTableWidgetItem, QAbstractItemView, QLineEdit, QGraphicsDropShadowEffect, QApplication,
+    QDateEdit, QTableView, QHeaderView, QAbstractItemView, QLineEdit, QGraphicsDropShadowEffect, QApplication,
     QMenu
 )
-from PyQt6.QtCore import Qt, QDate, QDateTime, QSize, QModelIndex, QPoint
+from PyQt6.QtCore import Qt, QDate, QSize, QModelIndex, QPoint
 from PyQt6.QtGui import QColor
 import qtawesome as qta
 from app.base_dialog import BaseDialog
 from theme import PALETTES
 from app_config import app_config
 from datetime import date, timedelta
-import math
 from app_payment.receipt_dialog import ReceiptDialog
+from app_db.db_executor import db_executor
+from app.lazy_table_model import LazyTableModel, utc_datetime_formatter
 
 class StatCard(QWidget):
     """A card widget to display a single statistic."""
@@ -62,10 +63,10 @@ class IncomeDashboard(BaseDialog):
         self.setWindowTitle("Dashboard")
         self.setMinimumSize(1200, 800)
 
-        # Pagination for the table
-        self.current_page = 1
-        self.items_per_page = 20
-        self.total_items_for_pagination = 0 # Initialize for pagination logic
+        # The table streams its rows while it scrolls; the filters it was loaded for and their row count.
+        self.table_filters = {}
+        self.total_table_rows = None # None while it is being counted
+        self.format_return_date = utc_datetime_formatter("%Y-%m-%d %H:%M")
         
         # --- NEW: Filter and Sort states ---
         self.current_filter_status = None
@@ -161,9 +162,18 @@ class IncomeDashboard(BaseDialog):
         table_toolbar.addWidget(self.search_input, 1) # Give search input stretch factor
         history_layout.addLayout(table_toolbar)
         
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(7)
-        self.history_table.setHorizontalHeaderLabels(["ID", "วันที่", "รายการ", "ผู้ใช้", "ยอดชำระ", "สถานะ", "ช่องทาง"])
+        self.history_model = LazyTableModel([
+            ("ID", lambda record: str(record['id'])),
+            ("วันที่", lambda record: self.format_return_date(record['return_date'])),
+            ("รายการ", lambda record: record['item_name']),
+            ("ผู้ใช้", lambda record: record['username']),
+            ("ยอดชำระ", lambda record: f"{record['amount_due']:.2f}"),
+            ("สถานะ", lambda record: record['payment_status']),
+            ("ช่องทาง", lambda record: "เงินสด" if record.get('transaction_ref') is None else "โอนชำระ"),
+        ], parent=self)
+        self.history_model.rowsLoaded.connect(self.update_table_status)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         header = self.history_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
@@ -173,26 +183,15 @@ class IncomeDashboard(BaseDialog):
         header.setSectionResizeMode(5, QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(6, QHeaderView.ResizeMode.Interactive)
         self.history_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
-        self.history_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.history_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         # --- NEW: Connect double click signal to open receipt details ---
         self.history_table.doubleClicked.connect(self.open_receipt_details)
         history_layout.addWidget(self.history_table)
         
-        # Pagination for table
-        pagination_layout = QHBoxLayout()
-        self.prev_page_button = QPushButton(" < ก่อนหน้า")
-        self.prev_page_button.setFixedWidth(100)
-        self.prev_page_button.clicked.connect(self.prev_page)
-        self.page_label = QLabel("หน้า 1 / 1")
-        self.next_page_button = QPushButton("ถัดไป > ")
-        self.next_page_button.setFixedWidth(100)
-        self.next_page_button.clicked.connect(self.next_page)
-        pagination_layout.addStretch()
-        pagination_layout.addWidget(self.prev_page_button)
-        pagination_layout.addWidget(self.page_label)
-        pagination_layout.addWidget(self.next_page_button)
-        pagination_layout.addStretch()
-        history_layout.addLayout(pagination_layout)
+        # More rows are loaded while scrolling down; this shows how many of the total are loaded.
+        self.table_status_label = QLabel("กำลังโหลด...")
+        self.table_status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        history_layout.addWidget(self.table_status_label)
         
         main_layout.addWidget(history_group, 1) # Give stretch factor
         
@@ -201,8 +200,8 @@ class IncomeDashboard(BaseDialog):
         self.adjust_and_center()
 
     def on_search_changed(self):
-        self.current_page = 1
-        self.load_table_data()
+        # Keep whatever date range is currently applied to the table.
+        self.load_table_data(start_date=self.table_filters.get('start_date'), end_date=self.table_filters.get('end_date'))
 
     def open_receipt_details(self, index: QModelIndex):
         """Opens the receipt dialog for the double-clicked row."""
@@ -210,11 +209,11 @@ class IncomeDashboard(BaseDialog):
             return
 
         try:
-            history_id_item = self.history_table.item(index.row(), 0)
-            if not history_id_item: # เพิ่มการตรวจสอบเพื่อความปลอดภัย
+            record = self.history_model.record(index.row())
+            if not record: # เพิ่มการตรวจสอบเพื่อความปลอดภัย
                 return
 
-            history_id = int(history_id_item.text())
+            history_id = record['id']
 
             # Open the ReceiptDialog, passing the admin context
             receipt_dialog = ReceiptDialog(history_id=history_id, parent=self, db_instance=self.db_instance, is_admin_view=True)
@@ -265,9 +264,17 @@ class IncomeDashboard(BaseDialog):
         self.load_table_data(start_date=start_date, end_date=end_date)
 
     def load_summary_data(self, start_date=None, end_date=None):
+        """Fetches the summary cards' totals in the background."""
         if not self.db_instance: return
-
-        summary = self.db_instance.get_income_summary(start_date, end_date)
+        if not self.stats_grid.count():
+            loading_label = QLabel("กำลังโหลดข้อมูล...")
+            loading_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.stats_grid.addWidget(loading_label, 0, 0)
+        db_executor.submit(self.db_instance.get_income_summary, start_date, end_date,
+                           key=f"income_dashboard.summary.{id(self)}", on_result=self._on_summary_loaded)
+
+    def _on_summary_loaded(self, summary):
+        summary = summary or {}
         
         # Clear existing cards
         while self.stats_grid.count():
@@ -293,73 +300,44 @@ class IncomeDashboard(BaseDialog):
         self.update_icons()
     
     def load_table_data(self, start_date=None, end_date=None):
-        # --- FIX: Always use the date range from the UI when loading table data ---
-        # This ensures that pagination works correctly with the currently selected date range.
-        # The date range is now correctly set by _load_data_for_range before this is called.
-        # We still need to read them for pagination calls.
-        current_start_date = self.start_date_edit.date().toString('yyyy-MM-dd')
-        current_end_date = self.end_date_edit.date().toString('yyyy-MM-dd')
-
+        """
+        Reloads the table for a new set of filters. Rows are streamed by keyset while the
+        table scrolls; the total is counted once here, in the background.
+        """
         if not self.db_instance: return
 
-        search_text = self.search_input.text()
+        self.table_filters = {
+            'search_text': self.search_input.text(),
+            'start_date': start_date, # None means all time
+            'end_date': end_date,
+            'status_filter': self.current_filter_status,
+        }
+        db_instance = self.db_instance
+        filters = dict(self.table_filters)
         sort_by = self.current_sort_criteria.get('by', 'return_date')
         sort_order = self.current_sort_criteria.get('order', 'DESC')
+        self.format_return_date = utc_datetime_formatter("%Y-%m-%d %H:%M")
 
-        records, total_count = self.db_instance.get_all_payment_history_paginated(
-            page=self.current_page,
-            items_per_page=self.items_per_page,
-            search_text=search_text,
-            start_date=current_start_date if start_date is not None else None, # Pass None if filtering all time
-            end_date=current_end_date if end_date is not None else None,
-            status_filter=self.current_filter_status,
-            sort_by=sort_by,
-            sort_order=sort_order
+        self.total_table_rows = None
+        self.history_model.set_query(
+            lambda after_key, limit: db_instance.get_payment_history_page(limit, after_key=after_key, sort_by=sort_by, sort_order=sort_order, **filters),
+            lambda record: db_instance.payment_history_key(record, sort_by)
         )
-        self.total_items_for_pagination = total_count # Store total count for pagination
-        
-        self.history_table.setRowCount(len(records))
-        for row, record in enumerate(records):
-            self.history_table.setItem(row, 0, QTableWidgetItem(str(record['id'])))
-            self.history_table.setItem(row, 1, QTableWidgetItem(self.format_datetime(record['return_date'])))
-            self.history_table.setItem(row, 2, QTableWidgetItem(record['item_name']))
-            self.history_table.setItem(row, 3, QTableWidgetItem(record['username']))
-            self.history_table.setItem(row, 4, QTableWidgetItem(f"{record['amount_due']:.2f}"))
-            self.history_table.setItem(row, 5, QTableWidgetItem(record['payment_status']))
-            
-            # Determine payment channel
-            channel = "เงินสด" if record.get('transaction_ref') is None else "โอนชำระ"
-            self.history_table.setItem(row, 6, QTableWidgetItem(channel))
-        
-        self.update_pagination_controls(total_count)
-
-    def update_pagination_controls(self, total_items):
-        total_pages = math.ceil(total_items / self.items_per_page) if total_items > 0 else 1
-        self.page_label.setText(f"หน้า {self.current_page} / {total_pages}")
-        self.prev_page_button.setEnabled(self.current_page > 1)
-        self.next_page_button.setEnabled(self.current_page < total_pages)
-    
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.load_table_data()
-    
-    def next_page(self):
-        # --- FIX: Check against total pages before incrementing ---
-        # This prevents going to a non-existent page and causing pagination errors.
-        total_pages = math.ceil(self.total_items_for_pagination / self.items_per_page) if self.total_items_for_pagination > 0 else 1
-        if self.current_page < total_pages:
-            self.current_page += 1
-            self.load_table_data()
-
-    def format_datetime(self, dt_obj, default_text="-") -> str:
-        if not dt_obj: return default_text
-        dt = QDateTime.fromString(str(dt_obj).split('.')[0], "yyyy-MM-dd HH:mm:ss")
-        if not dt.isValid(): return default_text
-        dt.setTimeSpec(Qt.TimeSpec.UTC)
-        offset_hours = app_config.getint('TIME', 'utc_offset_hours', fallback=7)
-        local_dt = dt.toOffsetFromUtc(offset_hours * 3600)
-        return local_dt.toString("yyyy-MM-dd HH:mm")
+        self.history_table.scrollToTop()
+        self.update_table_status()
+        db_executor.submit(db_instance.count_payment_history, **filters,
+                           key=f"income_dashboard.count.{id(self)}", on_result=self._on_table_count_loaded)
+
+    def _on_table_count_loaded(self, total):
+        self.total_table_rows = total or 0
+        self.update_table_status()
+
+    def update_table_status(self, *_):
+        loaded = self.history_model.rowCount()
+        if self.total_table_rows is None or (self.history_model.is_loading() and not loaded):
+            self.table_status_label.setText("กำลังโหลด...")
+        else:
+            self.table_status_label.setText(f"แสดง {loaded:,} จาก {self.total_table_rows:,} รายการ")
 
     def toggle_theme(self):
         """Toggles the application's theme and updates this dialog."""
@@ -426,7 +404,6 @@ class IncomeDashboard(BaseDialog):
     def apply_filter(self, status: str | None):
         """Applies the selected status filter and reloads the table."""
         self.current_filter_status = status
-        self.current_page = 1
         self.apply_custom_date_range() # Reloads data with the new filter
         self.update_filter_button_state()
 
@@ -476,7 +453,6 @@ class IncomeDashboard(BaseDialog):
     def apply_sort(self, sort_by: str, sort_order: str):
         """Applies the selected sort criteria and reloads items."""
         self.current_sort_criteria = {'by': sort_by, 'order': sort_order}
-        self.current_page = 1
         self.apply_custom_date_range() # Reloads data with the new sort
         self.update_sort_button_state()
 
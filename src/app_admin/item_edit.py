@@ -160,7 +160,8 @@ class ItemDialog(BaseDialog):
         self.adjust_and_center()
 
     def load_item_data(self):
-        item = self.db_instance.get_item_by_id(self.item_id)
+        # Editing needs the full original image, so fetch it with the item in the same query.
+        item = self.db_instance.get_item_by_id(self.item_id, include_image=True)
         if item:
             self.name_input.setText(item.get('name', ''))
             self.brand_input.setText(item.get('brand', ''))
@@ -223,7 +224,7 @@ class ItemDialog(BaseDialog):
                     self.price_input.setText(f"{price_per_minute:.2f}")
                     self.period_combo.setCurrentText("ต่อนาที")
 
-            self.image_data = item.get('image_path')
+            self.image_data = bytes(item['image']) if item.get('image') else None
             if self.image_data:
                 set_image_on_label(self.image_preview_label, self.image_data)
                 self.crop_button.setEnabled(True)
@@ -1,10 +1,11 @@
 from PyQt6.QtWidgets import (
-    QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QWidget,
-    QTableWidgetItem, QHeaderView, QAbstractItemView, QScroller, QLineEdit,
+    QVBoxLayout, QHBoxLayout, QPushButton, QTableView, QWidget,
+    QHeaderView, QAbstractItemView, QScroller, QLineEdit,
     QMenu
 )
 import qtawesome as qta
 from app.base_dialog import BaseDialog
+from app.lazy_table_model import LazyTableModel
 from app_config import app_config
 from theme import PALETTES
 from app_db.db_management import get_db_instance, db_signals
@@ -12,6 +13,32 @@ from PyQt6.QtCore import QModelIndex, Qt, QDateTime
 from app_payment.payment_history_dialog import PaymentHistoryDialog
 from app_user.profile import UserProfileWindow
 from app.custom_message_box import CustomMessageBox
+
+
+class UserTableModel(LazyTableModel):
+    """User rows; the payment status column gets a warning icon and a tooltip with the amounts."""
+    STATUS_COLUMN = 6
+
+    def __init__(self, columns: list, parent=None):
+        super().__init__(columns, parent=parent)
+        self.warning_icon = None # Set by the dialog for the current theme
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and index.column() == self.STATUS_COLUMN:
+            user = self.record(index.row())
+            if user is not None:
+                if role == Qt.ItemDataRole.DecorationRole:
+                    return self.warning_icon if user['pending_count'] else None
+                if role == Qt.ItemDataRole.ToolTipRole:
+                    lines = []
+                    if user['pending_count']:
+                        lines.append(f"ยอดค้างชำระ {float(user['pending_amount']):,.2f} บาท")
+                    if user['active_rentals']:
+                        lines.append(f"กำลังเช่า {user['active_rentals']} รายการ")
+                    return "\n".join(lines) or None
+        return super().data(index, role)
+
+
 class UserManagementDialog(BaseDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -56,9 +83,18 @@ class UserManagementDialog(BaseDialog):
         layout.addWidget(toolbar_widget)
 
         # --- User Table ---
-        self.user_table = QTableWidget()
-        self.user_table.setColumnCount(7)
-        self.user_table.setHorizontalHeaderLabels(["ID", "Username", "ชื่อ", "อีเมล", "เบอร์โทร", "Role", "สถานะชำระเงิน"])
+        # Users are streamed from the database while the table scrolls; search runs in the database too.
+        self.user_model = UserTableModel([
+            ("ID", lambda user: str(user['id'])),
+            ("Username", lambda user: user['username']),
+            ("ชื่อ", lambda user: f"{user['first_name'] or ''} {user['last_name'] or ''}".strip()),
+            ("อีเมล", lambda user: user['email'] or ''),
+            ("เบอร์โทร", lambda user: user['phone'] or ''),
+            ("Role", lambda user: user['role'] or 'user'),
+            ("สถานะชำระเงิน", lambda user: f" ⚠ ค้างชำระ ({user['pending_count']})" if user['pending_count'] else ""),
+        ], parent=self)
+        self.user_table = QTableView()
+        self.user_table.setModel(self.user_model)
         
         header = self.user_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents) # ID
@@ -71,7 +107,7 @@ class UserManagementDialog(BaseDialog):
 
         self.user_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.user_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
-        self.user_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.user_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         # เปลี่ยนกลับไปใช้ doubleClicked เพื่อเปิดหน้าต่างรายละเอียด
         self.user_table.doubleClicked.connect(self.handle_double_click)
         # Enable context menu for right-clicking
@@ -103,46 +139,29 @@ class UserManagementDialog(BaseDialog):
         for button, (icon_name, color) in buttons_with_icons.items():
             button.setIcon(qta.icon(icon_name, color=color))
 
-    def load_users(self): # sourcery skip: extract-method
-        # In remote mode, get_all_users_for_management filters out the super admin.
-        # In local mode, it returns all users. This simplifies the logic here.
-        users = self.db_instance.get_all_users_for_management(is_remote=self.is_remote)
-
-        self.user_table.setRowCount(len(users))
-
-        for row, user in enumerate(users):
-            self.user_table.setItem(row, 0, QTableWidgetItem(str(user['id'])))
-            self.user_table.setItem(row, 1, QTableWidgetItem(user['username']))
-            full_name = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
-            self.user_table.setItem(row, 2, QTableWidgetItem(full_name))
-            self.user_table.setItem(row, 3, QTableWidgetItem(user.get('email', '')))
-            self.user_table.setItem(row, 4, QTableWidgetItem(user.get('phone', '')))
-            self.user_table.setItem(row, 5, QTableWidgetItem(user.get('role', 'user')))
-
-            # Check for pending payments
-            if self.db_instance.has_pending_payments(user['id']):
-                pending_item = QTableWidgetItem(" ⚠ ค้างชำระ")
-                pending_item.setIcon(qta.icon('fa5s.exclamation-circle', color=PALETTES[app_config.get('UI', 'theme', fallback='light')]['warning']))
-                self.user_table.setItem(row, 6, pending_item)
-            else:
-                # Clear the cell if there are no pending payments
-                self.user_table.setItem(row, 6, QTableWidgetItem(""))
+        self.user_model.warning_icon = qta.icon('fa5s.exclamation-circle', color=PALETTES[current_theme_name]['warning'])
+        self.user_table.viewport().update()
+
+    def load_users(self):
+        """Shows the users matching the search box from the top; more are fetched while scrolling."""
+        # In remote mode, get_users_with_status_page filters out the super admin.
+        # Payment and rental status come back with each page of users.
+        db_instance = self.db_instance
+        search_text = self.search_input.text()
+        is_remote = self.is_remote
+        self.user_model.set_query(
+            lambda after_key, limit: db_instance.get_users_with_status_page(limit, after_key=after_key, search_text=search_text, is_remote=is_remote),
+            db_instance.users_key
+        )
+        self.user_table.scrollToTop()
+
+    def refresh_users(self):
+        """Reloads the users already shown, e.g. after one of them changed."""
+        self.user_model.reload()
 
     def filter_users(self):
-        """Filters the user table based on the search input text."""
-        filter_text = self.search_input.text().lower().strip()
-        for row in range(self.user_table.rowCount()):
-            should_show = False
-            if not filter_text:
-                should_show = True
-            else:
-                # Iterate through all columns to check for a match
-                for col in range(self.user_table.columnCount()):
-                    item = self.user_table.item(row, col)
-                    if item and filter_text in item.text().lower():
-                        should_show = True
-                        break
-            self.user_table.setRowHidden(row, not should_show)
+        """Searches users by ID, username, name, email, phone or role in the database."""
+        self.load_users()
 
     def show_user_context_menu(self, pos):
         """Shows a context menu on right-click, only for Super Admin."""
@@ -150,12 +169,12 @@ class UserManagementDialog(BaseDialog):
         if not is_super_admin:
             return
 
-        selected_item = self.user_table.itemAt(pos)
-        if not selected_item:
+        user = self.user_model.record(self.user_table.indexAt(pos).row())
+        if not user:
             return
 
-        user_id = int(self.user_table.item(selected_item.row(), 0).text())
-        current_role = self.user_table.item(selected_item.row(), 5).text()
+        user_id = user['id']
+        current_role = user['role'] or 'user'
 
         menu = QMenu(self)
         menu.addSection(f"User ID: {user_id}")
@@ -178,19 +197,14 @@ class UserManagementDialog(BaseDialog):
         """Updates the user's role in the database."""
         self.db_instance.update_user_role(user_id, new_role)
         CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"เปลี่ยน Role ของผู้ใช้ ID: {user_id} เป็น '{new_role}' เรียบร้อยแล้ว")
-        self.load_users()
+        self.refresh_users()
 
     def get_selected_user_id(self):
-        selected_items = self.user_table.selectedItems()
-        if not selected_items:
+        selected_rows = self.user_table.selectionModel().selectedRows()
+        if not selected_rows:
             return None
-        # แก้ไข: ดึงข้อมูลจากแถวที่เลือก ไม่ใช่จากเซลล์ที่คลิกโดยตรง
-        # เพื่อให้แน่ใจว่าจะได้ ID เสมอ
-        selected_row = selected_items[0].row()
-        id_item = self.user_table.item(selected_row, 0)
-        if id_item:
-            return int(id_item.text())
-        return None
+        user = self.user_model.record(selected_rows[0].row())
+        return user['id'] if user else None
 
     def add_user(self):
         # ใช้ UserProfileWindow ในโหมด "เพิ่ม" (โดยไม่ส่ง user_data)
@@ -230,7 +244,10 @@ class UserManagementDialog(BaseDialog):
 
     def handle_double_click(self, index: QModelIndex):
         """Handles double-clicking on a user row to open their payment history."""
-        user_id = int(self.user_table.item(index.row(), 0).text())
+        user = self.user_model.record(index.row())
+        if not user:
+            return
+        user_id = user['id']
         user_data = self.db_instance.get_user_by_id(user_id)
         if user_data:
             # --- Non-Modal Logic ---
@@ -282,13 +299,13 @@ class UserManagementDialog(BaseDialog):
             if self.db_instance.delete_user(user_id):
                 # The delete_user method in DB does not emit a signal, so we do it manually or refresh here.
                 CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "ลบผู้ใช้เรียบร้อยแล้ว")
-                self.load_users()
+                self.refresh_users()
             else:
                 CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถลบผู้ใช้ได้ อาจมีข้อมูลการยืม-คืนที่เกี่ยวข้อง")
 
-    def on_data_changed(self, table_name: str):
+    def on_data_changed(self, table_name: str, operation: str = '', ids: list | None = None):
         if table_name == 'users' or table_name == 'items': # Items can affect payment status
-            self.load_users()
+            self.refresh_users()
 
     def on_child_window_closed(self, window_type: str, key=None):
         if window_type == 'payment_history' and key in self.payment_history_dialogs:
@@ -123,11 +123,27 @@ class AppConfig:
             'port': '5432',
             'database': 'postgres',
             'user': 'postgres',
-            'password': ''
+            'password': '',
+            'pool_min_size': '1',
+            'pool_max_size': '5',
+            'pool_timeout_seconds': '30',
+            'pool_ping_interval_seconds': '30',
+            'executor_threads': '3',
+            'query_stats_enabled': 'False',
+            'slow_query_ms': '200',
+            'settings_refresh_seconds': '5',
+            'change_notifications_enabled': 'True'
         }
         self.config['LOCAL_DATABASE'] = {
             # Use forward slashes for consistency in config files
-            'path': os.path.join(APP_ROOT, 'local_mika_rental.db').replace('\\', '/')
+            'path': os.path.join(APP_ROOT, 'local_mika_rental.db').replace('\\', '/'),
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size_mb': '32',
+            'mmap_size_mb': '128',
+            'busy_timeout_ms': '5000',
+            'maintenance_interval_minutes': '30',
+            'analyze_interval_hours': '24'
         }
         # Hash the default admin password for better security
         default_admin_pass = 'admin1234'
@@ -141,7 +157,10 @@ class AppConfig:
         }
         self.config['UI'] = {
             'theme': 'light',
-            'auto_logout_minutes': '15'  # Default to 15 minutes, 0 to disable
+            'auto_logout_minutes': '15',  # Default to 15 minutes, 0 to disable
+            'image_cache_mb': '64',
+            'image_disk_cache_enabled': 'True',
+            'image_disk_cache_mb': '100'
         }
         self.config['TIMEZONES'] = {
             "UTC+07:00 Bangkok, Hanoi, Jakarta": "7", # ใช้ : แทน =
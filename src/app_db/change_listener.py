@@ -0,0 +1,98 @@
+import json
+import select
+import threading
+import logging
+from app_db.migrations import NOTIFY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Notifications arriving this close together (e.g. the rows of one transaction) are dispatched as one batch.
+COALESCE_SECONDS = 0.05
+
+
+class ChangeListener:
+    """
+    Background thread that LISTENs for the change notifications published by the server's
+    triggers (migration 12) and passes them to `dispatch` in batches.
+
+    Notifications sent by this process's own connections (`own_pids`) are dropped, since
+    DBManagement already emitted signals for those. After a lost connection is re-established,
+    a synthetic 'resync' change is dispatched for each table because notifications sent in the
+    meantime are gone.
+    """
+
+    def __init__(self, connect, dispatch, own_pids: set, poll_seconds: float = 1.0, reconnect_seconds: float = 5.0):
+        self._connect = connect
+        self._dispatch = dispatch
+        self._own_pids = own_pids
+        self.poll_seconds = poll_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._conn = None
+        self.connected = False
+        self.received = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='db-change-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        has_connected = False
+        while not self._stop_event.is_set():
+            try:
+                self._conn = self._connect()
+                self._conn.autocommit = True
+                self._conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                self.connected = True
+                logger.info(f"Listening for changes from other clients on '{NOTIFY_CHANNEL}'.")
+                if has_connected:
+                    self._dispatch([{'table': table, 'op': 'resync', 'id': None} for table in ('items', 'rental_history', 'users')])
+                has_connected = True
+                self._listen()
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    logger.warning(f"Change listener lost its connection, retrying in {self.reconnect_seconds}s: {e}")
+            finally:
+                self.connected = False
+                if self._conn is not None:
+                    try:
+                        self._conn.close()
+                    except Exception:
+                        pass
+                    self._conn = None
+            self._stop_event.wait(self.reconnect_seconds)
+
+    def _listen(self):
+        conn = self._conn
+        while not self._stop_event.is_set():
+            if not select.select([conn], [], [], self.poll_seconds)[0]:
+                continue
+            conn.poll()
+            # Collect the rest of the burst before dispatching.
+            while select.select([conn], [], [], COALESCE_SECONDS)[0]:
+                conn.poll()
+            changes = []
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                self.received += 1
+                if notify.pid in self._own_pids:
+                    continue
+                try:
+                    changes.append(json.loads(notify.payload))
+                except ValueError:
+                    logger.warning(f"Ignoring malformed change notification: {notify.payload!r}")
+            if changes:
+                try:
+                    self._dispatch(changes)
+                except Exception as e:
+                    logger.error(f"Failed to dispatch {len(changes)} change notification(s): {e}", exc_info=True)
@@ -0,0 +1,268 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(ConnectionError):
+    """Raised when no pooled connection becomes available within the acquire timeout."""
+
+
+class _Lease:
+    """Book-keeping for a single pooled connection."""
+    __slots__ = ('conn', 'cursor', 'thread', 'last_checked')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = None
+        self.thread = None
+        self.last_checked = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of DB-API connections with per-thread affinity.
+
+    A thread that asks for a connection keeps the same one until it calls
+    release() (or until the thread dies and the connection is reclaimed), so
+    a transaction started by the GUI thread can never be interleaved with
+    statements from the webhook thread.
+    """
+
+    def __init__(self, connect_factory, min_size: int = 1, max_size: int = 5,
+                 acquire_timeout: float = 30.0, ping_interval: float = 30.0,
+                 cursor_factory=None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect_factory = connect_factory
+        self._cursor_factory = cursor_factory
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.ping_interval = ping_interval
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle: list[_Lease] = []
+        self._leases: dict[int, _Lease] = {}  # {thread_ident: lease}
+        self._size = 0  # Connections currently open (idle + leased + being opened)
+        self._waiters = 0
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'waits': 0,
+            'total_wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'timeouts': 0,
+            'ping_failures': 0,
+            'reclaimed': 0,
+        }
+
+        for _ in range(self.min_size):
+            self._size += 1
+            self._idle.append(self._open_lease())
+
+    # --- Connection lifecycle ---
+    def _open_lease(self) -> _Lease:
+        """
+        Opens a new physical connection for a slot the caller has already
+        reserved in self._size. The slot is released again if connecting fails.
+        """
+        try:
+            conn = self._connect_factory()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return _Lease(conn)
+
+    def _discard(self, lease: _Lease):
+        """Closes a connection that is no longer usable and frees its slot."""
+        try:
+            if not lease.conn.closed:
+                lease.conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+    def _ping(self, lease: _Lease) -> bool:
+        """Runs a trivial query to verify the connection is still alive."""
+        if lease.conn.closed:
+            return False
+        get_status = getattr(lease.conn, 'get_transaction_status', None)
+        if get_status is not None and get_status() != 0:
+            # The connection is mid-transaction; pinging would roll back the caller's work.
+            return True
+        try:
+            with lease.conn.cursor() as ping_cursor:
+                ping_cursor.execute("SELECT 1")
+                ping_cursor.fetchone()
+            lease.conn.rollback()
+            lease.last_checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed pre-ping, discarding it: {e}")
+            with self._lock:
+                self._stats['ping_failures'] += 1
+            return False
+
+    def _prepare_idle(self, lease: _Lease) -> bool:
+        """Clears any transaction left behind by a previous owner and pre-pings stale connections."""
+        get_status = getattr(lease.conn, 'get_transaction_status', None)
+        if get_status is not None and get_status() != 0:
+            try:
+                lease.conn.rollback()
+            except Exception:
+                return False
+        if time.monotonic() - lease.last_checked >= self.ping_interval:
+            return self._ping(lease)
+        return True
+
+    def _reclaim_dead_leases(self) -> int:
+        """Returns connections held by threads that have exited. Caller must hold the lock."""
+        reclaimed = 0
+        for ident, lease in list(self._leases.items()):
+            if lease.thread is not None and not lease.thread.is_alive():
+                del self._leases[ident]
+                lease.thread = None
+                lease.cursor = None
+                self._idle.append(lease)
+                reclaimed += 1
+        if reclaimed:
+            self._stats['reclaimed'] += reclaimed
+            logger.debug(f"Reclaimed {reclaimed} pooled connection(s) from exited threads.")
+        return reclaimed
+
+    # --- Public API ---
+    def acquire(self):
+        """
+        Returns the connection leased to the calling thread, leasing one from
+        the pool first if necessary. Blocks up to acquire_timeout seconds when
+        every connection is in use by other threads.
+        """
+        ident = threading.get_ident()
+        lease = self._leases.get(ident)
+        if lease is not None:
+            if time.monotonic() - lease.last_checked < self.ping_interval or self._ping(lease):
+                return lease.conn
+            # The thread's own connection went away (e.g. server restart); replace it.
+            with self._lock:
+                self._leases.pop(ident, None)
+            self._discard(lease)
+
+        while True:
+            lease = self._checkout()
+            if lease.conn is None:
+                # A free slot was reserved for us; open a fresh connection outside the lock.
+                lease = self._open_lease()
+            elif not self._prepare_idle(lease):
+                self._discard(lease)
+                continue
+
+            with self._lock:
+                lease.thread = threading.current_thread()
+                self._leases[ident] = lease
+                self._stats['checkouts'] += 1
+            return lease.conn
+
+    def _checkout(self) -> _Lease:
+        """Takes an idle lease, or reserves a slot for a new one (signalled by conn=None)."""
+        start = time.monotonic()
+        waited = False
+        with self._lock:
+            try:
+                while True:
+                    if self._closed:
+                        raise ConnectionError("Connection pool has been closed.")
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1  # Reserve the slot; _open_lease() fills it
+                        return _Lease(None)
+                    if self._reclaim_dead_leases():
+                        continue
+
+                    remaining = self.acquire_timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.acquire_timeout:.0f}s waiting for a database connection "
+                            f"({self._size}/{self.max_size} in use)."
+                        )
+                    waited = True
+                    self._waiters += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+            finally:
+                if waited:
+                    elapsed = time.monotonic() - start
+                    self._stats['waits'] += 1
+                    self._stats['total_wait_time'] += elapsed
+                    self._stats['max_wait_time'] = max(self._stats['max_wait_time'], elapsed)
+
+    def cursor(self):
+        """Returns the calling thread's cursor on its leased connection."""
+        conn = self.acquire()
+        lease = self._leases[threading.get_ident()]
+        if lease.cursor is None or lease.cursor.closed:
+            if self._cursor_factory is not None:
+                lease.cursor = conn.cursor(cursor_factory=self._cursor_factory)
+            else:
+                lease.cursor = conn.cursor()
+        return lease.cursor
+
+    def release(self):
+        """Returns the calling thread's connection to the pool, rolling back any open transaction."""
+        with self._lock:
+            lease = self._leases.pop(threading.get_ident(), None)
+        if lease is None:
+            return
+        try:
+            lease.conn.rollback()
+        except Exception:
+            self._discard(lease)
+            return
+        with self._lock:
+            lease.thread = None
+            lease.cursor = None
+            self._idle.append(lease)
+            self._lock.notify()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of pool usage counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                'size': self._size,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._leases),
+                'waiters': self._waiters,
+            })
+        snapshot['avg_wait_time'] = (snapshot['total_wait_time'] / snapshot['waits']) if snapshot['waits'] else 0.0
+        return snapshot
+
+    def close_all(self):
+        """Closes every connection, including those currently leased to other threads."""
+        with self._lock:
+            self._closed = True
+            leases = self._idle + list(self._leases.values())
+            self._idle = []
+            self._leases = {}
+            self._size -= len(leases)
+            self._lock.notify_all()
+        for lease in leases:
+            try:
+                lease.conn.close()
+            except Exception:
+                pass
+        logger.info("Connection pool closed.")
@@ -0,0 +1,137 @@
+import logging
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from app_config import app_config
+from app_db.db_management import release_thread_connection
+
+logger = logging.getLogger(__name__)
+
+
+class DBRequest(QObject):
+    """
+    Handle for one background database call.
+
+    `finished(result)` or `failed(exception)` is emitted on the GUI thread,
+    unless the request was cancelled first, in which case nothing is emitted.
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    # Internal: emitted from the worker thread, delivered to _deliver() on the GUI thread.
+    _completed = pyqtSignal(bool, object)
+
+    def __init__(self, key=None, parent=None):
+        super().__init__(parent)
+        self.key = key
+        self._cancelled = False
+        self._done = False
+        self._completed.connect(self._deliver)
+
+    def cancel(self):
+        """Drops the result. The query itself still finishes on its worker thread."""
+        self._cancelled = True
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def is_done(self) -> bool:
+        return self._done
+
+    @pyqtSlot(bool, object)
+    def _deliver(self, ok: bool, payload):
+        self._done = True
+        executor = self.parent()
+        if isinstance(executor, DBExecutor):
+            executor._forget(self)
+        if self._cancelled:
+            return
+        if ok:
+            self.finished.emit(payload)
+        else:
+            self.failed.emit(payload)
+
+
+class _DBRunnable(QRunnable):
+    def __init__(self, request: DBRequest, func, args, kwargs):
+        super().__init__()
+        self.request = request
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        if self.request.is_cancelled():
+            self.request._completed.emit(False, None)
+            return
+        try:
+            result = self.func(*self.args, **self.kwargs)
+            self.request._completed.emit(True, result)
+        except Exception as e:
+            logger.error(f"Background database call {getattr(self.func, '__name__', self.func)} failed: {e}", exc_info=True)
+            self.request._completed.emit(False, e)
+        finally:
+            # Pool threads are reused; don't let an idle worker hold a remote connection.
+            release_thread_connection()
+
+
+class DBExecutor(QObject):
+    """
+    Runs database calls on a small thread pool so the Qt event loop never waits on a query.
+
+    Usage:
+        request = db_executor.submit(db.get_all_items, key='main_items',
+                                     on_result=self.show_items, on_error=self.show_error)
+
+    Submitting with a `key` cancels any earlier request with the same key that has not
+    been delivered yet, so only the latest of several quick filter changes is shown.
+    """
+
+    def __init__(self, max_threads: int | None = None, parent=None):
+        super().__init__(parent)
+        self._thread_pool = QThreadPool()
+        self._thread_pool.setMaxThreadCount(max_threads or app_config.getint('DATABASE', 'executor_threads', fallback=3))
+        # Keep workers alive: each one holds its own local SQLite connection (see LocalConnectionManager),
+        # and reused threads keep that connection's page cache warm.
+        self._thread_pool.setExpiryTimeout(-1)
+        self._pending: set[DBRequest] = set()
+        self._latest: dict = {} # {key: DBRequest}
+
+    def submit(self, func, *args, key=None, on_result=None, on_error=None, **kwargs) -> DBRequest:
+        """Runs func(*args, **kwargs) on a worker thread and returns its DBRequest handle."""
+        if key is not None:
+            self.cancel(key)
+        request = DBRequest(key, parent=self)
+        if on_result is not None:
+            request.finished.connect(on_result)
+        if on_error is not None:
+            request.failed.connect(on_error)
+        self._pending.add(request)
+        if key is not None:
+            self._latest[key] = request
+        self._thread_pool.start(_DBRunnable(request, func, args, kwargs))
+        return request
+
+    def cancel(self, key):
+        """Cancels the outstanding request submitted with `key`, if any."""
+        request = self._latest.pop(key, None)
+        if request is not None:
+            request.cancel()
+
+    def cancel_all(self):
+        for request in list(self._pending):
+            request.cancel()
+        self._latest.clear()
+
+    def _forget(self, request: DBRequest):
+        self._pending.discard(request)
+        if request.key is not None and self._latest.get(request.key) is request:
+            del self._latest[request.key]
+        request.deleteLater()
+
+    def shutdown(self, timeout_ms: int = 5000):
+        """Cancels outstanding requests and waits for running queries to finish. Called on application exit."""
+        self.cancel_all()
+        if not self._thread_pool.waitForDone(timeout_ms):
+            logger.warning("Timed out waiting for background database calls to finish.")
+
+
+# Shared executor for the GUI. Create requests from the GUI thread only.
+db_executor = DBExecutor()
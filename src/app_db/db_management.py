@@ -6,26 +6,153 @@ import os
 import mysql.connector
 import psycopg2
 import logging
+import threading
+import functools
 from datetime import datetime, timedelta
 from app_config import app_config, AppConfig
 import json
 from PyQt6.QtCore import QObject, pyqtSignal
+from app_db.connection_pool import ConnectionPool
+from app_db.image_utils import make_thumbnail, hash_image
+from app_db.migrations import apply_migrations
+from app_db.query_stats import query_stats, InstrumentedCursor
+from app_db.records import record_factory
+from app_db import sqlite_tuning
+from app_db.local_connections import LocalConnectionManager, defer_signal
+from app_db.settings_cache import SettingsCache
+from app_db import server_functions
+from app_db.change_listener import ChangeListener
 
 logger = logging.getLogger(__name__)
 
+# Item columns returned by catalog/detail queries. Item images live in the
+# separate item_images table: catalog rows only carry the small thumbnail and
+# its hash, and the full image is fetched on demand with get_item_image().
+ITEM_COLUMNS = (
+    "i.id, i.name, i.brand, i.description, i.status, i.current_renter_id, "
+    "i.price_per_minute, i.price_unit, i.price_model, i.fixed_fee, "
+    "i.grace_period_minutes, i.minimum_charge, i.renter_username, i.rent_date"
+)
+# Returned by _call_server_function() when the server has no (usable) function bundle.
+_NO_SERVER_FUNCTION = object()
+
+# Backend PIDs of the server connections this process has open. Change notifications
+# from these are ignored by the ChangeListener: we already emitted their signals.
+# A PID is removed when its connection closes, since the server reuses PIDs.
+_own_backend_pids: set[int] = set()
+
+
+class _TrackedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that keeps its backend PID in _own_backend_pids while it is open."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.backend_pid = self.get_backend_pid()
+        _own_backend_pids.add(self.backend_pid)
+
+    def close(self):
+        _own_backend_pids.discard(self.backend_pid)
+        super().close()
+
+ITEM_CATALOG_SELECT = f"""
+    SELECT {ITEM_COLUMNS}, img.thumbnail, img.image_hash
+    FROM items i
+    LEFT JOIN item_images img ON img.item_id = i.id
+"""
+
 class DBMgmtSignals(QObject): # sourcery skip: snake-case-functions
     item_status_changed = pyqtSignal(int, str) # item_id, new_status
     payment_status_updated = pyqtSignal(int) # user_id
-    data_changed = pyqtSignal(str) # table_name (e.g., 'items', 'users')
+    # table_name (e.g., 'items', 'users'), operation ('insert', 'update', 'delete'), affected row ids.
+    # An empty operation and id list mean "anything may have changed": listeners reload everything.
+    data_changed = pyqtSignal(str, str, list)
     server_encryption_key_missing = pyqtSignal()
 
 db_signals = DBMgmtSignals()
 
+def _emit(signal, *args):
+    """Emits a db_signals signal; on the local writer thread it is held until the batch commits."""
+    if not defer_signal(signal, args):
+        signal.emit(*args)
+
+def serialized_write(method):
+    """
+    Runs a DBManagement write method on the local database's writer thread and waits for it,
+    so writes from the GUI and the webhook thread never interleave, and a write that fails is
+    always rolled back by the writer instead of leaving a transaction (and the database's
+    write lock) open on the caller's connection. Remote instances and calls already on the
+    writer run directly.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        local_db = self._local_db
+        if local_db is None or local_db.writer.is_writer_thread():
+            return method(self, *args, **kwargs)
+        return local_db.writer.call(method, self, *args, **kwargs)
+    return wrapper
+
 class DBManagement:
     def __init__(self):
+        self._pool: ConnectionPool | None = None
         self.conn = None
         self.cursor = None
         self.paramstyle = '?' # Default to SQLite's parameter style
+        self._search_backend: str | None = None # Detected lazily by _get_search_backend()
+        self._server_functions: bool | None = None # Detected lazily by uses_server_functions()
+        self._db_path: str | None = None # Local SQLite file, if this is a local instance
+        self._local_db: LocalConnectionManager | None = None
+        # Decrypted system_settings, refreshed when another client bumps settings_version.
+        self._settings_cache = SettingsCache(self, app_config.getint('DATABASE', 'settings_refresh_seconds', fallback=5))
+        self._maintenance: sqlite_tuning.SQLiteMaintenance | None = None
+        self._change_listener: ChangeListener | None = None
+
+    # --- Connection access ---
+    # For pooled (remote) and local instances, `conn` and `cursor` resolve to the
+    # connection of the calling thread, so the GUI thread and the webhook thread never
+    # share a transaction. Dedicated remote instances keep a single connection.
+    @property
+    def conn(self):
+        if self._pool is not None:
+            return self._pool.acquire()
+        if self._local_db is not None:
+            return self._local_db.connection()
+        return self._conn
+
+    @conn.setter
+    def conn(self, value):
+        self._conn = value
+
+    @property
+    def cursor(self):
+        cursor = self._thread_cursor()
+        if query_stats.enabled and cursor is not None:
+            return InstrumentedCursor(cursor, query_stats)
+        return cursor
+
+    @cursor.setter
+    def cursor(self, value):
+        self._cursor = value
+        self._cursor_owner = threading.get_ident()
+        self._thread_cursors = threading.local()
+
+    def _thread_cursor(self):
+        if self._pool is not None:
+            return self._pool.cursor()
+        if self._local_db is not None:
+            return self._local_db.cursor()
+        if self._cursor is None or threading.get_ident() == self._cursor_owner:
+            return self._cursor
+        # Other threads (see db_executor) get their own cursor on the shared connection,
+        # so a background query never clobbers a result set the GUI thread is reading.
+        thread_cursor = getattr(self._thread_cursors, 'cursor', None)
+        if thread_cursor is None:
+            if isinstance(self._conn, sqlite3.Connection):
+                thread_cursor = self._conn.cursor()
+            else:
+                from psycopg2.extras import DictCursor
+                thread_cursor = self._conn.cursor(cursor_factory=DictCursor)
+            self._thread_cursors.cursor = thread_cursor
+        return thread_cursor
 
     def initialize_connections(self):
         """
@@ -81,19 +208,6 @@ class DBManagement:
             _remote_instance.close_connection()
         logger.info("All managed database connections closed.")
 
-    def _setup_cursor_and_paramstyle(self):
-        """Sets up the cursor and paramstyle based on the connection type."""
-        if isinstance(self.conn, sqlite3.Connection):
-            self.conn.row_factory = self._dict_factory
-            self.cursor = self.conn.cursor()
-            self.paramstyle = '?'
-        elif hasattr(self.conn, 'cursor'): # For psycopg2
-            from psycopg2.extras import DictCursor
-            self.cursor = self.conn.cursor(cursor_factory=DictCursor)
-            self.paramstyle = '%s'
-        else:
-            raise TypeError("Unsupported database connection type.")
-
     def _connect_local(self):
         """Connect to the local SQLite database."""
         from app_config import APP_ROOT
@@ -102,12 +216,65 @@ class DBManagement:
 
         # if not os.path.exists(db_path):
         #     raise FileNotFoundError(f"Local database file not found at: {db_path}")
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = self._dict_factory
-        self.cursor = self.conn.cursor()
-        self._setup_cursor_and_paramstyle()
+        settings = sqlite_tuning.read_local_settings(app_config)
+        # Each thread gets its own connection; serialized writes go through the manager's writer thread.
+        self._local_db = LocalConnectionManager(db_path, settings, row_factory=record_factory)
+        self._db_path = db_path
+        journal_mode = self.conn.execute("PRAGMA journal_mode").fetchall()[0][0]
         self.paramstyle = '?'
-        logger.info("Connected to local SQLite database at %s", db_path)
+        self._start_maintenance(settings)
+        logger.info("Connected to local SQLite database at %s (journal_mode=%s)", db_path, journal_mode)
+
+    def _start_maintenance(self, settings: dict):
+        if self._maintenance is not None:
+            self._maintenance.stop()
+        self._maintenance = sqlite_tuning.SQLiteMaintenance(self._db_path, settings)
+        self._maintenance.start()
+
+    def apply_local_settings(self) -> bool:
+        """
+        Re-reads the [LOCAL_DATABASE] tuning options and applies them to the open SQLite
+        connections, restarting the maintenance thread with the new interval.
+        Returns False if this is not a connected local instance.
+        """
+        if self._local_db is None:
+            return False
+        settings = sqlite_tuning.read_local_settings(app_config)
+        try:
+            self._local_db.apply_settings(settings)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to apply local database settings: {e}", exc_info=True)
+            return False
+        self._start_maintenance(settings)
+        return True
+
+    def run_local_maintenance(self) -> dict | None:
+        """Runs a WAL checkpoint and ANALYZE on the local database now. Returns None for non-local instances."""
+        if self._maintenance is None:
+            return None
+        try:
+            return self._maintenance.run_once(force_analyze=True)
+        except sqlite3.Error as e:
+            logger.error(f"Local database maintenance failed: {e}", exc_info=True)
+            return None
+
+    @staticmethod
+    def _open_remote_connection(config_to_use):
+        """Opens a new psycopg2 connection using the [DATABASE] section of the given config."""
+        # --- FIX: Check for password before attempting to connect ---
+        password = config_to_use.get('DATABASE', 'password')
+        if not password:
+            raise ConnectionError("กรุณาตั้งรหัสผ่านสำหรับฐานข้อมูลเซิร์ฟเวอร์ในหน้าตั้งค่า")
+
+        conn = psycopg2.connect(
+            host=config_to_use.get('DATABASE', 'host', '').strip(),
+            port=config_to_use.getint('DATABASE', 'port'),
+            dbname=config_to_use.get('DATABASE', 'database', '').strip(),
+            user=config_to_use.get('DATABASE', 'user', '').strip(),
+            password=password,
+            connection_factory=_TrackedConnection
+        )
+        return conn
 
     def _connect_remote(self, config_object=None):
         """Connect to the remote database based on config."""
@@ -115,18 +282,7 @@ class DBManagement:
         config_to_use = config_object if config_object else app_config
         # Since we only support PostgreSQL now, we connect directly.
         try:
-            # --- FIX: Check for password before attempting to connect ---
-            password = config_to_use.get('DATABASE', 'password')
-            if not password:
-                raise ConnectionError("กรุณาตั้งรหัสผ่านสำหรับฐานข้อมูลเซิร์ฟเวอร์ในหน้าตั้งค่า")
-
-            self.conn = psycopg2.connect(
-                host=config_to_use.get('DATABASE', 'host', '').strip(),
-                port=config_to_use.getint('DATABASE', 'port'),
-                dbname=config_to_use.get('DATABASE', 'database', '').strip(),
-                user=config_to_use.get('DATABASE', 'user', '').strip(),
-                password=password
-            )
+            self.conn = self._open_remote_connection(config_to_use)
             from psycopg2.extras import DictCursor
             self.cursor = self.conn.cursor(cursor_factory=DictCursor)
             self.paramstyle = '%s'
@@ -142,171 +298,142 @@ class DBManagement:
             logger.error(f"An unexpected error occurred during remote DB connection: {e}", exc_info=True)
             raise ConnectionError(f"เกิดข้อผิดพลาดที่ไม่คาดคิดในการเชื่อมต่อฐานข้อมูล:\n{e}")
 
+    def _start_change_listener(self, config_to_use):
+        """Starts listening for changes made by other clients, unless DATABASE.change_notifications_enabled is off."""
+        if config_to_use.get('DATABASE', 'change_notifications_enabled', fallback='True').lower() != 'true':
+            return
+        self._change_listener = ChangeListener(
+            connect=lambda: self._open_remote_connection(config_to_use),
+            dispatch=self._dispatch_remote_changes,
+            own_pids=_own_backend_pids,
+        )
+        self._change_listener.start()
+
+    @staticmethod
+    def _dispatch_remote_changes(changes: list[dict]):
+        """
+        Re-emits a batch of changes made by other clients as db_signals, one data_changed
+        per table and operation, the same way local writes do. Runs on the listener thread;
+        Qt queues the slots onto the GUI thread.
+        """
+        changed_ids = {} # (table, operation) -> ids
+        reload_tables = set()
+        item_statuses = {}
+        payment_users = set()
+        for change in changes:
+            table, operation, row_id = change.get('table'), change.get('op'), change.get('id')
+            if table == 'rental_history':
+                # New history rows come with an items change; updates are returns and payments.
+                if operation == 'insert':
+                    continue
+                table, operation, row_id = 'users', 'update', change.get('user_id')
+                if row_id is not None:
+                    payment_users.add(row_id)
+            elif table == 'items' and change.get('status') and operation != 'delete':
+                item_statuses[row_id] = change['status']
+            if table not in ('items', 'users'):
+                continue
+            if operation == 'resync' or row_id is None:
+                reload_tables.add(table)
+            else:
+                changed_ids.setdefault((table, operation), set()).add(row_id)
+
+        for item_id, status in item_statuses.items():
+            db_signals.item_status_changed.emit(item_id, status)
+        for user_id in payment_users:
+            db_signals.payment_status_updated.emit(user_id)
+        for table in sorted(reload_tables):
+            db_signals.data_changed.emit(table, '', [])
+        for (table, operation), ids in sorted(changed_ids.items()):
+            if table not in reload_tables:
+                db_signals.data_changed.emit(table, operation, sorted(ids))
+
+    def _connect_remote_pool(self, config_object=None):
+        """
+        Connect to the remote database through a bounded connection pool.
+        Used for the shared remote instance so that the GUI thread, the webhook
+        thread and any worker threads each get their own connection.
+        """
+        config_to_use = config_object if config_object else app_config
+        from psycopg2.extras import DictCursor
+        try:
+            self._pool = ConnectionPool(
+                connect_factory=lambda: self._open_remote_connection(config_to_use),
+                min_size=config_to_use.getint('DATABASE', 'pool_min_size', fallback=1),
+                max_size=config_to_use.getint('DATABASE', 'pool_max_size', fallback=5),
+                acquire_timeout=config_to_use.getint('DATABASE', 'pool_timeout_seconds', fallback=30),
+                ping_interval=config_to_use.getint('DATABASE', 'pool_ping_interval_seconds', fallback=30),
+                cursor_factory=DictCursor,
+            )
+            self.paramstyle = '%s'
+            logger.info("Successfully connected to remote PostgreSQL database (pooled).")
+            self._migrate_remote_schema()
+            self._start_change_listener(config_to_use)
+        except psycopg2.OperationalError as e:
+            logger.error(f"Remote DB connection failed (OperationalError): {e}", exc_info=True)
+            raise ConnectionError(f"ไม่สามารถเชื่อมต่อฐานข้อมูลเซิร์ฟเวอร์ได้:\n{e}")
+        except Exception as e:
+            logger.error(f"An unexpected error occurred during remote DB connection: {e}", exc_info=True)
+            raise ConnectionError(f"เกิดข้อผิดพลาดที่ไม่คาดคิดในการเชื่อมต่อฐานข้อมูล:\n{e}")
+
+    def release_connection(self):
+        """
+        Returns the calling thread's pooled connection to the pool.
+        Worker threads (e.g. webhook requests) should call this when they are done.
+        For local instances, rolls back anything the thread left uncommitted.
+        """
+        if self._pool is not None:
+            self._pool.release()
+        elif self._local_db is not None:
+            self._local_db.release()
+
+    def get_pool_stats(self) -> dict:
+        """Returns connection pool usage statistics, or an empty dict if this instance is not pooled."""
+        if self._pool is None:
+            return {}
+        return self._pool.stats()
+
     def _migrate_remote_schema(self):
         """
-        Checks for and applies necessary schema migrations to the remote PostgreSQL database.
-        This ensures backward compatibility with older database schemas.
+        Applies any pending versioned migrations to the remote PostgreSQL database.
+        On an up-to-date server this is a single version check. A server that has
+        not been initialized yet is left alone until 'db init-server' is run.
         """
         if not self.cursor or not self.conn:
             return
         try:
-            # --- Migration for payment system in 'rental_history' table ---
-            self.cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_schema = 'public' AND table_name = 'rental_history'
-            """)
-            history_columns = [row['column_name'] for row in self.cursor.fetchall()]
-            history_migrations = {
-                'amount_due': "ALTER TABLE rental_history ADD COLUMN amount_due NUMERIC(10, 2)",
-                'payment_status': "ALTER TABLE rental_history ADD COLUMN payment_status VARCHAR(20)",
-                'payment_date': "ALTER TABLE rental_history ADD COLUMN payment_date TIMESTAMP",
-                'transaction_ref': "ALTER TABLE rental_history ADD COLUMN transaction_ref VARCHAR(255)",
-                'slip_sender': "ALTER TABLE rental_history ADD COLUMN slip_sender VARCHAR(255)",
-                'slip_receiver': "ALTER TABLE rental_history ADD COLUMN slip_receiver VARCHAR(255)",
-                'slip_transacted_at': "ALTER TABLE rental_history ADD COLUMN slip_transacted_at TIMESTAMP",
-                'slip_data_json': "ALTER TABLE rental_history ADD COLUMN slip_data_json TEXT"
-            }
-            for col, sql in history_migrations.items():
-                if col not in history_columns:
-                    self.cursor.execute(sql)
-            # --- Migration for new pricing model in 'items' table ---
-            self.cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_schema = 'public' AND table_name = 'items'
-            """)
-            item_columns = [row['column_name'] for row in self.cursor.fetchall()]
-
-            migrations = {
-                'price_model': "ALTER TABLE items ADD COLUMN price_model VARCHAR(50) DEFAULT 'per_minute'",
-                'fixed_fee': "ALTER TABLE items ADD COLUMN fixed_fee NUMERIC(10, 2) DEFAULT 0.0",
-                'grace_period_minutes': "ALTER TABLE items ADD COLUMN grace_period_minutes INTEGER DEFAULT 0",
-                'minimum_charge': "ALTER TABLE items ADD COLUMN minimum_charge NUMERIC(10, 2) DEFAULT 0.0"
-            }
-
-            for col, sql in migrations.items():
-                if col not in item_columns:
-                    self.cursor.execute(sql)
-            self.conn.commit()
+            apply_migrations(self, 'postgresql', create_schema=False)
         except psycopg2.Error as e:
             logger.error(f"Failed to migrate remote schema: {e}", exc_info=True)
-            self.conn.rollback()
 
     def close_connection(self):
-        """Closes the database connection if it's open."""
+        """Closes the database connection (or every pooled connection) if it's open."""
+        if self._change_listener is not None:
+            self._change_listener.stop()
+            self._change_listener = None
+        if self._pool is not None:
+            self._pool.close_all()
+            self._pool = None
+        if self._maintenance is not None:
+            self._maintenance.stop()
+            self._maintenance = None
+        if self._local_db is not None:
+            try:
+                self._local_db.connection().execute("PRAGMA optimize") # Recommended by SQLite before closing a long-lived connection
+            except sqlite3.Error:
+                pass
+            self._local_db.close_all()
+            self._local_db = None
         if self.conn:
             self.conn.close()
             self.conn = None
             self.cursor = None
 
-    def _dict_factory(self, cursor, row):
-        """A factory to return query results as dictionaries for SQLite."""
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
-
     def _create_local_tables(self):
-        """Create tables in the local SQLite database if they don't exist."""
+        """Create or upgrade the tables in the local SQLite database via the versioned migrations."""
         if not self.cursor: return
-        # Users table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                email TEXT UNIQUE,
-                phone TEXT,
-                location TEXT,
-                avatar_path BLOB,
-                role TEXT NOT NULL DEFAULT 'user'
-            )
-        ''')
-
-        # --- Migration for user roles ---
-        self.cursor.execute("PRAGMA table_info(users)")
-        user_columns = [info['name'] for info in self.cursor.fetchall()]
-        if 'role' not in user_columns:
-            self.cursor.execute("ALTER TABLE users ADD COLUMN role TEXT NOT NULL DEFAULT 'user'")
-
-        # System settings table (for server mode)
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_settings (
-                setting_key TEXT PRIMARY KEY NOT NULL,
-                setting_value BLOB
-            )
-        ''')
-
-        # Items table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                brand TEXT,
-                description TEXT,
-                status TEXT NOT NULL DEFAULT 'available',
-                image_path BLOB,
-                current_renter_id INTEGER,
-                price_per_minute REAL DEFAULT 0.0, -- Updated from price_per_day
-                price_unit TEXT DEFAULT 'ต่อวัน',
-                renter_username TEXT,
-                rent_date DATETIME,
-                FOREIGN KEY(current_renter_id) REFERENCES users(id)
-            )
-        ''')
-        # Rental history table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rental_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                item_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                rent_date DATETIME NOT NULL,
-                return_date DATETIME,
-                initiator TEXT,
-                FOREIGN KEY(item_id) REFERENCES items(id),
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-
-        # --- Simple Schema Migration for Payment System ---
-        # Checks if payment columns exist and adds them if they don't.
-        # This ensures backward compatibility with older database files.
-        self.cursor.execute("PRAGMA table_info(rental_history)")
-        columns = [info['name'] for info in self.cursor.fetchall()]
-        
-        if 'amount_due' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN amount_due REAL")
-        if 'payment_status' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN payment_status TEXT")
-        if 'payment_date' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN payment_date DATETIME")
-        if 'transaction_ref' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN transaction_ref TEXT")
-        if 'slip_sender' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN slip_sender TEXT")
-        if 'slip_receiver' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN slip_receiver TEXT")
-        if 'slip_transacted_at' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN slip_transacted_at DATETIME")
-        if 'slip_data_json' not in columns:
-            self.cursor.execute("ALTER TABLE rental_history ADD COLUMN slip_data_json TEXT")
-
-        # --- Migration for new pricing model ---
-        self.cursor.execute("PRAGMA table_info(items)")
-        item_columns = [info['name'] for info in self.cursor.fetchall()]
-        if 'price_model' not in item_columns:
-            self.cursor.execute("ALTER TABLE items ADD COLUMN price_model TEXT DEFAULT 'per_minute'")
-        if 'fixed_fee' not in item_columns:
-            self.cursor.execute("ALTER TABLE items ADD COLUMN fixed_fee REAL DEFAULT 0.0")
-        if 'grace_period_minutes' not in item_columns:
-            self.cursor.execute("ALTER TABLE items ADD COLUMN grace_period_minutes INTEGER DEFAULT 0")
-        if 'minimum_charge' not in item_columns:
-            self.cursor.execute("ALTER TABLE items ADD COLUMN minimum_charge REAL DEFAULT 0.0")
-        
-        self.conn.commit()
+        apply_migrations(self, 'sqlite')
+        self._search_backend = None
 
     def create_remote_tables(self):
         """
@@ -316,81 +443,17 @@ class DBManagement:
         if not self.cursor or not self.conn:
             raise ConnectionError("Cannot create remote tables: No active database connection.")
 
-        # --- Table Creation SQL Statements (Dialect-Specific) ---
-        # PostgreSQL-specific statements
-        table_statements = [
-            """
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(80) UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    first_name VARCHAR(100),
-                    last_name VARCHAR(100),
-                    email VARCHAR(120) UNIQUE,
-                    phone VARCHAR(20),
-                    location TEXT,
-                    avatar_path BYTEA, role VARCHAR(20) NOT NULL DEFAULT 'user'
-                );
-            """,
-            """
-                CREATE TABLE IF NOT EXISTS items (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    brand VARCHAR(100),
-                    description TEXT,
-                    status VARCHAR(50) NOT NULL DEFAULT 'available',
-                    image_path BYTEA,
-                    current_renter_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
-                    price_per_minute NUMERIC(10, 4) DEFAULT 0.0,
-                    price_unit VARCHAR(20) DEFAULT 'ต่อวัน',
-                    price_model VARCHAR(50) DEFAULT 'per_minute',
-                    fixed_fee NUMERIC(10, 2) DEFAULT 0.0,
-                    grace_period_minutes INTEGER DEFAULT 0,
-                    minimum_charge NUMERIC(10, 2) DEFAULT 0.0,
-                    renter_username VARCHAR(80),
-                    rent_date TIMESTAMP
-                );
-            """,
-            """
-                CREATE TABLE IF NOT EXISTS rental_history (
-                    id SERIAL PRIMARY KEY,
-                    item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    rent_date TIMESTAMP NOT NULL,
-                    return_date TIMESTAMP,
-                    initiator VARCHAR(50),
-                    amount_due NUMERIC(10, 2),
-                    payment_status VARCHAR(20),
-                    payment_date TIMESTAMP,
-                    transaction_ref VARCHAR(255),
-                    slip_sender VARCHAR(255),
-                    slip_receiver VARCHAR(255),
-                    slip_transacted_at TIMESTAMP,
-                    slip_data_json TEXT
-                );
-            """,
-            """
-                CREATE TABLE IF NOT EXISTS system_settings (
-                    setting_key VARCHAR(255) PRIMARY KEY NOT NULL,
-                    setting_value BYTEA
-                );
-            """
-        ]
-
+        # Tables and indexes are defined by the shared, versioned migration list.
         try:
-            for statement in table_statements:
-                self.cursor.execute(statement)
-            self.conn.commit()
-        except psycopg2.Error as e:
-            # If an error occurs (e.g., table already exists in a transaction), rollback.
-            # This is crucial for PostgreSQL to allow further commands on the connection.
+            apply_migrations(self, 'postgresql')
+        except psycopg2.Error:
+            # The connection may have been in an aborted state before this was called.
+            # Roll back and retry once on the now-clean connection.
             self.conn.rollback()
-            # Re-try the operation after rollback, as the connection is now clean.
-            # This handles the case where the connection was in an aborted state before this was called.
-            # Also, generate and store the server's master encryption key.
-            for statement in table_statements:
-                self.cursor.execute(statement)
-            self.conn.commit()
+            apply_migrations(self, 'postgresql')
+        self._search_backend = None
+        # The workflow functions are optional; without them clients simply keep using plain SQL.
+        self._server_functions = server_functions.install_functions(self)
         
         # After creating tables, ensure the master encryption key exists.
         self.cursor.execute("SELECT setting_value FROM system_settings WHERE setting_key = 'SYSTEM.encryption_key'")
@@ -403,8 +466,54 @@ class DBManagement:
             sql = "INSERT INTO system_settings (setting_key, setting_value) VALUES (%s, %s)"
             self.cursor.execute(sql, ('SYSTEM.encryption_key', new_server_key))
             self.conn.commit()
+            self._settings_cache.invalidate()
             print("New server encryption key has been generated and stored.")
 
+    def _move_legacy_item_images(self):
+        """
+        Moves images still stored in the legacy items.image_path column into
+        item_images (generating thumbnails) and clears the old column.
+        Does not commit; the caller's migration transaction does.
+        """
+        self.cursor.execute("SELECT id FROM items WHERE image_path IS NOT NULL")
+        legacy_ids = [row['id'] for row in self.cursor.fetchall()]
+        if not legacy_ids:
+            return
+        logger.info(f"Moving {len(legacy_ids)} item image(s) into the item_images table...")
+        for item_id in legacy_ids:
+            self.cursor.execute(f"SELECT image_path FROM items WHERE id = {self.paramstyle}", (item_id,))
+            row = self.cursor.fetchone()
+            if row and row['image_path']:
+                self._write_item_image(item_id, bytes(row['image_path']))
+            self.cursor.execute(f"UPDATE items SET image_path = NULL WHERE id = {self.paramstyle}", (item_id,))
+
+    def _write_item_image(self, item_id: int, image_data: bytes | None, skip_if_unchanged: bool = False):
+        """
+        Stores (or removes, if image_data is None) the full image and its thumbnail for an item.
+        Does not commit.
+        """
+        if not image_data:
+            self.cursor.execute(f"DELETE FROM item_images WHERE item_id = {self.paramstyle}", (item_id,))
+            return
+
+        image_bytes = bytes(image_data)
+        image_hash = hash_image(image_bytes)
+        if skip_if_unchanged:
+            self.cursor.execute(f"SELECT image_hash FROM item_images WHERE item_id = {self.paramstyle}", (item_id,))
+            existing = self.cursor.fetchone()
+            if existing and existing['image_hash'] == image_hash:
+                return
+
+        thumbnail = make_thumbnail(image_bytes)
+        if isinstance(self.conn, sqlite3.Connection):
+            sql = "INSERT OR REPLACE INTO item_images (item_id, thumbnail, image, image_hash) VALUES (?, ?, ?, ?)"
+        else: # PostgreSQL
+            sql = """
+                INSERT INTO item_images (item_id, thumbnail, image, image_hash) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (item_id) DO UPDATE SET thumbnail = EXCLUDED.thumbnail, image = EXCLUDED.image, image_hash = EXCLUDED.image_hash
+            """
+        self.cursor.execute(sql, (item_id, thumbnail, image_bytes, image_hash))
+
     @staticmethod
     def static_hash_password(password):
         """A static version of _hash_password that can be used without an instance."""
@@ -429,32 +538,24 @@ class DBManagement:
 
     # --- System Settings Management ---
     def get_system_setting(self, key: str, decrypt: bool = True) -> str | bytes | None:
-        """Retrieves and decrypts a setting from the system_settings table."""
+        """Retrieves and decrypts a setting from the system_settings table (served from the settings cache)."""
         if not self.cursor:
             return None
-        sql = f"SELECT setting_value FROM system_settings WHERE setting_key = {self.paramstyle}"
         try:
-            self.cursor.execute(sql, (key,))
-            result = self.cursor.fetchone()
-            if result and result['setting_value']:
-                # psycopg2 returns BYTEA as a memoryview, which must be converted to bytes
-                # for the cryptography library to use it.
-                value_bytes = bytes(result['setting_value'])
-
-                if not decrypt:
-                    return value_bytes
-
-                server_fernet = _get_server_fernet(self)
-                if server_fernet:
-                    return server_fernet.decrypt(value_bytes).decode('utf-8')
-                return None # Or raise an error if key is essential
-
-            return None
+            if not decrypt:
+                return self._settings_cache.get_raw(key)
+            return self._settings_cache.get_decrypted(key, self._decrypt_setting)
         except (psycopg2.Error, Exception) as e:
             logger.error(f"Error getting system setting '{key}': {e}", exc_info=True)
             self.conn.rollback() # CRITICAL: Rollback the failed transaction
             return None
 
+    def _decrypt_setting(self, value_bytes: bytes) -> str | None:
+        server_fernet = _get_server_fernet(self)
+        if server_fernet:
+            return server_fernet.decrypt(value_bytes).decode('utf-8')
+        return None # Or raise an error if key is essential
+
     def get(self, section, key, fallback=None):
         """
         Provides a 'get' method to conform to the config_source interface,
@@ -481,6 +582,7 @@ class DBManagement:
                 return fallback
         return fallback
 
+    @serialized_write
     def set_system_setting(self, key: str, value: str) -> tuple[bool, str]:
         """Encrypts and saves a setting to the system_settings table."""
         if not self.cursor or not self.conn:
@@ -497,12 +599,65 @@ class DBManagement:
                 sql = "INSERT INTO system_settings (setting_key, setting_value) VALUES (%s, %s) ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value;"
             self.cursor.execute(sql, (key, encrypted_value))
             self.conn.commit()
+            self._settings_cache.invalidate()
             return True, "Setting saved successfully."
         except Exception as e:
             if self.conn: self.conn.rollback()
             logger.error(f"Failed to save setting '{key}': {e}", exc_info=True)
             return False, f"Failed to save setting '{key}': {e}"
 
+    def get_system_settings(self, prefixes=None, decrypt: bool = True) -> dict:
+        """
+        Returns {setting_key: value} for every setting whose key starts with one of `prefixes`
+        (a section name such as 'SMTP' matches 'SMTP.*'), or for all settings if prefixes is None.
+        Served from the settings cache, so this costs at most one query.
+        """
+        if not self.cursor:
+            return {}
+        if isinstance(prefixes, str):
+            prefixes = [prefixes]
+        key_prefixes = tuple(p if '.' in p else f"{p.upper()}." for p in prefixes) if prefixes else None
+        try:
+            keys = [key for key in self._settings_cache.keys() if key_prefixes is None or key.startswith(key_prefixes)]
+            if not decrypt:
+                return {key: self._settings_cache.get_raw(key) for key in keys}
+            # SYSTEM.encryption_key is the raw master key, not an encrypted value.
+            return {key: self._settings_cache.get_decrypted(key, self._decrypt_setting) for key in keys if not key.startswith('SYSTEM.')}
+        except (psycopg2.Error, Exception) as e:
+            logger.error(f"Error getting system settings {prefixes}: {e}", exc_info=True)
+            self.conn.rollback()
+            return {}
+
+    @serialized_write
+    def set_system_settings(self, mapping: dict) -> tuple[bool, str]:
+        """Encrypts and upserts many settings in a single statement and transaction."""
+        if not self.cursor or not self.conn:
+            return False, "No active database connection."
+        if not mapping:
+            return True, "Nothing to save."
+        try:
+            server_fernet = _get_server_fernet(self)
+            if not server_fernet:
+                raise ConnectionError("Cannot save settings: Server encryption key is missing.")
+            rows = [(key, server_fernet.encrypt(str(value).encode('utf-8'))) for key, value in mapping.items()]
+            if isinstance(self.conn, sqlite3.Connection): # SQLite
+                self.cursor.executemany("INSERT OR REPLACE INTO system_settings (setting_key, setting_value) VALUES (?, ?)", rows)
+            else: # PostgreSQL
+                from psycopg2.extras import execute_values
+                execute_values(
+                    self.cursor,
+                    "INSERT INTO system_settings (setting_key, setting_value) VALUES %s "
+                    "ON CONFLICT (setting_key) DO UPDATE SET setting_value = EXCLUDED.setting_value",
+                    rows
+                )
+            self.conn.commit()
+            self._settings_cache.invalidate()
+            return True, f"{len(rows)} setting(s) saved successfully."
+        except Exception as e:
+            if self.conn: self.conn.rollback()
+            logger.error(f"Failed to save settings {list(mapping)}: {e}", exc_info=True)
+            return False, f"Failed to save settings: {e}"
+
     def verify_user_local(self, username, password):
         """
         Verifies a user's credentials against the local SQLite database,
@@ -521,11 +676,12 @@ class DBManagement:
         return None, "ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง"
 
     # --- User Management ---
+    @serialized_write
     def create_user(self, username, password, first_name, last_name, email, phone, location, avatar_data=None):
         hashed_password = self._hash_password(password)
         try:
             # Determine the correct paramstyle for the query.
-            # self.paramstyle is correctly set during connection (_setup_cursor_and_paramstyle).
+            # self.paramstyle is correctly set during connection (_connect_local / _connect_remote).
             # The issue was that the instance being used might have been the wrong one.
             # By ensuring the correct instance is used (via db_manager.get_active_instance), this should now work.
             # Let's make it more robust by re-checking.
@@ -543,8 +699,10 @@ class DBManagement:
             self.conn.commit()
             return True, "User created successfully."
         except sqlite3.IntegrityError as e:
+            self.conn.rollback()
             return False, f"Username or email already exists: {e}"
 
+    @serialized_write
     def create_admin_user(self, username, password):
         """Creates a user with the 'admin' role if they don't already exist."""
         hashed_password = self._hash_password(password)
@@ -628,6 +786,7 @@ class DBManagement:
                 self.conn.rollback()
                 return False
 
+    @serialized_write
     def update_user(self, user_id: int, **kwargs):
         """
         Updates a user's profile information.
@@ -655,12 +814,13 @@ class DBManagement:
         try:
             self.cursor.execute(sql, tuple(params))
             self.conn.commit()
-            db_signals.data_changed.emit('users')
+            _emit(db_signals.data_changed, 'users', 'update', [user_id])
         except Exception as e:
             logger.error(f"Failed to update user {user_id}: {e}", exc_info=True)
             if self.conn: self.conn.rollback()
             raise # Re-raise the exception after rolling back
 
+    @serialized_write
     def update_super_admin(self, new_username: str, new_password: str | None, email: str, first_name: str, last_name: str, phone: str, location: str, avatar_data: bytes | None):
         """
         Specifically updates or creates (UPSERT) the user with ID 1.
@@ -722,6 +882,7 @@ class DBManagement:
             self.conn.rollback()
             return None
 
+    @serialized_write
     def update_user_role(self, user_id: int, new_role: str):
         """Updates the role for a specific user."""
         if not self.cursor or new_role not in ['admin', 'user']:
@@ -764,6 +925,100 @@ class DBManagement:
             return [user for user in all_users if user.get('id') != 1]
         return all_users
 
+    def get_users_with_status(self, is_remote: bool = False) -> list:
+        """
+        Fetches users for the user management dialog together with their pending-payment
+        count and amount and their active-rental count, in one query.
+        If in remote mode, it filters out the Super Admin (ID=1).
+        """
+        if not self.cursor:
+            return []
+        # Aggregate each side before joining so one user's rows don't multiply the other's counts.
+        sql = f"""
+            SELECT u.id, u.username, u.first_name, u.last_name, u.email, u.phone, u.role,
+                   COALESCE(p.pending_count, 0) AS pending_count,
+                   COALESCE(p.pending_amount, 0) AS pending_amount,
+                   COALESCE(r.active_rentals, 0) AS active_rentals
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS pending_count, SUM(amount_due) AS pending_amount
+                FROM rental_history WHERE payment_status = 'pending' GROUP BY user_id
+            ) p ON p.user_id = u.id
+            LEFT JOIN (
+                SELECT current_renter_id, COUNT(*) AS active_rentals
+                FROM items WHERE status = 'rented' GROUP BY current_renter_id
+            ) r ON r.current_renter_id = u.id
+            {"WHERE u.id != 1" if is_remote else ""}
+            ORDER BY u.username
+        """
+        try:
+            self.cursor.execute(sql)
+            return self.cursor.fetchall()
+        except psycopg2.Error:
+            self.conn.rollback()
+            return []
+
+    def get_users_with_status_page(self, limit: int, after_key: tuple | None = None, search_text: str | None = None, is_remote: bool = False) -> list:
+        """
+        Fetches up to `limit` users ordered by username, with the same columns as
+        get_users_with_status(), starting after the user whose key is `after_key`
+        (see users_key(); None for the first page). `search_text` matches the id, username,
+        name, email, phone or role. The status columns are only aggregated for the page's users.
+        """
+        if not self.cursor:
+            return []
+        p = self.paramstyle
+        where_clauses = []
+        params = []
+        if is_remote:
+            where_clauses.append("u.id != 1")
+        search_text = (search_text or "").strip()
+        if search_text:
+            like = "LIKE" if isinstance(self.conn, sqlite3.Connection) else "ILIKE"
+            searched = ["CAST(u.id AS TEXT)", "u.username", "COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')", "u.email", "u.phone", "u.role"]
+            where_clauses.append("(" + " OR ".join(f"{column} {like} {p}" for column in searched) + ")")
+            params.extend([f"%{search_text}%"] * len(searched))
+        if after_key is not None:
+            where_clauses.append(f"(u.username, u.id) > ({p}, {p})")
+            params.extend(after_key)
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        sql = f"""
+            WITH page AS (
+                SELECT u.id, u.username, u.first_name, u.last_name, u.email, u.phone, u.role
+                FROM users u
+                {where_sql}
+                ORDER BY u.username, u.id
+                LIMIT {p}
+            )
+            SELECT page.*,
+                   COALESCE(h.pending_count, 0) AS pending_count,
+                   COALESCE(h.pending_amount, 0) AS pending_amount,
+                   COALESCE(r.active_rentals, 0) AS active_rentals
+            FROM page
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS pending_count, SUM(amount_due) AS pending_amount
+                FROM rental_history WHERE payment_status = 'pending' AND user_id IN (SELECT id FROM page) GROUP BY user_id
+            ) h ON h.user_id = page.id
+            LEFT JOIN (
+                SELECT current_renter_id, COUNT(*) AS active_rentals
+                FROM items WHERE status = 'rented' AND current_renter_id IN (SELECT id FROM page) GROUP BY current_renter_id
+            ) r ON r.current_renter_id = page.id
+            ORDER BY page.username, page.id
+        """
+        params.append(limit)
+        try:
+            self.cursor.execute(sql, tuple(params))
+            return self.cursor.fetchall()
+        except psycopg2.Error:
+            self.conn.rollback()
+            return []
+
+    @staticmethod
+    def users_key(record) -> tuple:
+        """Returns the keyset pagination key for a record returned by get_users_with_status_page()."""
+        return (record['username'], record['id'])
+
+    @serialized_write
     def delete_user(self, user_id):
         """Deletes a user from the database."""
         if not self.cursor:
@@ -774,6 +1029,7 @@ class DBManagement:
             self.conn.commit()
             return True
         except sqlite3.IntegrityError:
+            self.conn.rollback()
             return False # Cannot delete user if they have rental history
 
     # --- Item Management ---
@@ -798,105 +1054,210 @@ class DBManagement:
         order = sort_order.upper() if sort_order.upper() in allowed_sort_orders else 'ASC'
 
         # Special handling for rent_date to put NULLs last when sorting descending
-        order_clause = f"ORDER BY CASE WHEN {sort_column} IS NULL THEN 1 ELSE 0 END, {sort_column} {order}"
+        order_clause = f"ORDER BY CASE WHEN i.{sort_column} IS NULL THEN 1 ELSE 0 END, i.{sort_column} {order}"
 
         try:
-            self.cursor.execute(f"SELECT * FROM items {order_clause}")
+            self.cursor.execute(f"{ITEM_CATALOG_SELECT} {order_clause}")
             return self.cursor.fetchall()
         except psycopg2.Error as e:
             logger.error(f"Error in get_all_items (PostgreSQL): {e}", exc_info=True)
             self.conn.rollback()
             return [] # Return an empty list to prevent UI crashes
 
-    def get_item_by_id(self, item_id):
+    def get_items_by_ids(self, item_ids: list) -> list:
+        """Fetches the catalog rows (with thumbnails) of the given items, e.g. to patch a grid after they changed."""
+        if not item_ids:
+            return []
+        if not self.conn or not self.cursor:
+            raise ConnectionError("No active database connection.")
+        placeholders = ', '.join([self.paramstyle] * len(item_ids))
+        try:
+            self.cursor.execute(f"{ITEM_CATALOG_SELECT} WHERE i.id IN ({placeholders})", tuple(item_ids))
+            return self.cursor.fetchall()
+        except psycopg2.Error:
+            # Raised rather than returning [], which callers would read as "these items were deleted".
+            self.conn.rollback()
+            raise
+
+    def get_item_by_id(self, item_id, include_image: bool = False):
+        """
+        Fetches one item with its thumbnail and the username of its most recent renter
+        ('latest_renter') in a single query. The full-size image is only included
+        (as 'image') when include_image is True.
+        """
         if not self.cursor:
             return None
-        sql = f"SELECT * FROM items WHERE id = {self.paramstyle}"
+        image_column = ", img.image" if include_image else ""
+        # idx_rental_history_item_rent_date turns the latest-renter subquery into a single index probe.
+        sql = f"""
+            SELECT {ITEM_COLUMNS}, img.thumbnail, img.image_hash{image_column},
+                (SELECT u.username
+                 FROM rental_history h
+                 JOIN users u ON h.user_id = u.id
+                 WHERE h.item_id = i.id
+                 ORDER BY h.rent_date DESC
+                 LIMIT 1) AS latest_renter
+            FROM items i
+            LEFT JOIN item_images img ON img.item_id = i.id
+            WHERE i.id = {self.paramstyle}
+        """
         try:
             self.cursor.execute(sql, (item_id,)) # type: ignore
             item_data_row = self.cursor.fetchone()
+            # Return a plain dict so callers get the same mutable type on both backends.
+            return dict(item_data_row) if item_data_row else None
+        except psycopg2.Error:
+            self.conn.rollback()
+            return None
 
-            if item_data_row:
-                # --- NEW: Fetch the latest renter from rental_history ---
-                # Convert the row object to a mutable dictionary
-                item_data = dict(item_data_row)
-                history_sql = f"""
-                    SELECT u.username
-                    FROM rental_history h
-                    JOIN users u ON h.user_id = u.id
-                    WHERE h.item_id = {self.paramstyle}
-                    ORDER BY h.rent_date DESC
-                    LIMIT 1
-                """
-                self.cursor.execute(history_sql, (item_id,))
-                latest_renter_record = self.cursor.fetchone()
-                item_data['latest_renter'] = latest_renter_record['username'] if latest_renter_record else None
-
-            return item_data
+    def get_item_image(self, item_id) -> bytes | None:
+        """Fetches the full-size image of an item, or None if it has no image."""
+        if not self.cursor:
+            return None
+        sql = f"SELECT image FROM item_images WHERE item_id = {self.paramstyle}"
+        try:
+            self.cursor.execute(sql, (item_id,))
+            result = self.cursor.fetchone()
+            return bytes(result['image']) if result and result['image'] else None
         except psycopg2.Error:
             self.conn.rollback()
             return None
 
+    @serialized_write
     def add_item(self, name, description, image_data, brand, price_per_minute: float, price_unit: str, price_model: str, fixed_fee: float, grace_period_minutes: int, minimum_charge: float):
         if not self.cursor:
             return
-        sql = f"INSERT INTO items (name, description, image_path, brand, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge) VALUES ({self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle})"
-        self.cursor.execute(
-            sql,
-            (name, description, image_data, brand, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge)
-        )
+        sql = f"INSERT INTO items (name, description, brand, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge) VALUES ({self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle}, {self.paramstyle})"
+        params = (name, description, brand, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge)
+        if isinstance(self.conn, sqlite3.Connection):
+            self.cursor.execute(sql, params)
+            item_id = self.cursor.lastrowid
+        else: # PostgreSQL
+            self.cursor.execute(f"{sql} RETURNING id", params)
+            item_id = self.cursor.fetchone()['id']
+        self._write_item_image(item_id, image_data)
         self.conn.commit()
-        db_signals.data_changed.emit('items')
+        _emit(db_signals.data_changed, 'items', 'insert', [item_id])
 
+    @serialized_write
     def update_item(self, item_id, name, description, image_data, brand, status, price_per_minute: float, price_unit: str, price_model: str, fixed_fee: float, grace_period_minutes: int, minimum_charge: float):
         if not self.cursor:
             return
         sql = f"""UPDATE items SET 
-                  name={self.paramstyle}, description={self.paramstyle}, image_path={self.paramstyle}, brand={self.paramstyle}, status={self.paramstyle}, 
+                  name={self.paramstyle}, description={self.paramstyle}, brand={self.paramstyle}, status={self.paramstyle}, 
                   price_per_minute={self.paramstyle}, price_unit={self.paramstyle}, price_model={self.paramstyle}, fixed_fee={self.paramstyle}, grace_period_minutes={self.paramstyle},
                   minimum_charge={self.paramstyle}
                   WHERE id={self.paramstyle}"""
         self.cursor.execute(
             sql,
-            (name, description, image_data, brand, status, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge, item_id)
+            (name, description, brand, status, price_per_minute, price_unit, price_model, fixed_fee, grace_period_minutes, minimum_charge, item_id)
         )
+        # Only re-upload the image (and regenerate its thumbnail) if it actually changed.
+        self._write_item_image(item_id, image_data, skip_if_unchanged=True)
         self.conn.commit()
-        db_signals.data_changed.emit('items')
+        _emit(db_signals.data_changed, 'items', 'update', [item_id])
 
+    @serialized_write
     def delete_item(self, item_id):
         if not self.cursor:
             return
+        # SQLite does not enforce ON DELETE CASCADE unless foreign keys are enabled, so remove the image explicitly.
+        self.cursor.execute(f"DELETE FROM item_images WHERE item_id={self.paramstyle}", (item_id,))
         sql = f"DELETE FROM items WHERE id={self.paramstyle}"
         self.cursor.execute(sql, (item_id,))
         self.conn.commit()
-        db_signals.data_changed.emit('items')
+        _emit(db_signals.data_changed, 'items', 'delete', [item_id])
 
     # --- Rental Management ---
-    def rent_item(self, item_id, user_id):
-        if not self.cursor:
-            return
-        sql_select = f"SELECT username FROM users WHERE id = {self.paramstyle}"
-        self.cursor.execute(sql_select, (user_id,))
-        user = self.cursor.fetchone()
-        if not user: return
+    def uses_server_functions(self) -> bool:
+        """
+        Whether this is a PostgreSQL server with the current server_functions bundle installed.
+        Detected once per instance; a missing or outdated bundle means plain SQL is used.
+        """
+        if self._server_functions is None:
+            if isinstance(self.conn, sqlite3.Connection):
+                self._server_functions = False
+                return False
+            try:
+                version = server_functions.installed_version(self)
+            except psycopg2.Error as e:
+                logger.warning(f"Could not detect server-side rental functions, using plain SQL: {e}")
+                self.conn.rollback()
+                return False
+            self._server_functions = version == server_functions.BUNDLE_VERSION
+            if version is not None and not self._server_functions:
+                logger.info(f"Server-side rental functions are version {version}, expected {server_functions.BUNDLE_VERSION}; run 'db init-server' to update them.")
+        return self._server_functions
+
+    def _call_server_function(self, name: str, params: tuple):
+        """
+        Runs one function of the server-side bundle as a single statement and commits.
+        Returns its result, or _NO_SERVER_FUNCTION if the bundle is not available so the
+        caller falls back to plain SQL.
+        """
+        if not self.uses_server_functions():
+            return _NO_SERVER_FUNCTION
+        placeholders = ', '.join(['%s'] * len(params))
+        try:
+            self.cursor.execute(f"SELECT {name}({placeholders}) AS result", params)
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            if getattr(e, 'pgcode', None) != '42883': # undefined_function: the bundle was dropped meanwhile
+                raise
+            logger.warning(f"Server function {name} is missing, falling back to plain SQL.")
+            self._server_functions = False
+            return _NO_SERVER_FUNCTION
+        result = self.cursor.fetchone()['result']
+        self.conn.commit()
+        return result
 
+    @serialized_write
+    def rent_item(self, item_id, user_id) -> bool:
+        """
+        Rents an item to a user. Returns False if the item was no longer available
+        (e.g. another kiosk rented it first) or the user does not exist.
+
+        The UPDATE only matches an 'available' row, so when two clients race for the
+        same item exactly one of them gets a row back; no table lock is needed.
+        """
+        if not self.cursor:
+            return False
         now_utc = datetime.utcnow()
-        sql_update = f"UPDATE items SET status='rented', current_renter_id={self.paramstyle}, renter_username={self.paramstyle}, rent_date={self.paramstyle} WHERE id={self.paramstyle}"
-        self.cursor.execute(
-            sql_update,
-            (user_id, user['username'], now_utc, item_id)
-        )
-        sql_insert = f"INSERT INTO rental_history (item_id, user_id, rent_date) VALUES ({self.paramstyle}, {self.paramstyle}, {self.paramstyle})"
-        self.cursor.execute(
-            sql_insert,
-            (item_id, user_id, now_utc)
-        )
+        history_id = self._call_server_function('app_rent_item', (item_id, user_id, now_utc))
+        if history_id is not _NO_SERVER_FUNCTION:
+            if history_id is None:
+                logger.info(f"Rent of item {item_id} by user {user_id} lost: item not available or user not found.")
+                return False
+            _emit(db_signals.data_changed, 'items', 'update', [item_id])
+            return True
+
+        p = self.paramstyle
+        sql_update = f"""
+            UPDATE items SET status='rented', current_renter_id=u.id, renter_username=u.username, rent_date={p}
+            FROM (SELECT id, username FROM users WHERE id = {p}) AS u
+            WHERE items.id = {p} AND items.status = 'available'
+            RETURNING items.id
+        """
+        sql_insert = f"INSERT INTO rental_history (item_id, user_id, rent_date) VALUES ({p}, {p}, {p}) RETURNING id"
+        self.cursor.execute(sql_update, (now_utc, user_id, item_id))
+        if not self.cursor.fetchall():
+            self.conn.rollback()
+            logger.info(f"Rent of item {item_id} by user {user_id} lost: item not available or user not found.")
+            return False
+        self.cursor.execute(sql_insert, (item_id, user_id, now_utc))
+        self.cursor.fetchall()
         self.conn.commit()
-        db_signals.data_changed.emit('items')
+        _emit(db_signals.data_changed, 'items', 'update', [item_id])
+        return True
 
-    def return_item(self, item_id: int, amount_due: float, transaction_ref: str | None, slip_data: dict | None, initiator: str = 'user') -> int:
+    @serialized_write
+    def return_item(self, item_id: int, amount_due: float, transaction_ref: str | None, slip_data: dict | None, initiator: str = 'user') -> int | None:
+        """
+        Records the return of a rented item and returns the id of its rental_history row.
+        Returns None if the item was not rented anymore (returned from another client first).
+        """
         if not self.cursor:
-            return
+            return None
 
         # --- NEW: Check if auto-confirm return is enabled ---
         # Determine the correct config source. For remote mode, use self.get(). For local mode, use app_config.get().
@@ -906,17 +1267,6 @@ class DBManagement:
         else: # Local mode (SQLite)
             auto_confirm = app_config.get('WORKFLOW', 'auto_confirm_return', fallback='False').lower() == 'true'
 
-        if auto_confirm:
-            # If auto-confirm is on, set status to 'available' and clear renter info immediately.
-            final_status = 'available'
-            sql_update_item = f"UPDATE items SET status='available', current_renter_id=NULL, renter_username=NULL, rent_date=NULL WHERE id={self.paramstyle}"
-        else:
-            # Otherwise, use the existing 'pending_return' workflow.
-            final_status = 'pending_return'
-            sql_update_item = f"UPDATE items SET status='pending_return' WHERE id={self.paramstyle}"
-
-        self.cursor.execute(sql_update_item, (item_id,))
-
         # Extract data from slip_data if available
         slip_sender = None
         slip_receiver = None
@@ -931,31 +1281,64 @@ class DBManagement:
                 slip_transacted_at = datetime.fromisoformat(transacted_at_str.replace("Z", "+00:00")).strftime('%Y-%m-%d %H:%M:%S')
 
         now_utc = datetime.utcnow()
-        sql_update_history = f"UPDATE rental_history SET return_date={self.paramstyle}, initiator={self.paramstyle}, amount_due={self.paramstyle}, payment_status={self.paramstyle}, transaction_ref={self.paramstyle}, slip_sender={self.paramstyle}, slip_receiver={self.paramstyle}, slip_transacted_at={self.paramstyle} WHERE item_id={self.paramstyle} AND return_date IS NULL"
+        history_id = self._call_server_function('app_return_item', (
+            item_id, amount_due, transaction_ref, initiator, slip_sender, slip_receiver, slip_transacted_at,
+            auto_confirm, now_utc, self._utc_offset_hours()
+        ))
+        if history_id is not _NO_SERVER_FUNCTION:
+            if history_id is None:
+                logger.info(f"Return of item {item_id} lost: the item is no longer rented.")
+                return None
+            _emit(db_signals.data_changed, 'items', 'update', [item_id])
+            return history_id
+
+        if auto_confirm:
+            # If auto-confirm is on, set status to 'available' and clear renter info immediately.
+            sql_update_item = f"UPDATE items SET status='available', current_renter_id=NULL, renter_username=NULL, rent_date=NULL WHERE id={self.paramstyle} AND status='rented' RETURNING id"
+        else:
+            # Otherwise, use the existing 'pending_return' workflow.
+            sql_update_item = f"UPDATE items SET status='pending_return' WHERE id={self.paramstyle} AND status='rented' RETURNING id"
+
+        # Only the client whose UPDATE still finds the item 'rented' records the return.
+        self.cursor.execute(sql_update_item, (item_id,))
+        if not self.cursor.fetchall():
+            self.conn.rollback()
+            logger.info(f"Return of item {item_id} lost: the item is no longer rented.")
+            return None
+
+        payment_status = 'pending' if amount_due > 0 else 'paid'
+        sql_update_history = f"UPDATE rental_history SET return_date={self.paramstyle}, initiator={self.paramstyle}, amount_due={self.paramstyle}, payment_status={self.paramstyle}, transaction_ref={self.paramstyle}, slip_sender={self.paramstyle}, slip_receiver={self.paramstyle}, slip_transacted_at={self.paramstyle} WHERE item_id={self.paramstyle} AND return_date IS NULL RETURNING id"
         self.cursor.execute(
             sql_update_history,
-            (now_utc, initiator, amount_due, 'pending' if amount_due > 0 else 'paid', transaction_ref, slip_sender, slip_receiver, slip_transacted_at, item_id)
+            (now_utc, initiator, amount_due, payment_status, transaction_ref, slip_sender, slip_receiver, slip_transacted_at, item_id)
         )
+        history_rows = self.cursor.fetchall()
+        if history_rows:
+            self._adjust_revenue(now_utc, payment_status, self._revenue_channel(transaction_ref, None), amount_due)
         self.conn.commit()
 
-        # Get the ID of the just-updated history record
-        # This is more reliable than assuming the last inserted ID.
-        self.cursor.execute(f"SELECT id FROM rental_history WHERE item_id = {self.paramstyle} AND return_date = {self.paramstyle}", (item_id, now_utc))
-        history_id_result = self.cursor.fetchone()
-        history_id = history_id_result['id'] if history_id_result else -1
-
-        db_signals.data_changed.emit('items')
-        return history_id
+        _emit(db_signals.data_changed, 'items', 'update', [item_id])
+        return history_rows[0]['id'] if history_rows else -1
 
-    def confirm_return(self, item_id: int):
-        """Admin confirms the physical return of an item."""
+    @serialized_write
+    def confirm_return(self, item_id: int) -> bool:
+        """Admin confirms the physical return of an item. Returns False if it was not pending return anymore."""
         if not self.cursor:
-            return
+            return False
+        confirmed = self._call_server_function('app_confirm_return', (item_id,))
+        if confirmed is not _NO_SERVER_FUNCTION:
+            if confirmed:
+                _emit(db_signals.data_changed, 'items', 'update', [item_id])
+            return confirmed
+
         # Now, set the item as truly available
-        sql = f"UPDATE items SET status='available', current_renter_id=NULL, renter_username=NULL, rent_date=NULL WHERE id={self.paramstyle}"
+        sql = f"UPDATE items SET status='available', current_renter_id=NULL, renter_username=NULL, rent_date=NULL WHERE id={self.paramstyle} AND status='pending_return' RETURNING id"
         self.cursor.execute(sql, (item_id,))
+        confirmed = bool(self.cursor.fetchall())
         self.conn.commit()
-        db_signals.data_changed.emit('items')
+        if confirmed:
+            _emit(db_signals.data_changed, 'items', 'update', [item_id])
+        return confirmed
 
     def get_rental_history_for_item(self, item_id):
         if not self.cursor:
@@ -990,7 +1373,7 @@ class DBManagement:
         """Fetches all items currently rented by a specific user."""
         if not self.cursor:
             return []
-        sql = f"SELECT * FROM items WHERE current_renter_id = {self.paramstyle} AND status = 'rented' ORDER BY rent_date ASC"
+        sql = f"{ITEM_CATALOG_SELECT} WHERE i.current_renter_id = {self.paramstyle} AND i.status = 'rented' ORDER BY i.rent_date ASC"
         try:
             self.cursor.execute(sql, (user_id,))
             return self.cursor.fetchall()
@@ -1019,13 +1402,13 @@ class DBManagement:
         order = sort_order.upper() if sort_order.upper() in allowed_sort_orders else 'ASC'
 
         # Special handling for rent_date to put NULLs last when sorting descending
-        order_clause = f"ORDER BY CASE WHEN {sort_column} IS NULL THEN 1 ELSE 0 END, {sort_column} {order}"
+        order_clause = f"ORDER BY CASE WHEN i.{sort_column} IS NULL THEN 1 ELSE 0 END, i.{sort_column} {order}"
 
         if get_all_columns:
-            columns = "*"
+            select_sql = ITEM_CATALOG_SELECT
         else:
-            columns = "id, name"
-        sql = f"SELECT {columns} FROM items WHERE status = {self.paramstyle} {order_clause}"
+            select_sql = "SELECT i.id, i.name FROM items i"
+        sql = f"{select_sql} WHERE i.status = {self.paramstyle} {order_clause}"
         try:
             self.cursor.execute(sql, (status,))
             return self.cursor.fetchall()
@@ -1033,6 +1416,82 @@ class DBManagement:
             self.conn.rollback()
             return []
 
+    # Sortable item columns for paged queries; True marks nullable columns, whose NULLs are sorted last.
+    # Every order ends with i.id so pages have a stable, unique order.
+    ITEM_SORT_COLUMNS = {
+        'name': False,
+        'status': False,
+        'id': False,
+        'rent_date': True,
+        'fixed_fee': True,
+        'price_per_minute': True,
+    }
+
+    def _item_filters(self, search_text: str | None = None, status: str | None = None) -> tuple[list, list]:
+        """Builds the WHERE clauses and params shared by the item count and page queries."""
+        where_clauses = []
+        params = []
+        p = self.paramstyle
+
+        if status:
+            where_clauses.append(f"i.status = {p}")
+            params.append(status)
+        search_text = (search_text or "").strip()
+        if search_text:
+            # Name only, matching the admin search box; uses the same indexes as search_items().
+            phrase = self._fts_phrase(search_text) if self._get_search_backend() == 'fts5' else None
+            if phrase:
+                where_clauses.append(f"i.id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH {p})")
+                params.append(f"name : {phrase}")
+            else:
+                like = "LIKE" if isinstance(self.conn, sqlite3.Connection) else "ILIKE"
+                where_clauses.append(f"i.name {like} {p}")
+                params.append(f"%{search_text}%")
+        return where_clauses, params
+
+    def count_items(self, search_text: str | None = None, status: str | None = None) -> int:
+        """Counts the items matching the filters (see get_items_page())."""
+        if not self.cursor:
+            return 0
+        where_clauses, params = self._item_filters(search_text, status)
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        try:
+            self.cursor.execute(f"SELECT COUNT(*) AS total_count FROM items i {where_sql}", tuple(params))
+            result = self.cursor.fetchone()
+            return result['total_count'] if result and result['total_count'] is not None else 0
+        except Exception as e:
+            logger.error(f"Error counting items: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return 0
+
+    def get_items_page(self, page: int, items_per_page: int, search_text: str | None = None, status: str | None = None, sort_by: str = 'name', sort_order: str = 'ASC') -> list:
+        """
+        Fetches one page (1-based) of catalog rows, optionally filtered by status and by a
+        substring of the name. Only the page's rows and thumbnails are read; use count_items()
+        with the same filters for the total, and only recount when the filters or the items change.
+        """
+        if not self.cursor:
+            return []
+
+        where_clauses, params = self._item_filters(search_text, status)
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        sort_column = sort_by if sort_by in self.ITEM_SORT_COLUMNS else 'name'
+        order = 'DESC' if sort_order.upper() == 'DESC' else 'ASC'
+        order_clause = f"ORDER BY i.{sort_column} {order}, i.id {order}"
+        if self.ITEM_SORT_COLUMNS[sort_column]:
+            order_clause = f"ORDER BY CASE WHEN i.{sort_column} IS NULL THEN 1 ELSE 0 END, i.{sort_column} {order}, i.id {order}"
+
+        offset = (max(1, page) - 1) * items_per_page
+        sql = f"{ITEM_CATALOG_SELECT} {where_sql} {order_clause} LIMIT {self.paramstyle} OFFSET {self.paramstyle}"
+        params.extend([items_per_page, offset])
+        try:
+            self.cursor.execute(sql, tuple(params))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching items page: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return []
+
     def get_payment_history_for_user(self, user_id):
         """Fetches all rental history records that have an amount due for a user."""
         if not self.cursor:
@@ -1051,6 +1510,19 @@ class DBManagement:
             self.conn.rollback()
             return []
 
+    def get_payment_total_for_user(self, user_id) -> float:
+        """Sums the amounts due in a user's payment history (any status) without fetching the records."""
+        if not self.cursor:
+            return 0.0
+        sql = f"SELECT SUM(amount_due) AS total FROM rental_history WHERE user_id = {self.paramstyle} AND amount_due IS NOT NULL"
+        try:
+            self.cursor.execute(sql, (user_id,))
+            result = self.cursor.fetchone()
+            return float(result['total']) if result and result['total'] is not None else 0.0
+        except psycopg2.Error:
+            self.conn.rollback()
+            return 0.0
+
     def has_pending_payments(self, user_id):
         """Checks if a user has any pending payments."""
         if not self.cursor:
@@ -1110,12 +1582,35 @@ class DBManagement:
         """Updates the payment status of a specific history record."""
         if not self.cursor:
             return
+        old_record = self._write_payment_status(history_id, new_status, slip_data)
+
+        # --- Trigger automatic receipt email on successful payment ---
+        # Pass the current db_instance and a fresh config instance to the email handler
+        if new_status == 'paid' and old_record:
+            from app_payment.payment_handler import PaymentHandler
+            # Emit a signal that a user's payment status has changed.
+            # This is useful for UI elements that show pending payment indicators.
+            _emit(db_signals.payment_status_updated, old_record['user_id'])
+            # Also emit a generic data changed signal for the 'users' table,
+            # as their payment status is a derived property. This helps refresh the UserManagementDialog.
+            _emit(db_signals.data_changed, 'users', 'update', [old_record['user_id']])
+            _emit(db_signals.payment_status_updated, old_record['user_id'])
+            # Use the provided db_instance for the email handler to ensure it uses the correct
+            # connection, especially when called from a background thread like a webhook.
+            db_for_email = db_instance_for_email if db_instance_for_email else self
+            email_handler = PaymentHandler(db_instance=db_for_email)
+            email_handler.send_receipt_email(history_id)
+
+    @serialized_write
+    def _write_payment_status(self, history_id, new_status, slip_data: dict | None = None):
+        """Writes a payment status change and moves its amount in the revenue rollup. Returns the record's previous state."""
         now_utc = datetime.utcnow() if new_status == 'paid' else None
-        
+
         # Prepare base update
         update_parts = [f"payment_status={self.paramstyle}", f"payment_date={self.paramstyle}"] # type: ignore
         params = [new_status, now_utc]
         slip_data_json = None
+        slip_values = (None, None, None, None) # sender, receiver, transacted_at, json
 
         # If slip_data is provided, add its fields to the update
         if slip_data:
@@ -1127,29 +1622,37 @@ class DBManagement:
             receiver_name = slip_data.get('receiver', {}).get('account', {}).get('name')
             transacted_at = slip_data.get('transactedAt')
             update_parts.extend([f"slip_sender={self.paramstyle}", f"slip_receiver={self.paramstyle}", f"slip_transacted_at={self.paramstyle}", f"slip_data_json={self.paramstyle}"])
-            params.extend([sender_name, receiver_name, transacted_at, slip_data_json])
+            slip_values = (sender_name, receiver_name, transacted_at, slip_data_json)
+            params.extend(slip_values)
+
+        old_user_id = self._call_server_function(
+            'app_set_payment_status', (history_id, new_status, now_utc, *slip_values, self._utc_offset_hours())
+        )
+        if old_user_id is not _NO_SERVER_FUNCTION:
+            # Callers only need to know the record existed and whose it is.
+            return {'user_id': old_user_id} if old_user_id is not None else None
+
+        # Read the record's current state first so the revenue rollup can move its amount between buckets.
+        # FOR UPDATE stops two clients from moving the same record at once on the server.
+        lock_sql = "" if isinstance(self.conn, sqlite3.Connection) else " FOR UPDATE"
+        self.cursor.execute(
+            f"SELECT user_id, return_date, amount_due, payment_status, transaction_ref, slip_data_json FROM rental_history WHERE id={self.paramstyle}{lock_sql}",
+            (history_id,)
+        )
+        old_record = self.cursor.fetchone()
 
         sql = f"UPDATE rental_history SET {', '.join(update_parts)} WHERE id={self.paramstyle}"
         params.append(history_id)
         self.cursor.execute(sql, tuple(params))
-        self.conn.commit()
 
-        # --- Trigger automatic receipt email on successful payment ---
-        # Pass the current db_instance and a fresh config instance to the email handler
-        if new_status == 'paid':
-            from app_payment.payment_handler import PaymentHandler
-            # Emit a signal that a user's payment status has changed.
-            # This is useful for UI elements that show pending payment indicators.
-            db_signals.payment_status_updated.emit(self.get_history_record_by_id(history_id)['user_id'])
-            # Also emit a generic data changed signal for the 'users' table,
-            # as their payment status is a derived property. This helps refresh the UserManagementDialog.
-            db_signals.data_changed.emit('users')
-            db_signals.payment_status_updated.emit(self.get_history_record_by_id(history_id)['user_id'])
-            # Use the provided db_instance for the email handler to ensure it uses the correct
-            # connection, especially when called from a background thread like a webhook.
-            db_for_email = db_instance_for_email if db_instance_for_email else self
-            email_handler = PaymentHandler(db_instance=db_for_email)
-            email_handler.send_receipt_email(history_id)
+        if old_record:
+            old_channel = self._revenue_channel(old_record['transaction_ref'], old_record['slip_data_json'])
+            new_channel = self._revenue_channel(old_record['transaction_ref'], slip_data_json or old_record['slip_data_json'])
+            if (old_record['payment_status'], old_channel) != (new_status, new_channel):
+                self._adjust_revenue(old_record['return_date'], old_record['payment_status'], old_channel, old_record['amount_due'], sign=-1)
+                self._adjust_revenue(old_record['return_date'], new_status, new_channel, old_record['amount_due'])
+        self.conn.commit()
+        return old_record
         
     def get_item_status_summary(self):
         """Counts items for each status and returns a dictionary."""
@@ -1170,10 +1673,16 @@ class DBManagement:
             logger.error(f"Error getting item status summary: {e}", exc_info=True)
             return {}
 
-    def get_income_summary(self, start_date: str | None = None, end_date: str | None = None) -> dict:
+    def get_income_summary(self, start_date: str | None = None, end_date: str | None = None, include_daily: bool = False) -> dict:
         """
         Calculates income summary statistics for a given date range.
-        Dates should be in 'YYYY-MM-DD' format.
+        Dates are local dates in 'YYYY-MM-DD' format: a record counts on the day of its
+        return_date shifted by TIME.utc_offset_hours, as in the payment history filters.
+
+        Totals are read from the revenue_daily rollup in a single
+        conditional-aggregation query. If `include_daily` is True, the same
+        query is grouped per day and summary['daily'] holds one dict per date
+        (oldest first) with the same keys.
         """
         if not self.cursor:
             return {}
@@ -1186,63 +1695,223 @@ class DBManagement:
             'total_transfer': 0.0,
         }
 
-        # Base WHERE clause for date filtering
         where_clauses = []
         params = []
         if start_date:
-            where_clauses.append(f"DATE(return_date) >= {self.paramstyle}")
+            where_clauses.append(f"day >= {self.paramstyle}")
             params.append(start_date)
         if end_date:
-            where_clauses.append(f"DATE(return_date) <= {self.paramstyle}")
+            where_clauses.append(f"day <= {self.paramstyle}")
             params.append(end_date)
-        
         where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
 
-        # --- FIX: Correctly build WHERE clauses ---
-        queries = {
-            'total_paid': f"SELECT SUM(amount_due) as total FROM rental_history {where_sql} {'AND' if where_sql else 'WHERE'} payment_status = 'paid'",
-            'total_pending': f"SELECT SUM(amount_due) as total FROM rental_history {where_sql} {'AND' if where_sql else 'WHERE'} payment_status = 'pending'",
-            'total_waived': f"SELECT SUM(amount_due) as total FROM rental_history {where_sql} {'AND' if where_sql else 'WHERE'} payment_status = 'waived'",
-            'total_cash': f"SELECT SUM(amount_due) as total FROM rental_history {where_sql} {'AND' if where_sql else 'WHERE'} payment_status = 'paid' AND slip_data_json IS NULL AND transaction_ref IS NULL",
-            'total_transfer': f"SELECT SUM(amount_due) as total FROM rental_history {where_sql} {'AND' if where_sql else 'WHERE'} payment_status = 'paid' AND (slip_data_json IS NOT NULL OR transaction_ref IS NOT NULL)",
-        }
+        select_sql = """
+            SUM(CASE WHEN payment_status = 'paid' THEN total_amount END) AS total_paid,
+            SUM(CASE WHEN payment_status = 'pending' THEN total_amount END) AS total_pending,
+            SUM(CASE WHEN payment_status = 'waived' THEN total_amount END) AS total_waived,
+            SUM(CASE WHEN payment_status = 'paid' AND channel = 'cash' THEN total_amount END) AS total_cash,
+            SUM(CASE WHEN payment_status = 'paid' AND channel = 'transfer' THEN total_amount END) AS total_transfer
+        """
 
         try:
-            for key, sql in queries.items():
-                self.cursor.execute(sql, tuple(params))
+            if not include_daily:
+                self.cursor.execute(f"SELECT {select_sql} FROM revenue_daily {where_sql}", tuple(params))
                 result = self.cursor.fetchone()
-                summary[key] = float(result['total']) if result and result['total'] is not None else 0.0
+                if result:
+                    for key in summary:
+                        summary[key] = float(result[key]) if result[key] is not None else 0.0
+                return summary
+
+            # --- Per-day buckets in the same pass; the overall totals are summed from them ---
+            self.cursor.execute(
+                f"SELECT day, {select_sql} FROM revenue_daily {where_sql} GROUP BY day ORDER BY day",
+                tuple(params)
+            )
+            daily = []
+            for row in self.cursor.fetchall():
+                bucket = {'date': str(row['day'])}
+                for key in summary:
+                    bucket[key] = float(row[key]) if row[key] is not None else 0.0
+                    summary[key] += bucket[key]
+                daily.append(bucket)
+            summary['daily'] = daily
             return summary
         except Exception as e:
             logger.error(f"Error getting income summary: {e}", exc_info=True)
             if self.conn: self.conn.rollback()
             return {}
 
-    def get_all_payment_history_paginated(self, page: int, items_per_page: int, search_text: str | None = None, start_date: str | None = None, end_date: str | None = None, status_filter: str | None = None, sort_by: str = 'return_date', sort_order: str = 'DESC') -> tuple[list, int]:
-        """Fetches all payment history records with pagination, search, and date filtering."""
+    # --- Search ---
+    def _get_search_backend(self) -> str:
+        """
+        Returns which search index this database has: 'fts5' (SQLite), 'trgm' (PostgreSQL
+        with pg_trgm) or 'like' (no index). Detected once per instance.
+        """
+        if self._search_backend is None:
+            try:
+                if isinstance(self.conn, sqlite3.Connection):
+                    self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'")
+                    self._search_backend = 'fts5' if self.cursor.fetchone() else 'like'
+                else: # PostgreSQL
+                    self.cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    self._search_backend = 'trgm' if self.cursor.fetchone() else 'like'
+            except Exception as e:
+                logger.warning(f"Could not detect search index, using LIKE: {e}")
+                if self.conn: self.conn.rollback()
+                return 'like'
+        return self._search_backend
+
+    @staticmethod
+    def _fts_phrase(search_text: str) -> str | None:
+        """Quotes text as a single FTS5 phrase. The trigram index needs at least 3 characters."""
+        if len(search_text) < 3:
+            return None
+        return '"' + search_text.replace('"', '""') + '"'
+
+    def _history_search_subquery(self, search_text: str) -> tuple[str, list]:
+        """Returns a subquery selecting the rental_history ids that match `search_text`, and its params."""
+        p = self.paramstyle
+        backend = self._get_search_backend()
+        if backend == 'fts5':
+            phrase = self._fts_phrase(search_text)
+            if phrase:
+                return f"SELECT rowid FROM history_fts WHERE history_fts MATCH {p}", [phrase]
+            pattern = f"%{search_text}%"
+            return f"SELECT rowid FROM history_fts WHERE item_name LIKE {p} OR username LIKE {p} OR transaction_ref LIKE {p}", [pattern] * 3
+
+        # One branch per indexed column so each can use its own (trigram) index instead of an OR across a join.
+        like = "LIKE" if isinstance(self.conn, sqlite3.Connection) else "ILIKE"
+        pattern = f"%{search_text}%"
+        sql = f"""
+            SELECT h2.id FROM rental_history h2 JOIN items i2 ON h2.item_id = i2.id WHERE i2.name {like} {p}
+            UNION SELECT h2.id FROM rental_history h2 JOIN users u2 ON h2.user_id = u2.id WHERE u2.username {like} {p}
+            UNION SELECT id FROM rental_history WHERE transaction_ref {like} {p}
+        """
+        return sql, [pattern] * 3
+
+    def search_items(self, search_text: str, limit: int | None = 100, status: str | None = None, ids_only: bool = False) -> list:
+        """
+        Searches items by name, brand and description, best matches first.
+        Returns catalog rows (like get_all_items), or just [{'id': ...}] rows if `ids_only`.
+        """
         if not self.cursor:
-            return [], 0
+            return []
+        search_text = (search_text or "").strip()
+        if not search_text:
+            return []
+
+        p = self.paramstyle
+        select_sql = "SELECT i.id FROM items i" if ids_only else ITEM_CATALOG_SELECT
+        backend = self._get_search_backend()
+        phrase = self._fts_phrase(search_text) if backend == 'fts5' else None
+        status_sql = f" AND i.status = {p}" if status else ""
+        status_params = [status] if status else []
+
+        if phrase:
+            sql = f"{select_sql} JOIN items_fts ON items_fts.rowid = i.id WHERE items_fts MATCH {p}{status_sql} ORDER BY items_fts.rank, i.name"
+            params = [phrase, *status_params]
+        else:
+            like = "LIKE" if isinstance(self.conn, sqlite3.Connection) else "ILIKE"
+            pattern = f"%{search_text}%"
+            if backend == 'trgm':
+                order_sql = f"ORDER BY GREATEST(similarity(i.name, {p}), similarity(COALESCE(i.brand, ''), {p})) DESC, i.name"
+                order_params = [search_text, search_text]
+            else:
+                # Without an index to rank by, put name prefix matches first.
+                order_sql = f"ORDER BY CASE WHEN i.name {like} {p} THEN 0 ELSE 1 END, i.name"
+                order_params = [f"{search_text}%"]
+            sql = f"{select_sql} WHERE (i.name {like} {p} OR i.brand {like} {p} OR i.description {like} {p}){status_sql} {order_sql}"
+            params = [pattern, pattern, pattern, *status_params, *order_params]
+        if limit:
+            sql += f" LIMIT {p}"
+            params.append(limit)
+
+        try:
+            self.cursor.execute(sql, tuple(params))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error searching items: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return []
+
+    def search_history(self, search_text: str, limit: int | None = 50) -> list:
+        """
+        Searches payment history by item name, username and transaction reference,
+        best matches first (newest first among equally good matches).
+        Returns the same columns as get_payment_history_page().
+        """
+        if not self.cursor:
+            return []
+        search_text = (search_text or "").strip()
+        if not search_text:
+            return []
+
+        p = self.paramstyle
+        backend = self._get_search_backend()
+        subquery, params = self._history_search_subquery(search_text)
+        rank_join = ""
+        order_sql = "ORDER BY h.return_date DESC, h.id DESC"
+        phrase = self._fts_phrase(search_text) if backend == 'fts5' else None
+        if phrase:
+            # Join the FTS table directly so bm25 rank is available.
+            rank_join = "JOIN history_fts ON history_fts.rowid = h.id"
+            subquery_sql = f"history_fts MATCH {p}"
+            order_sql = "ORDER BY history_fts.rank, h.return_date DESC"
+        else:
+            subquery_sql = f"h.id IN ({subquery})"
+            if backend == 'trgm':
+                order_sql = f"ORDER BY GREATEST(similarity(i.name, {p}), similarity(u.username, {p}), similarity(COALESCE(h.transaction_ref, ''), {p})) DESC, h.return_date DESC"
+        sql = f"""
+            SELECT h.id, h.return_date, h.amount_due, h.payment_status, h.transaction_ref, i.name as item_name, u.username
+            FROM rental_history h
+            JOIN items i ON h.item_id = i.id
+            JOIN users u ON h.user_id = u.id
+            {rank_join}
+            WHERE h.amount_due IS NOT NULL AND {subquery_sql}
+            {order_sql}
+        """
+        if backend == 'trgm':
+            params.extend([search_text] * 3)
+        if limit:
+            sql += f" LIMIT {p}"
+            params.append(limit)
+
+        try:
+            self.cursor.execute(sql, tuple(params))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error searching payment history: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return []
 
+    # Sortable columns for payment history; each is paired with h.id so keyset pages have a stable, unique order.
+    PAYMENT_HISTORY_SORT_COLUMNS = {'return_date': 'h.return_date', 'amount_due': 'h.amount_due'}
+
+    def _payment_history_filters(self, search_text: str | None = None, start_date: str | None = None, end_date: str | None = None, status_filter: str | None = None, user_id: int | None = None) -> tuple[list, list]:
+        """Builds the WHERE clauses and params shared by the payment history count and page queries."""
         where_clauses = ["h.amount_due IS NOT NULL"]
         params = []
 
+        if user_id is not None:
+            where_clauses.append(f"h.user_id = {self.paramstyle}")
+            params.append(user_id)
+
+        search_text = (search_text or "").strip()
         if search_text:
-            search_pattern = f"%{search_text}%"
-            where_clauses.append(f"(i.name LIKE {self.paramstyle} OR u.username LIKE {self.paramstyle} OR h.transaction_ref LIKE {self.paramstyle})")
-            params.extend([search_pattern, search_pattern, search_pattern])
+            search_sql, search_params = self._history_search_subquery(search_text)
+            where_clauses.append(f"h.id IN ({search_sql})")
+            params.extend(search_params)
+        # Dates are local days; compare the raw (UTC) column against the UTC instants where those days
+        # start and end, the same day boundary as the revenue rollup, so the return_date index stays usable.
+        offset = timedelta(hours=self._utc_offset_hours())
         if start_date:
-            # --- FIX: Use dialect-specific date casting ---
-            if isinstance(self.conn, sqlite3.Connection):
-                where_clauses.append(f"DATE(h.return_date) >= {self.paramstyle}")
-            else: # PostgreSQL
-                where_clauses.append(f"h.return_date::date >= {self.paramstyle}")
-            params.append(start_date)
+            day_start = datetime.strptime(start_date, '%Y-%m-%d') - offset
+            where_clauses.append(f"h.return_date >= {self.paramstyle}")
+            params.append(day_start.strftime('%Y-%m-%d %H:%M:%S'))
         if end_date:
-            if isinstance(self.conn, sqlite3.Connection):
-                where_clauses.append(f"DATE(h.return_date) <= {self.paramstyle}")
-            else: # PostgreSQL
-                where_clauses.append(f"h.return_date::date <= {self.paramstyle}")
-            params.append(end_date)
+            day_end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) - offset
+            where_clauses.append(f"h.return_date < {self.paramstyle}")
+            params.append(day_end.strftime('%Y-%m-%d %H:%M:%S'))
         if status_filter:
             if status_filter == 'transfer':
                 where_clauses.append("(h.transaction_ref IS NOT NULL OR h.slip_data_json IS NOT NULL)")
@@ -1251,18 +1920,92 @@ class DBManagement:
             else:
                 where_clauses.append(f"h.payment_status = {self.paramstyle}")
                 params.append(status_filter)
+        return where_clauses, params
+
+    def count_payment_history(self, search_text: str | None = None, start_date: str | None = None, end_date: str | None = None, status_filter: str | None = None, user_id: int | None = None) -> int:
+        """
+        Counts payment history records matching the filters.
+        This is the expensive part of paging, so callers should cache it and only recount when the filters change.
+        """
+        if not self.cursor:
+            return 0
+        where_clauses, params = self._payment_history_filters(search_text, start_date, end_date, status_filter, user_id)
+        sql = f"SELECT COUNT(*) AS total_count FROM rental_history h WHERE {' AND '.join(where_clauses)}"
+        try:
+            self.cursor.execute(sql, tuple(params))
+            result = self.cursor.fetchone()
+            return result['total_count'] if result and result['total_count'] is not None else 0
+        except Exception as e:
+            logger.error(f"Error counting payment history: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return 0
+
+    def get_payment_history_page(self, items_per_page: int, after_key: tuple | None = None, before_key: tuple | None = None, search_text: str | None = None, start_date: str | None = None, end_date: str | None = None, status_filter: str | None = None, sort_by: str = 'return_date', sort_order: str = 'DESC', user_id: int | None = None) -> list:
+        """
+        Fetches one page of payment history using keyset pagination on (sort column, id).
+
+        Pass `after_key` (the key of the last row on the current page) for the next page,
+        or `before_key` (the key of the first row) for the previous one; pass neither for
+        the first page. A key is (record[sort_by], record['id']), see payment_history_key().
+        Every page costs the same no matter how deep it is, unlike LIMIT/OFFSET.
+        `user_id` limits the records to one user's history.
+        """
+        if not self.cursor:
+            return []
+
+        where_clauses, params = self._payment_history_filters(search_text, start_date, end_date, status_filter, user_id)
+        sort_column = self.PAYMENT_HISTORY_SORT_COLUMNS.get(sort_by, 'h.return_date')
+        descending = sort_order.upper() != 'ASC'
+
+        # Walking backwards means flipping both the comparison and the order, then reversing the rows.
+        backwards = before_key is not None and after_key is None
+        key = before_key if backwards else after_key
+        scan_descending = descending != backwards
+        if key is not None:
+            comparison = '<' if scan_descending else '>'
+            where_clauses.append(f"({sort_column}, h.id) {comparison} ({self.paramstyle}, {self.paramstyle})")
+            params.extend(key)
+        direction = 'DESC' if scan_descending else 'ASC'
 
-        allowed_sort_columns = {'return_date': 'h.return_date', 'amount_due': 'h.amount_due'}
-        order_by_column = allowed_sort_columns.get(sort_by, 'h.return_date')
+        sql = f"""
+            SELECT h.id, h.rent_date, h.return_date, h.amount_due, h.payment_status, h.transaction_ref, i.name as item_name, u.username
+            FROM rental_history h
+            JOIN items i ON h.item_id = i.id
+            JOIN users u ON h.user_id = u.id
+            WHERE {' AND '.join(where_clauses)}
+            ORDER BY {sort_column} {direction}, h.id {direction}
+            LIMIT {self.paramstyle}
+        """
+        params.append(items_per_page)
+        try:
+            self.cursor.execute(sql, tuple(params))
+            records = self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error fetching payment history page: {e}", exc_info=True)
+            if self.conn: self.conn.rollback()
+            return []
+        return list(reversed(records)) if backwards else records
+
+    @staticmethod
+    def payment_history_key(record, sort_by: str = 'return_date') -> tuple:
+        """Returns the keyset pagination key for a record returned by get_payment_history_page()."""
+        column = sort_by if sort_by in DBManagement.PAYMENT_HISTORY_SORT_COLUMNS else 'return_date'
+        return (record[column], record['id'])
+
+    def get_all_payment_history_paginated(self, page: int, items_per_page: int, search_text: str | None = None, start_date: str | None = None, end_date: str | None = None, status_filter: str | None = None, sort_by: str = 'return_date', sort_order: str = 'DESC') -> tuple[list, int]:
+        """
+        Fetches all payment history records with pagination, search, and date filtering.
+        Kept for callers that page by number; new code should use get_payment_history_page().
+        """
+        if not self.cursor:
+            return [], 0
 
+        where_clauses, params = self._payment_history_filters(search_text, start_date, end_date, status_filter)
+        order_by_column = self.PAYMENT_HISTORY_SORT_COLUMNS.get(sort_by, 'h.return_date')
+        order = 'ASC' if sort_order.upper() == 'ASC' else 'DESC'
         where_sql = f"WHERE {' AND '.join(where_clauses)}"
 
-        # Get total count
-        count_sql = f"SELECT COUNT(h.id) as total_count FROM rental_history h JOIN items i ON h.item_id = i.id JOIN users u ON h.user_id = u.id {where_sql}"
-        self.cursor.execute(count_sql, tuple(params))
-        count_result = self.cursor.fetchone()
-        # FIX: Access by column name 'total_count'
-        total_count = count_result['total_count'] if count_result and count_result['total_count'] is not None else 0
+        total_count = self.count_payment_history(search_text, start_date, end_date, status_filter)
 
         # Get paginated data
         offset = (page - 1) * items_per_page
@@ -1272,7 +2015,7 @@ class DBManagement:
             JOIN items i ON h.item_id = i.id
             JOIN users u ON h.user_id = u.id
             {where_sql}
-            ORDER BY {order_by_column} {sort_order}
+            ORDER BY {order_by_column} {order}, h.id {order}
             LIMIT {self.paramstyle} OFFSET {self.paramstyle}
         """
         params.extend([items_per_page, offset])
@@ -1286,7 +2029,7 @@ class DBManagement:
         if not self.cursor:
             return 0.0
         
-        sql = "SELECT SUM(amount_due) as total FROM rental_history WHERE payment_status = 'paid'"
+        sql = "SELECT SUM(total_amount) as total FROM revenue_daily WHERE payment_status = 'paid'"
         try:
             self.cursor.execute(sql)
             result = self.cursor.fetchone()
@@ -1297,21 +2040,19 @@ class DBManagement:
             return 0.0
 
     def get_current_month_income(self) -> float:
-        """Calculates the sum of 'paid' transactions for the current month."""
+        """Calculates the sum of 'paid' transactions whose payment_date falls in the current local month."""
         if not self.cursor:
             return 0.0
 
-        # Dialect-specific SQL for getting the current month
-        if isinstance(self.conn, sqlite3.Connection): # SQLite
-            # We need to adjust for the local timezone offset to get the correct month
-            offset_hours = app_config.getint('TIME', 'utc_offset_hours', fallback=7)
-            sql = f"SELECT SUM(amount_due) as total FROM rental_history WHERE payment_status = 'paid' AND strftime('%Y-%m', payment_date, '{offset_hours} hours') = strftime('%Y-%m', 'now', 'localtime')"
-        else: # PostgreSQL
-            # PostgreSQL's NOW() is timezone-aware, so this is simpler
-            sql = "SELECT SUM(amount_due) as total FROM rental_history WHERE payment_status = 'paid' AND to_char(payment_date, 'YYYY-MM') = to_char(NOW(), 'YYYY-MM')"
+        # Compare payment_date against the UTC instant the local month started, so the
+        # (payment_status, payment_date) index is used instead of formatting every row.
+        offset = timedelta(hours=self._utc_offset_hours())
+        local_now = datetime.utcnow() + offset
+        month_start_utc = local_now.replace(day=1, hour=0, minute=0, second=0, microsecond=0) - offset
+        sql = f"SELECT SUM(amount_due) as total FROM rental_history WHERE payment_status = 'paid' AND payment_date >= {self.paramstyle}"
 
         try:
-            self.cursor.execute(sql)
+            self.cursor.execute(sql, (month_start_utc,))
             result = self.cursor.fetchone()
             return float(result['total']) if result and result['total'] is not None else 0.0
         except Exception as e:
@@ -1319,6 +2060,76 @@ class DBManagement:
             if self.conn: self.conn.rollback()
             return 0.0
 
+    # --- Revenue Rollup ---
+    # revenue_daily holds one row per (local day, payment_status, channel), so dashboard totals
+    # read a few hundred rows instead of scanning rental_history. return_item() and
+    # update_payment_status() keep it current; 'db rebuild-revenue' recomputes it from scratch.
+    # The day key is fixed when a record is written, using the writing client's TIME.utc_offset_hours,
+    # so all clients of a server must use the same offset, and the rollup must be rebuilt after the
+    # offset changes ('set time.utc_offset_hours' in the console does this) or history is edited by hand.
+    @staticmethod
+    def _revenue_channel(transaction_ref, slip_data_json) -> str:
+        """A record counts as a transfer if it has a payment reference or a verified slip, otherwise cash."""
+        return 'transfer' if transaction_ref is not None or slip_data_json is not None else 'cash'
+
+    @staticmethod
+    def _revenue_day(return_date) -> str | None:
+        """Converts a UTC return_date (datetime or DB string) to the local 'YYYY-MM-DD' rollup key."""
+        if not return_date:
+            return None
+        if not isinstance(return_date, datetime):
+            return_date = datetime.fromisoformat(str(return_date))
+        return (return_date + timedelta(hours=DBManagement._utc_offset_hours())).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _utc_offset_hours() -> int:
+        """
+        Offset of the local day boundary used by the revenue rollup and the history date filters
+        (TIME.utc_offset_hours). Changing it requires rebuild_revenue_rollup().
+        """
+        return app_config.getint('TIME', 'utc_offset_hours', fallback=7)
+
+    def _adjust_revenue(self, return_date, payment_status, channel, amount, sign: int = 1):
+        """Adds (sign=1) or removes (sign=-1) one history record's amount in revenue_daily. Does not commit."""
+        day = self._revenue_day(return_date)
+        if day is None or payment_status is None or amount is None:
+            return
+        p = self.paramstyle
+        sql = f"""
+            INSERT INTO revenue_daily (day, payment_status, channel, total_amount, record_count)
+            VALUES ({p}, {p}, {p}, {p}, {p})
+            ON CONFLICT (day, payment_status, channel) DO UPDATE SET
+                total_amount = revenue_daily.total_amount + excluded.total_amount,
+                record_count = revenue_daily.record_count + excluded.record_count
+        """
+        self.cursor.execute(sql, (day, payment_status, channel, float(amount) * sign, sign))
+
+    def rebuild_revenue_rollup(self, commit: bool = True) -> int:
+        """Recomputes revenue_daily from rental_history. Returns the number of rollup rows written."""
+        offset_hours = app_config.getint('TIME', 'utc_offset_hours', fallback=7)
+        if isinstance(self.conn, sqlite3.Connection):
+            day_sql = f"DATE(return_date, '{offset_hours:+d} hours')"
+        else: # PostgreSQL
+            day_sql = f"(return_date + INTERVAL '{offset_hours} hours')::date"
+        channel_sql = "CASE WHEN transaction_ref IS NOT NULL OR slip_data_json IS NOT NULL THEN 'transfer' ELSE 'cash' END"
+        try:
+            self.cursor.execute("DELETE FROM revenue_daily")
+            self.cursor.execute(f"""
+                INSERT INTO revenue_daily (day, payment_status, channel, total_amount, record_count)
+                SELECT {day_sql}, payment_status, {channel_sql}, SUM(amount_due), COUNT(*)
+                FROM rental_history
+                WHERE return_date IS NOT NULL AND amount_due IS NOT NULL AND payment_status IS NOT NULL
+                GROUP BY 1, 2, 3
+            """)
+            rows_written = self.cursor.rowcount
+            if commit:
+                self.conn.commit()
+            return rows_written
+        except Exception as e:
+            logger.error(f"Error rebuilding revenue rollup: {e}", exc_info=True)
+            self.conn.rollback()
+            raise
+
 
 # --- Global Instance Management ---
 
@@ -1355,8 +2166,9 @@ def _get_and_cache_instance(is_remote: bool, force_reconnect: bool = False) -> D
             logger.info("Forcing reconnection for remote instance.")
         if not _remote_instance:
             logger.info("Remote instance not found, creating a new one.")
-            _remote_instance = DBManagement()
-            _remote_instance._connect_remote()
+            instance = DBManagement()
+            instance._connect_remote_pool()
+            _remote_instance = instance
         return _remote_instance
     else: # Local
         if force_reconnect and _local_instance:
@@ -1382,10 +2194,23 @@ def get_db_instance(is_remote: bool = False) -> DBManagement:
     """
     Global function to get the active DBManagement instance for a specific mode,
     This is the primary way other modules should get a database connection.
+    The remote instance is backed by a connection pool; each calling thread
+    transparently gets its own leased connection.
     """
     logger.debug(f"Requesting DB instance. is_remote={is_remote}")
     return _get_and_cache_instance(is_remote)
 
+def release_thread_connection():
+    """
+    Returns the calling thread's pooled remote connection (if any) to the pool and
+    clears any transaction it left open on the local database.
+    Call this at the end of work done on short-lived threads such as webhook requests.
+    """
+    if _remote_instance:
+        _remote_instance.release_connection()
+    if _local_instance:
+        _local_instance.release_connection()
+
 # The global db_manager is now primarily for orchestrating startup and shutdown.
 # Other modules should prefer get_db_instance().
 db_manager = DBManagement()
@@ -0,0 +1,42 @@
+import hashlib
+import logging
+from PyQt6.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QImage
+
+logger = logging.getLogger(__name__)
+
+# ItemCard's ImageContainer is 180x180. Thumbnails are stored at twice that
+# size so they still look sharp on High-DPI screens.
+THUMBNAIL_SIZE = 180
+THUMBNAIL_SCALE = 2
+
+
+def hash_image(image_data: bytes | None) -> str | None:
+    """Returns a stable content hash for image bytes, used to detect changes and key caches."""
+    if not image_data:
+        return None
+    return hashlib.sha1(bytes(image_data)).hexdigest()
+
+
+def make_thumbnail(image_data: bytes | None, size: int = THUMBNAIL_SIZE * THUMBNAIL_SCALE) -> bytes | None:
+    """
+    Creates a small, pre-scaled copy of an image for catalog views.
+    Returns JPEG bytes (PNG if the image has transparency), or None if the data can't be decoded.
+    """
+    if not image_data:
+        return None
+    image = QImage()
+    if not image.loadFromData(bytes(image_data)):
+        logger.warning("Could not decode item image while creating thumbnail.")
+        return None
+
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+    image_format = "PNG" if image.hasAlphaChannel() else "JPG"
+    byte_array = QByteArray()
+    buffer = QBuffer(byte_array)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, image_format, 85)
+    buffer.close()
+    return byte_array.data()
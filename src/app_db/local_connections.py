@@ -0,0 +1,286 @@
+import queue
+import sqlite3
+import threading
+import logging
+from concurrent.futures import Future
+from app_db import sqlite_tuning
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on write jobs committed together by the writer thread.
+WRITER_BATCH_SIZE = 50
+
+# Per-thread state of the writer: signals held back until the running batch commits.
+_writer_state = threading.local()
+
+
+def defer_signal(signal, args: tuple) -> bool:
+    """
+    Holds a signal emission until the writer's current batch commits.
+    Returns False (caller should emit now) when not called from inside a writer batch.
+    """
+    pending = getattr(_writer_state, 'pending_signals', None)
+    if pending is None:
+        return False
+    pending.append((signal, args))
+    return True
+
+
+class WriterConnection(sqlite3.Connection):
+    """
+    Connection owned by SQLiteWriter. While a batch is running, commit() is deferred
+    to the end of the batch and rollback() only undoes the current job's savepoint,
+    so DBManagement write methods run unchanged on the writer thread.
+    """
+    in_batch = False
+
+    def commit(self):
+        if not self.in_batch:
+            super().commit()
+
+    def rollback(self):
+        if self.in_batch:
+            self.execute("ROLLBACK TO write_job")
+        else:
+            super().rollback()
+
+
+class SQLiteWriter:
+    """
+    Single thread that performs local-database writes from a queue.
+
+    Jobs queued while a batch is running are committed together in one transaction,
+    each inside its own savepoint, so a failing job is rolled back on its own and the
+    others still commit. Callers block on the returned Future until their batch commits.
+    """
+
+    def __init__(self, connect, batch_size: int = WRITER_BATCH_SIZE):
+        self._connect = connect
+        self.batch_size = batch_size
+        self.conn: WriterConnection | None = None
+        self.cursor = None
+        self.pending_settings: dict | None = None # Applied before the next batch, outside its transaction
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        future = Future()
+        if self._stopped:
+            future.set_exception(ConnectionError("The local database writer has been stopped."))
+            return future
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """Runs func on the writer thread and returns its result once the batch has committed."""
+        return self.submit(func, *args, **kwargs).result()
+
+    def stop(self, timeout: float = 5.0):
+        """Lets queued jobs finish, then closes the writer connection."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        if not self.is_writer_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.conn = self._connect(factory=WriterConnection)
+            self.cursor = self.conn.cursor()
+        except Exception as e:
+            logger.error(f"Local database writer could not open its connection: {e}", exc_info=True)
+            self._stopped = True
+            self._fail_queued(e)
+            return
+
+        stop = False
+        while not stop:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+            self._run_batch(batch)
+
+        self.conn.close()
+        self._fail_queued(ConnectionError("The local database writer has been stopped."))
+
+    def _fail_queued(self, error: Exception):
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job[0].set_exception(error)
+
+    def _run_batch(self, batch: list):
+        conn = self.conn
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            settings, self.pending_settings = self.pending_settings, None
+            if settings is not None:
+                sqlite_tuning.apply_pragmas(conn, settings)
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            logger.error(f"Local database writer could not start a transaction: {e}")
+            for future, *_ in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        outcomes = []
+        _writer_state.pending_signals = []
+        conn.in_batch = True
+        try:
+            for future, func, args, kwargs in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    outcomes.append((future, True, func(*args, **kwargs)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    outcomes.append((future, False, e))
+                conn.execute("RELEASE write_job")
+        finally:
+            conn.in_batch = False
+            pending_signals = _writer_state.pending_signals
+            _writer_state.pending_signals = None
+
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Local database writer failed to commit a batch of {len(outcomes)} job(s): {e}")
+            conn.rollback()
+            for future, _, _ in outcomes:
+                future.set_exception(e)
+            return
+
+        # Listeners reload from the database, so only tell them once the data is committed.
+        for signal, args in pending_signals:
+            signal.emit(*args)
+        for future, ok, result in outcomes:
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+
+class LocalConnectionManager:
+    """
+    Owns the connections to the local SQLite file.
+
+    Every thread (GUI, db_executor workers, webhook requests) gets its own connection,
+    opened on first use and closed once the thread has exited. Writes go through
+    `writer` (see serialized_write in db_management); the per-thread connections read.
+    """
+
+    def __init__(self, db_path: str, settings: dict, row_factory=None):
+        self.db_path = db_path
+        self.settings = settings
+        self.row_factory = row_factory
+        self._settings_version = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: dict[threading.Thread, sqlite3.Connection] = {}
+        self.writer = SQLiteWriter(self._open)
+
+    def _open(self, factory=sqlite3.Connection) -> sqlite3.Connection:
+        # Default (deferred) transactions: per-thread connections only read, so they never hold the
+        # write lock; the writer starts its batches with BEGIN IMMEDIATE itself.
+        # check_same_thread=False only so close_all()/reclaiming can close it from another thread.
+        conn = sqlite3.connect(
+            self.db_path, timeout=self.settings['busy_timeout_ms'] / 1000,
+            check_same_thread=False, factory=factory
+        )
+        sqlite_tuning.apply_pragmas(conn, self.settings)
+        conn.row_factory = self.row_factory
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the calling thread's connection, opening it on first use."""
+        if self.writer.is_writer_thread():
+            return self.writer.conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+            self._local.settings_version = self._settings_version
+            with self._lock:
+                self._close_dead_connections()
+                self._connections[threading.current_thread()] = conn
+        elif self._local.settings_version != self._settings_version:
+            # Settings changed since this connection was opened; re-apply on its own thread.
+            if not conn.in_transaction:
+                sqlite_tuning.apply_pragmas(conn, self.settings)
+                self._local.settings_version = self._settings_version
+        return conn
+
+    def cursor(self):
+        """Returns the calling thread's cursor."""
+        if self.writer.is_writer_thread():
+            return self.writer.cursor
+        self.connection()
+        return self._local.cursor
+
+    def _close_dead_connections(self):
+        """Closes connections of threads that have exited. Caller must hold the lock."""
+        for thread, conn in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[thread]
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def release(self):
+        """Rolls back anything the calling thread left uncommitted; the connection stays open for reuse."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            logger.warning("Rolling back an uncommitted local transaction left open by a finished task.")
+            conn.rollback()
+
+    def apply_settings(self, settings: dict):
+        """Switches to new tuning settings: applied now on the calling thread and the writer, lazily elsewhere."""
+        self.settings = settings
+        self._settings_version += 1
+        conn = self.connection()
+        if conn.in_transaction:
+            conn.commit() # journal_mode can't change inside a transaction
+        sqlite_tuning.apply_pragmas(conn, settings)
+        self._local.settings_version = self._settings_version
+        self.writer.pending_settings = settings
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._close_dead_connections()
+            return {'open_connections': len(self._connections) + 1, 'writer_queue': self.writer._queue.qsize()}
+
+    def close_all(self):
+        self.writer.stop()
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
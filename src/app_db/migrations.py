@@ -0,0 +1,586 @@
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock so that two kiosks connecting at the
+# same time don't both try to apply the same migration.
+_PG_MIGRATION_LOCK_KEY = 7243001
+
+# LISTEN/NOTIFY channel the change triggers (migration 12) publish on; see change_listener.
+NOTIFY_CHANNEL = 'app_data_changed'
+
+
+# --- Helpers used by migration steps ---
+
+def _existing_columns(db, dialect: str, table: str) -> set:
+    """Returns the column names of a table. Only used while a migration runs, never on a normal connect."""
+    if dialect == 'sqlite':
+        db.cursor.execute(f"PRAGMA table_info({table})")
+        return {row['name'] for row in db.cursor.fetchall()}
+    db.cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = %s",
+        (table,)
+    )
+    return {row['column_name'] for row in db.cursor.fetchall()}
+
+
+def _add_missing_columns(table: str, columns: dict):
+    """
+    Builds a migration step that adds columns only if they are missing.
+    `columns` maps column name -> {'sqlite': type_sql, 'postgresql': type_sql}.
+    Databases created before versioned migrations may already have some of them.
+    """
+    def step(db, dialect):
+        existing = _existing_columns(db, dialect, table)
+        for column, types in columns.items():
+            if column not in existing:
+                db.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {types[dialect]}")
+    return step
+
+
+def _move_legacy_item_images(db, dialect):
+    db._move_legacy_item_images()
+
+
+def _rebuild_revenue_rollup(db, dialect):
+    db.rebuild_revenue_rollup(commit=False)
+
+
+# SQLite search index: trigram FTS5 tables (substring matching also works for Thai,
+# which has no spaces between words), kept in sync by triggers.
+_SQLITE_SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(name, brand, description, content='items', content_rowid='id', tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(item_name, username, transaction_ref, tokenize='trigram')",
+    '''
+        CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+            INSERT INTO items_fts (rowid, name, brand, description) VALUES (new.id, new.name, new.brand, new.description);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, brand, description) VALUES ('delete', old.id, old.name, old.brand, old.description);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, brand, description ON items BEGIN
+            INSERT INTO items_fts (items_fts, rowid, name, brand, description) VALUES ('delete', old.id, old.name, old.brand, old.description);
+            INSERT INTO items_fts (rowid, name, brand, description) VALUES (new.id, new.name, new.brand, new.description);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS rental_history_fts_ai AFTER INSERT ON rental_history BEGIN
+            INSERT INTO history_fts (rowid, item_name, username, transaction_ref)
+            VALUES (new.id, (SELECT name FROM items WHERE id = new.item_id), (SELECT username FROM users WHERE id = new.user_id), new.transaction_ref);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS rental_history_fts_au AFTER UPDATE OF item_id, user_id, transaction_ref ON rental_history BEGIN
+            DELETE FROM history_fts WHERE rowid = old.id;
+            INSERT INTO history_fts (rowid, item_name, username, transaction_ref)
+            VALUES (new.id, (SELECT name FROM items WHERE id = new.item_id), (SELECT username FROM users WHERE id = new.user_id), new.transaction_ref);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS rental_history_fts_ad AFTER DELETE ON rental_history BEGIN
+            DELETE FROM history_fts WHERE rowid = old.id;
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS items_history_fts_au AFTER UPDATE OF name ON items WHEN new.name IS NOT old.name BEGIN
+            UPDATE history_fts SET item_name = new.name WHERE rowid IN (SELECT id FROM rental_history WHERE item_id = new.id);
+        END
+    ''',
+    '''
+        CREATE TRIGGER IF NOT EXISTS users_history_fts_au AFTER UPDATE OF username ON users WHEN new.username IS NOT old.username BEGIN
+            UPDATE history_fts SET username = new.username WHERE rowid IN (SELECT id FROM rental_history WHERE user_id = new.id);
+        END
+    ''',
+    "INSERT INTO items_fts (items_fts) VALUES ('rebuild')",
+    '''
+        INSERT INTO history_fts (rowid, item_name, username, transaction_ref)
+        SELECT h.id, i.name, u.username, h.transaction_ref
+        FROM rental_history h
+        LEFT JOIN items i ON h.item_id = i.id
+        LEFT JOIN users u ON h.user_id = u.id
+    ''',
+]
+
+# PostgreSQL search index: pg_trgm GIN indexes make ILIKE '%text%' and similarity() ranking index-assisted.
+_PG_SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_items_name_trgm ON items USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_items_brand_trgm ON items USING gin (brand gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_rental_history_transaction_ref_trgm ON rental_history USING gin (transaction_ref gin_trgm_ops)",
+]
+
+
+def _create_search_index(db, dialect):
+    """
+    Builds the search index if the database supports it. Search falls back to
+    plain LIKE queries when it doesn't (old SQLite builds, or a PostgreSQL role
+    that may not create extensions), so a failure here is logged, not raised.
+    """
+    if dialect == 'sqlite':
+        try:
+            db.cursor.execute(_SQLITE_SEARCH_SCHEMA[0])
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 trigram tokenizer is not available ({e}); search will use LIKE.")
+            return
+        for sql in _SQLITE_SEARCH_SCHEMA[1:]:
+            db.cursor.execute(sql)
+        return
+
+    db.cursor.execute("SAVEPOINT create_pg_trgm")
+    try:
+        db.cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        db.cursor.execute("RELEASE SAVEPOINT create_pg_trgm")
+    except Exception as e:
+        db.cursor.execute("ROLLBACK TO SAVEPOINT create_pg_trgm")
+        logger.warning(f"Could not enable pg_trgm ({e}); search will use unindexed ILIKE.")
+        return
+    for sql in _PG_SEARCH_INDEXES:
+        db.cursor.execute(sql)
+
+
+def _create_description_search_index(db, dialect):
+    """
+    Adds the trigram index on items.description that search_items() also matches, so every
+    branch of its ILIKE ... OR ... predicate is indexed. Skipped when pg_trgm isn't installed.
+    """
+    db.cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    if db.cursor.fetchone() is None:
+        return
+    db.cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_description_trgm ON items USING gin (description gin_trgm_ops)")
+
+
+# --- Migration list ---
+# Each migration runs once per database, in order, inside its own transaction.
+# A step is either a SQL string or a callable taking (db, dialect).
+# Never edit a migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': "Base tables",
+        'sqlite': [
+            '''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    first_name TEXT,
+                    last_name TEXT,
+                    email TEXT UNIQUE,
+                    phone TEXT,
+                    location TEXT,
+                    avatar_path BLOB,
+                    role TEXT NOT NULL DEFAULT 'user'
+                )
+            ''',
+            '''
+                CREATE TABLE IF NOT EXISTS system_settings (
+                    setting_key TEXT PRIMARY KEY NOT NULL,
+                    setting_value BLOB
+                )
+            ''',
+            '''
+                CREATE TABLE IF NOT EXISTS items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    brand TEXT,
+                    description TEXT,
+                    status TEXT NOT NULL DEFAULT 'available',
+                    image_path BLOB,
+                    current_renter_id INTEGER,
+                    price_per_minute REAL DEFAULT 0.0,
+                    price_unit TEXT DEFAULT 'ต่อวัน',
+                    renter_username TEXT,
+                    rent_date DATETIME,
+                    FOREIGN KEY(current_renter_id) REFERENCES users(id)
+                )
+            ''',
+            '''
+                CREATE TABLE IF NOT EXISTS rental_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    rent_date DATETIME NOT NULL,
+                    return_date DATETIME,
+                    initiator TEXT,
+                    FOREIGN KEY(item_id) REFERENCES items(id),
+                    FOREIGN KEY(user_id) REFERENCES users(id)
+                )
+            ''',
+        ],
+        'postgresql': [
+            """
+                CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    username VARCHAR(80) UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    first_name VARCHAR(100),
+                    last_name VARCHAR(100),
+                    email VARCHAR(120) UNIQUE,
+                    phone VARCHAR(20),
+                    location TEXT,
+                    avatar_path BYTEA, role VARCHAR(20) NOT NULL DEFAULT 'user'
+                )
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS items (
+                    id SERIAL PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    brand VARCHAR(100),
+                    description TEXT,
+                    status VARCHAR(50) NOT NULL DEFAULT 'available',
+                    image_path BYTEA,
+                    current_renter_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+                    price_per_minute NUMERIC(10, 4) DEFAULT 0.0,
+                    price_unit VARCHAR(20) DEFAULT 'ต่อวัน',
+                    renter_username VARCHAR(80),
+                    rent_date TIMESTAMP
+                )
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS rental_history (
+                    id SERIAL PRIMARY KEY,
+                    item_id INTEGER NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    rent_date TIMESTAMP NOT NULL,
+                    return_date TIMESTAMP,
+                    initiator VARCHAR(50)
+                )
+            """,
+            """
+                CREATE TABLE IF NOT EXISTS system_settings (
+                    setting_key VARCHAR(255) PRIMARY KEY NOT NULL,
+                    setting_value BYTEA
+                )
+            """,
+        ],
+    },
+    {
+        'version': 2,
+        'description': "User roles",
+        'sqlite': [_add_missing_columns('users', {
+            'role': {'sqlite': "TEXT NOT NULL DEFAULT 'user'", 'postgresql': "VARCHAR(20) NOT NULL DEFAULT 'user'"},
+        })],
+    },
+    {
+        'version': 3,
+        'description': "Payment columns on rental_history",
+        'sqlite': [_add_missing_columns('rental_history', {
+            'amount_due': {'sqlite': "REAL", 'postgresql': "NUMERIC(10, 2)"},
+            'payment_status': {'sqlite': "TEXT", 'postgresql': "VARCHAR(20)"},
+            'payment_date': {'sqlite': "DATETIME", 'postgresql': "TIMESTAMP"},
+            'transaction_ref': {'sqlite': "TEXT", 'postgresql': "VARCHAR(255)"},
+            'slip_sender': {'sqlite': "TEXT", 'postgresql': "VARCHAR(255)"},
+            'slip_receiver': {'sqlite': "TEXT", 'postgresql': "VARCHAR(255)"},
+            'slip_transacted_at': {'sqlite': "DATETIME", 'postgresql': "TIMESTAMP"},
+            'slip_data_json': {'sqlite': "TEXT", 'postgresql': "TEXT"},
+        })],
+    },
+    {
+        'version': 4,
+        'description': "Pricing model columns on items",
+        'sqlite': [_add_missing_columns('items', {
+            'price_model': {'sqlite': "TEXT DEFAULT 'per_minute'", 'postgresql': "VARCHAR(50) DEFAULT 'per_minute'"},
+            'fixed_fee': {'sqlite': "REAL DEFAULT 0.0", 'postgresql': "NUMERIC(10, 2) DEFAULT 0.0"},
+            'grace_period_minutes': {'sqlite': "INTEGER DEFAULT 0", 'postgresql': "INTEGER DEFAULT 0"},
+            'minimum_charge': {'sqlite': "REAL DEFAULT 0.0", 'postgresql': "NUMERIC(10, 2) DEFAULT 0.0"},
+        })],
+    },
+    {
+        'version': 5,
+        'description': "Separate item image store",
+        'sqlite': [
+            '''
+                CREATE TABLE IF NOT EXISTS item_images (
+                    item_id INTEGER PRIMARY KEY,
+                    thumbnail BLOB,
+                    image BLOB,
+                    image_hash TEXT,
+                    FOREIGN KEY(item_id) REFERENCES items(id) ON DELETE CASCADE
+                )
+            ''',
+            _move_legacy_item_images,
+        ],
+        'postgresql': [
+            """
+                CREATE TABLE IF NOT EXISTS item_images (
+                    item_id INTEGER PRIMARY KEY REFERENCES items(id) ON DELETE CASCADE,
+                    thumbnail BYTEA,
+                    image BYTEA,
+                    image_hash VARCHAR(40)
+                )
+            """,
+            _move_legacy_item_images,
+        ],
+    },
+    {
+        'version': 6,
+        'description': "Secondary indexes for history and item lookups",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_item_return ON rental_history (item_id, return_date)",
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_user_payment ON rental_history (user_id, payment_status)",
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_transaction_ref ON rental_history (transaction_ref)",
+            "CREATE INDEX IF NOT EXISTS idx_items_status ON items (status)",
+            "CREATE INDEX IF NOT EXISTS idx_items_current_renter ON items (current_renter_id)",
+        ],
+    },
+    {
+        'version': 7,
+        'description': "Daily revenue rollup",
+        'sqlite': [
+            '''
+                CREATE TABLE IF NOT EXISTS revenue_daily (
+                    day TEXT NOT NULL,
+                    payment_status TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    total_amount REAL NOT NULL DEFAULT 0.0,
+                    record_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, payment_status, channel)
+                )
+            ''',
+            _rebuild_revenue_rollup,
+        ],
+        'postgresql': [
+            """
+                CREATE TABLE IF NOT EXISTS revenue_daily (
+                    day DATE NOT NULL,
+                    payment_status VARCHAR(20) NOT NULL,
+                    channel VARCHAR(20) NOT NULL,
+                    total_amount NUMERIC(12, 2) NOT NULL DEFAULT 0.0,
+                    record_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, payment_status, channel)
+                )
+            """,
+            _rebuild_revenue_rollup,
+        ],
+    },
+    {
+        'version': 8,
+        'description': "Keyset pagination index for payment history",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_return_date_id ON rental_history (return_date, id)",
+        ],
+    },
+    {
+        'version': 9,
+        'description': "Full-text search index for items and payment history",
+        'sqlite': [_create_search_index],
+    },
+    {
+        'version': 10,
+        'description': "Version counter for system settings cache invalidation",
+        'sqlite': [
+            "CREATE TABLE IF NOT EXISTS settings_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL DEFAULT 0)",
+            "INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)",
+            '''
+                CREATE TRIGGER IF NOT EXISTS system_settings_version_ai AFTER INSERT ON system_settings BEGIN
+                    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+                END
+            ''',
+            '''
+                CREATE TRIGGER IF NOT EXISTS system_settings_version_au AFTER UPDATE ON system_settings BEGIN
+                    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+                END
+            ''',
+            '''
+                CREATE TRIGGER IF NOT EXISTS system_settings_version_ad AFTER DELETE ON system_settings BEGIN
+                    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+                END
+            ''',
+        ],
+        'postgresql': [
+            "CREATE TABLE IF NOT EXISTS settings_version (id INTEGER PRIMARY KEY CHECK (id = 1), version BIGINT NOT NULL DEFAULT 0)",
+            "INSERT INTO settings_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING",
+            """
+                CREATE OR REPLACE FUNCTION bump_settings_version() RETURNS trigger AS $$
+                BEGIN
+                    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS system_settings_version_bump ON system_settings",
+            # Statement-level, so a bulk upsert of many keys bumps the version once.
+            """
+                CREATE TRIGGER system_settings_version_bump
+                AFTER INSERT OR UPDATE OR DELETE ON system_settings
+                FOR EACH STATEMENT EXECUTE PROCEDURE bump_settings_version()
+            """,
+        ],
+    },
+    {
+        'version': 11,
+        'description': "Latest-renter index for item detail",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_item_rent_date ON rental_history (item_id, rent_date)",
+        ],
+    },
+    {
+        'version': 12,
+        'description': "Change notifications for other clients",
+        # Only the server is shared between clients; a local database has nobody to notify.
+        'sqlite': [],
+        'postgresql': [
+            # Payload is JSON with the table, operation and row id, plus what listeners need to pick
+            # the right signal (item status, history user). Kept small: NOTIFY payloads max out at 8000 bytes.
+            f"""
+                CREATE OR REPLACE FUNCTION app_notify_change() RETURNS trigger AS $$
+                DECLARE
+                    rec record;
+                    payload jsonb;
+                BEGIN
+                    IF TG_OP = 'DELETE' THEN
+                        rec := OLD;
+                    ELSE
+                        rec := NEW;
+                    END IF;
+                    payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'id', rec.id);
+                    IF TG_TABLE_NAME = 'items' THEN
+                        payload := payload || jsonb_build_object('status', rec.status);
+                    ELSIF TG_TABLE_NAME = 'rental_history' THEN
+                        payload := payload || jsonb_build_object('item_id', rec.item_id, 'user_id', rec.user_id);
+                    END IF;
+                    PERFORM pg_notify('{NOTIFY_CHANNEL}', payload::text);
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """,
+            *[
+                step
+                for table in ('items', 'rental_history', 'users')
+                for step in (
+                    f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}",
+                    f"""
+                        CREATE TRIGGER {table}_notify_change
+                        AFTER INSERT OR UPDATE OR DELETE ON {table}
+                        FOR EACH ROW EXECUTE PROCEDURE app_notify_change()
+                    """,
+                )
+            ],
+        ],
+    },
+    {
+        'version': 13,
+        'description': "Paging indexes for the admin item grid",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_items_name_id ON items (name, id)",
+            "CREATE INDEX IF NOT EXISTS idx_items_status_name_id ON items (status, name, id)",
+        ],
+    },
+    {
+        'version': 14,
+        'description': "Keyset index for a user's payment history",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_user_return_date_id ON rental_history (user_id, return_date, id)",
+        ],
+    },
+    {
+        'version': 15,
+        'description': "Index for this month's income by payment date",
+        'sqlite': [
+            "CREATE INDEX IF NOT EXISTS idx_rental_history_status_payment_date ON rental_history (payment_status, payment_date)",
+        ],
+    },
+    {
+        'version': 16,
+        'description': "Trigram index on item descriptions for search",
+        'sqlite': [], # items_fts already indexes description
+        'postgresql': [_create_description_search_index],
+    },
+]
+
+# Migrations without a 'postgresql' entry use the same steps on both backends.
+for _migration in MIGRATIONS:
+    _migration.setdefault('postgresql', _migration['sqlite'])
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1]['version']
+
+
+def get_schema_version(db) -> int | None:
+    """
+    Returns the schema version recorded in the database, or None if the
+    schema_version table does not exist yet (a database that predates
+    versioned migrations, or a brand-new one).
+    """
+    try:
+        db.cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+        row = db.cursor.fetchone()
+        return (row['version'] if row else None) or 0
+    except Exception:
+        db.conn.rollback()
+        return None
+
+
+def _table_exists(db, dialect: str, table: str) -> bool:
+    if dialect == 'sqlite':
+        db.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    else:
+        db.cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (f"public.{table}",))
+        row = db.cursor.fetchone()
+        return bool(row and row['present'])
+    return db.cursor.fetchone() is not None
+
+
+def apply_migrations(db, dialect: str, create_schema: bool = True) -> int:
+    """
+    Brings the database schema up to LATEST_SCHEMA_VERSION.
+
+    On an up-to-date database this costs a single query. If `create_schema`
+    is False, an empty database is left untouched (used for the remote server,
+    whose tables are only created by an explicit 'db init-server').
+    Returns the number of migrations applied.
+    """
+    current = get_schema_version(db)
+    if current == LATEST_SCHEMA_VERSION:
+        return 0
+
+    if current is None:
+        if not create_schema and not _table_exists(db, dialect, 'items'):
+            logger.info("Database has no tables yet; skipping migrations until it is initialized.")
+            return 0
+        if dialect == 'sqlite':
+            db.cursor.execute(
+                "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+            )
+        else:
+            db.cursor.execute(
+                "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP DEFAULT NOW())"
+            )
+        db.conn.commit()
+        current = 0
+
+    applied = 0
+    for migration in MIGRATIONS:
+        version = migration['version']
+        if version <= current:
+            continue
+        try:
+            if dialect == 'postgresql':
+                # Serialize migrations across clients, then re-check in case another client just applied it.
+                db.cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_PG_MIGRATION_LOCK_KEY,))
+                db.cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+                if db.cursor.fetchone():
+                    db.conn.commit()
+                    continue
+
+            logger.info(f"Applying schema migration {version}: {migration['description']}")
+            for step in migration[dialect]:
+                if callable(step):
+                    step(db, dialect)
+                else:
+                    db.cursor.execute(step)
+            db.cursor.execute(
+                f"INSERT INTO schema_version (version, description) VALUES ({db.paramstyle}, {db.paramstyle})",
+                (version, migration['description'])
+            )
+            db.conn.commit()
+            applied += 1
+        except Exception as e:
+            logger.error(f"Schema migration {version} failed: {e}", exc_info=True)
+            db.conn.rollback()
+            raise
+    return applied
@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from app_config import app_config, APP_ROOT
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('app_db.slow_queries')
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket catches everything slower.
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+# Frames in these modules are skipped when deciding which method issued a query.
+_INTERNAL_MODULES = {__name__}
+_DB_MODULES = {'app_db.db_management', 'app_db.migrations'}
+# Generic DBManagement helpers whose queries are attributed to the method that called them.
+_PASSTHROUGH_FUNCTIONS = {'cursor', '_call_server_function'}
+
+
+def _estimate_row_bytes(row) -> int:
+    """Rough size of a fetched row: real length for text/binary values, 8 bytes for anything else."""
+    values = row.values() if hasattr(row, 'values') else row
+    size = 0
+    for value in values:
+        if isinstance(value, (bytes, bytearray, memoryview, str)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+class _MethodStats:
+    __slots__ = ('calls', 'total_time', 'max_time', 'rows', 'bytes', 'slow', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.slow = 0
+        self.histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+
+    def percentile_ms(self, fraction: float) -> float:
+        """Approximates a latency percentile as the upper bound of the bucket that contains it."""
+        target = self.calls * fraction
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.histogram):
+            seen += count
+            if seen >= target and count:
+                return bound if bound != float('inf') else self.max_time * 1000
+        return 0.0
+
+
+class QueryStats:
+    """
+    Opt-in query instrumentation for DBManagement.
+
+    When enabled, DBManagement.cursor returns an InstrumentedCursor that times every
+    execute()/fetch*() call and attributes it to the DBManagement method that issued it.
+    Queries slower than slow_query_ms are written to slow_queries.log.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods: dict[str, _MethodStats] = {}
+        self._local = threading.local() # Method that issued the calling thread's last execute
+        self._file_handler = None
+        self.enabled = False
+        self.slow_query_ms = 200
+        self.configure(
+            enabled=app_config.get('DATABASE', 'query_stats_enabled', fallback='False').lower() == 'true',
+            slow_query_ms=app_config.getint('DATABASE', 'slow_query_ms', fallback=200),
+        )
+
+    def configure(self, enabled: bool | None = None, slow_query_ms: int | None = None):
+        if slow_query_ms is not None:
+            self.slow_query_ms = slow_query_ms
+        if enabled is not None:
+            self.enabled = enabled
+            if enabled:
+                self._attach_slow_query_log()
+
+    def _attach_slow_query_log(self):
+        if self._file_handler is not None:
+            return
+        try:
+            self._file_handler = RotatingFileHandler(
+                os.path.join(APP_ROOT, 'slow_queries.log'), maxBytes=1024 * 1024, backupCount=3, encoding='utf-8'
+            )
+            self._file_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            slow_query_logger.addHandler(self._file_handler)
+            slow_query_logger.setLevel(logging.INFO)
+        except OSError as e:
+            logger.warning(f"Could not open slow query log: {e}")
+
+    @staticmethod
+    def _calling_method() -> str:
+        """Name of the nearest DBManagement/migration function on the stack, else the nearest caller."""
+        frame = sys._getframe(2)
+        first_outside = None
+        while frame is not None:
+            module = frame.f_globals.get('__name__')
+            if module not in _INTERNAL_MODULES:
+                if module in _DB_MODULES and frame.f_code.co_name not in _PASSTHROUGH_FUNCTIONS:
+                    return frame.f_code.co_name
+                if first_outside is None:
+                    first_outside = f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        return first_outside or '<unknown>'
+
+    def _entry(self, method: str) -> _MethodStats:
+        entry = self._methods.get(method)
+        if entry is None:
+            entry = self._methods[method] = _MethodStats()
+        return entry
+
+    def record_execute(self, method: str, elapsed: float, sql: str):
+        self._local.method = method
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            entry = self._entry(method)
+            entry.calls += 1
+            entry.total_time += elapsed
+            entry.max_time = max(entry.max_time, elapsed)
+            for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    entry.histogram[i] += 1
+                    break
+            if elapsed_ms >= self.slow_query_ms:
+                entry.slow += 1
+        if elapsed_ms >= self.slow_query_ms:
+            slow_query_logger.info(f"{elapsed_ms:8.1f} ms  {method}  {' '.join(str(sql).split())}")
+
+    def record_fetch(self, elapsed: float, rows: int, size: int):
+        method = getattr(self._local, 'method', '<unknown>')
+        with self._lock:
+            entry = self._entry(method)
+            entry.total_time += elapsed
+            entry.rows += rows
+            entry.bytes += size
+
+    def snapshot(self) -> list[dict]:
+        """Returns per-method stats, slowest total time first."""
+        with self._lock:
+            rows = [
+                {
+                    'method': method,
+                    'calls': entry.calls,
+                    'total_ms': entry.total_time * 1000,
+                    'avg_ms': (entry.total_time * 1000 / entry.calls) if entry.calls else 0.0,
+                    'p95_ms': entry.percentile_ms(0.95),
+                    'max_ms': entry.max_time * 1000,
+                    'rows': entry.rows,
+                    'bytes': entry.bytes,
+                    'slow': entry.slow,
+                }
+                for method, entry in self._methods.items()
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+
+class InstrumentedCursor:
+    """Wraps a DB-API cursor, reporting execute/fetch timings to a QueryStats instance."""
+    __slots__ = ('_cursor', '_stats')
+
+    def __init__(self, cursor, stats: QueryStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, *args, **kwargs):
+        method = self._stats._calling_method()
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *args, **kwargs)
+        finally:
+            self._stats.record_execute(method, time.perf_counter() - start, sql)
+
+    def executemany(self, sql, *args, **kwargs):
+        method = self._stats._calling_method()
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, *args, **kwargs)
+        finally:
+            self._stats.record_execute(method, time.perf_counter() - start, sql)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._stats.record_fetch(time.perf_counter() - start, 1 if row is not None else 0, _estimate_row_bytes(row) if row is not None else 0)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.record_fetch(time.perf_counter() - start, len(rows), sum(_estimate_row_bytes(row) for row in rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._stats.record_fetch(time.perf_counter() - start, len(rows), sum(_estimate_row_bytes(row) for row in rows))
+        return rows
+
+
+# Shared instance; enable with DATABASE.query_stats_enabled or the console's 'db stats on'.
+query_stats = QueryStats()
@@ -0,0 +1,127 @@
+from collections.abc import Mapping
+
+
+class Record:
+    """
+    Compact row type for SQLite results.
+
+    Each query shape (tuple of column names) gets its own subclass holding the shared
+    column -> index map, so a row is just the tuple sqlite3 already built plus one small
+    object, instead of a fresh dict with its own key table. Rows still behave like the
+    dicts callers are used to: row['col'], row.get('col'), 'col' in row, dict(row), **row.
+    Integer indexes (row[0]) are also accepted, like sqlite3.Row.
+
+    Assigning a column copies the values into a list on first write; assigning a new key
+    (e.g. item_data['latest_renter']) stores it in a small per-row overflow dict.
+    """
+    __slots__ = ('_values', '_extra')
+    _fields: tuple = ()
+    _index: dict = {}
+
+    def __init__(self, values):
+        self._values = values
+        self._extra = None
+
+    def __getitem__(self, key):
+        index = self._index.get(key) if isinstance(key, str) else None
+        if index is not None:
+            return self._values[index]
+        if isinstance(key, int):
+            return self._values[key]
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        index = self._index.get(key)
+        if index is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if not isinstance(self._values, list):
+            self._values = list(self._values)
+        self._values[index] = value
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        if index is not None:
+            return self._values[index]
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        return key in self._index or (self._extra is not None and key in self._extra)
+
+    def keys(self):
+        if self._extra is None:
+            return self._fields
+        return self._fields + tuple(self._extra)
+
+    def values(self):
+        if self._extra is None:
+            return tuple(self._values)
+        return tuple(self._values) + tuple(self._extra.values())
+
+    def items(self):
+        return tuple(zip(self.keys(), self.values()))
+
+    def __iter__(self):
+        # Iterates column names, like the dicts rows used to be.
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._fields) + (len(self._extra) if self._extra is not None else 0)
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, Mapping)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+Mapping.register(Record)
+
+# {column names: Record subclass}. Shapes are fixed by the app's queries, so this stays small.
+_record_classes: dict[tuple, type] = {}
+
+
+def record_class(fields: tuple) -> type:
+    """Returns the Record subclass for a tuple of column names, creating it on first use."""
+    cls = _record_classes.get(fields)
+    if cls is None:
+        cls = type('Record', (Record,), {
+            '__slots__': (),
+            '_fields': fields,
+            '_index': {name: i for i, name in enumerate(fields)},
+        })
+        _record_classes[fields] = cls
+    return cls
+
+
+# (description, Record class) of the most recent result set seen by record_factory.
+# Replaced as a whole tuple, so concurrent threads at worst cause a cache miss.
+_last_shape = (None, None)
+
+
+def record_factory(cursor, row):
+    """
+    sqlite3 row_factory producing Record rows.
+
+    sqlite3 keeps the same description tuple for every row of a result set, so the
+    Record class is looked up once per query and reused for the following rows.
+    """
+    global _last_shape
+    description = cursor.description
+    shape = _last_shape
+    if shape[0] is not description:
+        shape = _last_shape = (description, record_class(tuple(col[0] for col in description)))
+    return shape[1](row)
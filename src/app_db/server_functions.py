@@ -0,0 +1,162 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever a function below changes signature or behaviour. Clients only use the
+# bundle if the installed version matches theirs, otherwise they keep using plain SQL.
+BUNDLE_VERSION = 1
+
+# PostgreSQL functions performing the rental workflow server-side, so each step is one
+# round trip instead of several. They mirror DBManagement.rent_item(), return_item(),
+# confirm_return() and _write_payment_status() (including the revenue_daily rollup);
+# times and the rollup's UTC offset are passed in by the client so both paths agree.
+FUNCTIONS = [
+    f"""
+        CREATE OR REPLACE FUNCTION app_functions_version() RETURNS integer
+        LANGUAGE sql IMMUTABLE AS $$ SELECT {BUNDLE_VERSION} $$
+    """,
+    """
+        CREATE OR REPLACE FUNCTION app_adjust_revenue(
+            p_return_date timestamp, p_status varchar, p_channel varchar, p_amount numeric,
+            p_sign integer, p_utc_offset_hours integer
+        ) RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF p_return_date IS NULL OR p_status IS NULL OR p_amount IS NULL THEN
+                RETURN;
+            END IF;
+            INSERT INTO revenue_daily (day, payment_status, channel, total_amount, record_count)
+            VALUES ((p_return_date + make_interval(hours => p_utc_offset_hours))::date, p_status, p_channel, p_amount * p_sign, p_sign)
+            ON CONFLICT (day, payment_status, channel) DO UPDATE SET
+                total_amount = revenue_daily.total_amount + excluded.total_amount,
+                record_count = revenue_daily.record_count + excluded.record_count;
+        END $$
+    """,
+    """
+        CREATE OR REPLACE FUNCTION app_rent_item(p_item_id integer, p_user_id integer, p_now timestamp)
+        RETURNS integer LANGUAGE plpgsql AS $$
+        DECLARE
+            v_history_id integer;
+        BEGIN
+            UPDATE items SET status = 'rented', current_renter_id = u.id, renter_username = u.username, rent_date = p_now
+            FROM users u
+            WHERE u.id = p_user_id AND items.id = p_item_id AND items.status = 'available';
+            IF NOT FOUND THEN
+                RETURN NULL; -- Not available anymore, or no such user
+            END IF;
+            INSERT INTO rental_history (item_id, user_id, rent_date) VALUES (p_item_id, p_user_id, p_now)
+            RETURNING id INTO v_history_id;
+            RETURN v_history_id;
+        END $$
+    """,
+    """
+        CREATE OR REPLACE FUNCTION app_return_item(
+            p_item_id integer, p_amount_due numeric, p_transaction_ref varchar, p_initiator varchar,
+            p_slip_sender varchar, p_slip_receiver varchar, p_slip_transacted_at timestamp,
+            p_auto_confirm boolean, p_now timestamp, p_utc_offset_hours integer
+        ) RETURNS integer LANGUAGE plpgsql AS $$
+        DECLARE
+            v_status varchar := CASE WHEN p_amount_due > 0 THEN 'pending' ELSE 'paid' END;
+            v_history_id integer;
+            v_updated integer;
+        BEGIN
+            IF p_auto_confirm THEN
+                UPDATE items SET status = 'available', current_renter_id = NULL, renter_username = NULL, rent_date = NULL
+                WHERE id = p_item_id AND status = 'rented';
+            ELSE
+                UPDATE items SET status = 'pending_return' WHERE id = p_item_id AND status = 'rented';
+            END IF;
+            IF NOT FOUND THEN
+                RETURN NULL; -- Already returned by another client
+            END IF;
+
+            WITH updated AS (
+                UPDATE rental_history SET
+                    return_date = p_now, initiator = p_initiator, amount_due = p_amount_due, payment_status = v_status,
+                    transaction_ref = p_transaction_ref, slip_sender = p_slip_sender, slip_receiver = p_slip_receiver,
+                    slip_transacted_at = p_slip_transacted_at
+                WHERE item_id = p_item_id AND return_date IS NULL
+                RETURNING id
+            )
+            SELECT min(id), count(*) INTO v_history_id, v_updated FROM updated;
+            IF v_updated = 0 THEN
+                RETURN -1;
+            END IF;
+            PERFORM app_adjust_revenue(
+                p_now, v_status, CASE WHEN p_transaction_ref IS NOT NULL THEN 'transfer' ELSE 'cash' END,
+                p_amount_due, 1, p_utc_offset_hours
+            );
+            RETURN v_history_id;
+        END $$
+    """,
+    """
+        CREATE OR REPLACE FUNCTION app_confirm_return(p_item_id integer)
+        RETURNS boolean LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE items SET status = 'available', current_renter_id = NULL, renter_username = NULL, rent_date = NULL
+            WHERE id = p_item_id AND status = 'pending_return';
+            RETURN FOUND;
+        END $$
+    """,
+    """
+        CREATE OR REPLACE FUNCTION app_set_payment_status(
+            p_history_id integer, p_status varchar, p_now timestamp,
+            p_slip_sender varchar, p_slip_receiver varchar, p_slip_transacted_at timestamp, p_slip_data_json text,
+            p_utc_offset_hours integer
+        ) RETURNS integer LANGUAGE plpgsql AS $$
+        DECLARE
+            old_record rental_history%ROWTYPE;
+            v_old_channel varchar;
+            v_new_channel varchar;
+        BEGIN
+            SELECT * INTO old_record FROM rental_history WHERE id = p_history_id FOR UPDATE;
+            IF NOT FOUND THEN
+                RETURN NULL;
+            END IF;
+
+            -- Slip columns are only overwritten when a slip comes with this change.
+            UPDATE rental_history SET
+                payment_status = p_status,
+                payment_date = CASE WHEN p_status = 'paid' THEN p_now END,
+                slip_sender = CASE WHEN p_slip_data_json IS NULL THEN slip_sender ELSE p_slip_sender END,
+                slip_receiver = CASE WHEN p_slip_data_json IS NULL THEN slip_receiver ELSE p_slip_receiver END,
+                slip_transacted_at = CASE WHEN p_slip_data_json IS NULL THEN slip_transacted_at ELSE p_slip_transacted_at END,
+                slip_data_json = COALESCE(p_slip_data_json, slip_data_json)
+            WHERE id = p_history_id;
+
+            v_old_channel := CASE WHEN old_record.transaction_ref IS NOT NULL OR old_record.slip_data_json IS NOT NULL THEN 'transfer' ELSE 'cash' END;
+            v_new_channel := CASE WHEN old_record.transaction_ref IS NOT NULL OR COALESCE(p_slip_data_json, old_record.slip_data_json) IS NOT NULL THEN 'transfer' ELSE 'cash' END;
+            IF old_record.payment_status IS DISTINCT FROM p_status OR v_old_channel <> v_new_channel THEN
+                PERFORM app_adjust_revenue(old_record.return_date, old_record.payment_status, v_old_channel, old_record.amount_due, -1, p_utc_offset_hours);
+                PERFORM app_adjust_revenue(old_record.return_date, p_status, v_new_channel, old_record.amount_due, 1, p_utc_offset_hours);
+            END IF;
+            RETURN old_record.user_id;
+        END $$
+    """,
+]
+
+
+def installed_version(db) -> int | None:
+    """Returns the version of the function bundle on the server, or None if it is not installed."""
+    db.cursor.execute("SELECT to_regproc('app_functions_version') IS NOT NULL AS installed")
+    if not db.cursor.fetchone()['installed']:
+        return None
+    db.cursor.execute("SELECT app_functions_version() AS version")
+    return db.cursor.fetchone()['version']
+
+
+def install_functions(db) -> bool:
+    """
+    Creates or replaces the function bundle in one transaction. The bundle is optional:
+    if the server refuses (e.g. the user may not create functions), this logs a warning,
+    rolls back and returns False, and clients keep using plain SQL.
+    """
+    try:
+        for statement in FUNCTIONS:
+            db.cursor.execute(statement)
+        db.conn.commit()
+    except Exception as e:
+        db.conn.rollback()
+        logger.warning(f"Could not install the server-side rental functions, plain SQL will be used: {e}")
+        return False
+    logger.info(f"Installed server-side rental functions (version {BUNDLE_VERSION}).")
+    return True
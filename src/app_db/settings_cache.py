@@ -0,0 +1,83 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NOT_CACHED = object()
+
+
+class SettingsCache:
+    """
+    In-process cache of the system_settings table for one DBManagement instance.
+
+    The whole table is loaded in one query and values are decrypted on first use.
+    At most every `refresh_seconds` a read checks the settings_version counter
+    (bumped by triggers on system_settings, see migration 10) and reloads only if
+    another client changed something. Local writes call invalidate().
+    """
+
+    def __init__(self, db, refresh_seconds: float = 5.0):
+        self._db = db
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._raw: dict[str, bytes] | None = None
+        self._decrypted: dict[str, str | None] = {}
+        self._version: int | None = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._raw = None
+            self._decrypted = {}
+
+    def _current_version(self) -> int | None:
+        """Reads the settings_version counter; None if the table doesn't exist yet."""
+        try:
+            self._db.cursor.execute("SELECT version FROM settings_version WHERE id = 1")
+            row = self._db.cursor.fetchone()
+            return row['version'] if row else None
+        except Exception:
+            # Schema older than migration 10; fall back to reloading every refresh_seconds.
+            self._db.conn.rollback()
+            return None
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._raw is not None and now - self._checked_at < self.refresh_seconds:
+            return
+        version = self._current_version()
+        if self._raw is not None and version is not None and version == self._version:
+            self._checked_at = now
+            return
+        self._db.cursor.execute("SELECT setting_key, setting_value FROM system_settings")
+        # psycopg2 returns BYTEA as a memoryview, which must be converted to bytes.
+        self._raw = {
+            row['setting_key']: bytes(row['setting_value'])
+            for row in self._db.cursor.fetchall() if row['setting_value'] is not None
+        }
+        self._decrypted = {}
+        self._version = version
+        self._checked_at = now
+        logger.debug(f"Loaded {len(self._raw)} system setting(s) into cache (version {version}).")
+
+    def get_raw(self, key: str) -> bytes | None:
+        with self._lock:
+            self._ensure_fresh()
+            return self._raw.get(key)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._raw)
+
+    def get_decrypted(self, key: str, decrypt) -> str | None:
+        """Returns decrypt(raw value) for key, memoized until the next reload."""
+        with self._lock:
+            self._ensure_fresh()
+            value = self._decrypted.get(key, _NOT_CACHED)
+            if value is _NOT_CACHED:
+                raw = self._raw.get(key)
+                value = decrypt(raw) if raw else None
+                self._decrypted[key] = value
+            return value
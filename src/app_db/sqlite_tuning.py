@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE')
+SYNCHRONOUS_MODES = ('NORMAL', 'FULL', 'OFF')
+
+# [LOCAL_DATABASE] defaults. WAL lets the webhook thread read while the GUI writes,
+# and with synchronous=NORMAL a commit no longer waits for an fsync of the main file.
+DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size_mb': 32,
+    'mmap_size_mb': 128,
+    'busy_timeout_ms': 5000,
+    'maintenance_interval_minutes': 30,
+    'analyze_interval_hours': 24,
+}
+
+# A checkpoint that leaves more WAL pages than this behind is retried as TRUNCATE
+# so the -wal file does not keep growing on a kiosk that is never idle.
+WAL_TRUNCATE_PAGES = 10000
+
+
+def read_local_settings(config) -> dict:
+    """Reads the SQLite tuning options from [LOCAL_DATABASE], falling back to DEFAULTS for missing or invalid values."""
+    settings = {}
+    for option, default in DEFAULTS.items():
+        if isinstance(default, int):
+            try:
+                value = config.getint('LOCAL_DATABASE', option, fallback=default)
+            except (TypeError, ValueError):
+                value = default
+            settings[option] = max(0, value)
+        else:
+            value = str(config.get('LOCAL_DATABASE', option, fallback=default)).strip().upper()
+            allowed = JOURNAL_MODES if option == 'journal_mode' else SYNCHRONOUS_MODES
+            settings[option] = value if value in allowed else default
+    return settings
+
+
+def apply_pragmas(conn: sqlite3.Connection, settings: dict) -> str:
+    """
+    Applies connection-level pragmas. Returns the journal mode SQLite actually uses,
+    which can differ from the requested one (e.g. WAL is refused on some network drives).
+    """
+    conn.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}")
+    try:
+        journal_mode = conn.execute(f"PRAGMA journal_mode = {settings['journal_mode']}").fetchone()[0]
+    except sqlite3.OperationalError as e:
+        # Leaving WAL needs the only connection to the file; it then applies on the next start.
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        logger.warning(f"Could not switch to journal_mode={settings['journal_mode']} while the database is in use ({e}).")
+    if str(journal_mode).upper() != settings['journal_mode']:
+        logger.warning(f"SQLite refused journal_mode={settings['journal_mode']}, using {journal_mode}.")
+    conn.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    # Negative cache_size is in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = {-int(settings['cache_size_mb']) * 1024}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return str(journal_mode).upper()
+
+
+class SQLiteMaintenance:
+    """
+    Background checkpoint/ANALYZE routine for the local database.
+
+    Runs on its own daemon thread with its own short-lived connection, so it never
+    touches a transaction owned by the GUI or webhook threads.
+    Every interval it runs a PASSIVE WAL checkpoint (TRUNCATE if the WAL grew large)
+    and, every analyze_interval_hours, ANALYZE with a row limit followed by PRAGMA optimize.
+    """
+
+    def __init__(self, db_path: str, settings: dict):
+        self.db_path = db_path
+        self.settings = settings
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._run_lock = threading.Lock()
+        self._last_analyze = 0.0
+        self.last_result: dict = {}
+
+    def start(self):
+        interval = self.settings['maintenance_interval_minutes']
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sqlite-maintenance', daemon=True)
+        self._thread.start()
+        logger.info(f"SQLite maintenance scheduled every {interval} minute(s).")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        interval_seconds = self.settings['maintenance_interval_minutes'] * 60
+        while not self._stop_event.wait(interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"SQLite maintenance failed: {e}")
+
+    def run_once(self, force_analyze: bool = False) -> dict:
+        """Runs one maintenance pass and returns what it did. Safe to call from any thread."""
+        with self._run_lock:
+            result = {'checkpoint': None, 'analyzed': False}
+            conn = sqlite3.connect(self.db_path, timeout=self.settings['busy_timeout_ms'] / 1000)
+            try:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.settings['busy_timeout_ms'])}")
+                if conn.execute("PRAGMA journal_mode").fetchone()[0].upper() == 'WAL':
+                    # Returns (busy, WAL pages, pages checkpointed).
+                    checkpoint = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+                    if checkpoint[1] > WAL_TRUNCATE_PAGES:
+                        checkpoint = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                    result['checkpoint'] = tuple(checkpoint)
+
+                analyze_due = time.monotonic() - self._last_analyze >= self.settings['analyze_interval_hours'] * 3600
+                if force_analyze or not self._last_analyze or analyze_due:
+                    # analysis_limit keeps ANALYZE cheap on big history tables.
+                    conn.execute("PRAGMA analysis_limit = 1000")
+                    conn.execute("ANALYZE")
+                    conn.execute("PRAGMA optimize")
+                    conn.commit()
+                    self._last_analyze = time.monotonic()
+                    result['analyzed'] = True
+            finally:
+                conn.close()
+            self.last_result = result
+            logger.debug(f"SQLite maintenance pass: {result}")
+            return result
@@ -1,17 +1,18 @@
 from PyQt6.QtWidgets import (
-    QVBoxLayout, QHBoxLayout, QPushButton, QTableWidget, QScrollArea, QWidget,
-    QTableWidgetItem, QHeaderView, QAbstractItemView, QLabel, QFileDialog, QMenu, QScroller, QSpacerItem, QGraphicsDropShadowEffect
+    QVBoxLayout, QHBoxLayout, QPushButton, QTableView, QWidget,
+    QHeaderView, QAbstractItemView, QLabel, QFileDialog, QMenu, QScroller, QSpacerItem
 )
 import qtawesome as qta
 from app.base_dialog import BaseDialog
+from app.lazy_table_model import LazyTableModel, utc_datetime_formatter
 from app_db.db_management import db_manager, get_db_instance, db_signals
+from app_db.db_executor import db_executor
 from app_payment.payment_dialog import PaymentDialog
 from app_payment.receipt_dialog import ReceiptDialog
 from app_config import app_config
-from theme import PALETTES
+from theme import theme
 from PyQt6.QtCore import QDateTime, Qt, QSize
 from PyQt6.QtGui import QColor
-import math
 
 class ClickableTotalWidget(QWidget):
     """A custom widget to show a clickable total summary."""
@@ -48,6 +49,26 @@ class ClickableTotalWidget(QWidget):
         self.prompt_label.setVisible(not self.is_expanded)
         super().mousePressEvent(event)
 
+class PaymentHistoryTableModel(LazyTableModel):
+    """Payment history rows with the status column drawn as a colored badge."""
+    STATUS_COLUMN = 3
+    STATUS_TEXTS = {'pending': 'ค้างชำระ', 'paid': 'ชำระแล้ว', 'waived': 'ยกเว้นค่าบริการ'}
+    STATUS_COLORS = {'pending': 'warning', 'paid': 'success', 'waived': 'disabled_text'} # Keys into the theme palette
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and index.column() == self.STATUS_COLUMN:
+            record = self.record(index.row())
+            if record is not None:
+                if role == Qt.ItemDataRole.BackgroundRole:
+                    color_key = self.STATUS_COLORS.get(record['payment_status'])
+                    return QColor(theme.current_colors[color_key]) if color_key else None
+                if role == Qt.ItemDataRole.ForegroundRole:
+                    return QColor('white') if record['payment_status'] in self.STATUS_COLORS else None
+                if role == Qt.ItemDataRole.TextAlignmentRole:
+                    return Qt.AlignmentFlag.AlignCenter
+        return super().data(index, role)
+
+
 class PaymentHistoryDialog(BaseDialog):
     def __init__(self, user_data, is_admin_view=False, parent=None, db_instance=None):
         super().__init__(parent)
@@ -59,9 +80,7 @@ class PaymentHistoryDialog(BaseDialog):
         self.setWindowTitle(f"ประวัติการชำระเงิน: {self.user_data['username']}")
         self.setMinimumSize(800, 600)
         self.current_filter = None  # None means show all
-        self.items_per_page = 15
-        self.current_page = 1
-        self.all_history_records = []
+        self.format_return_date = utc_datetime_formatter()
 
         layout = QVBoxLayout(self)
 
@@ -82,45 +101,41 @@ class PaymentHistoryDialog(BaseDialog):
         layout.addLayout(toolbar_layout)
 
         # --- History Table ---
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_content = QWidget()
-        self.scroll_content.setObjectName("HistoryScrollContent") # Name for styling
-        self.list_layout = QVBoxLayout(self.scroll_content)
-        self.list_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.scroll_area.setWidget(self.scroll_content)
+        # Rows are streamed from the database while the table scrolls, so long histories open at once.
+        self.history_model = PaymentHistoryTableModel([
+            ("รายการ", lambda record: record['item_name']),
+            ("วันที่คืน", lambda record: self.format_return_date(record['return_date'])),
+            ("ยอดชำระ (บาท)", lambda record: f"{record['amount_due']:,.2f}"),
+            ("สถานะ", lambda record: PaymentHistoryTableModel.STATUS_TEXTS.get(record['payment_status'], 'ไม่ทราบ')),
+        ], parent=self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.history_table.verticalHeader().setVisible(False)
+        self.history_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.history_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.history_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.history_table.doubleClicked.connect(self.handle_double_click)
+        if self.is_admin_view:
+            self.history_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+            self.history_table.customContextMenuRequested.connect(self.show_admin_context_menu)
         # เปิดใช้งาน Smooth Scrolling สำหรับ Touch
-        QScroller.grabGesture(self.scroll_area.viewport(), QScroller.ScrollerGestureType.LeftMouseButtonGesture)
+        QScroller.grabGesture(self.history_table.viewport(), QScroller.ScrollerGestureType.LeftMouseButtonGesture)
 
-        layout.addWidget(self.scroll_area)
+        layout.addWidget(self.history_table)
 
         # --- Bottom Layout ---
         bottom_layout = QHBoxLayout()
-        self.info_label = QLabel("คลิกที่ปุ่มในแต่ละรายการเพื่อดำเนินการ")
-
-        # --- Pagination Controls ---
-        self.pagination_widget = QWidget()
-        pagination_layout = QHBoxLayout(self.pagination_widget)
-        pagination_layout.setContentsMargins(0,0,0,0)
-        pagination_layout.setSpacing(10)
-        self.prev_page_button = QPushButton(" < ก่อนหน้า")
-        self.prev_page_button.setFixedWidth(100)
-        self.prev_page_button.clicked.connect(self.prev_page)
-        self.page_label = QLabel("Page 1/1")
-        self.next_page_button = QPushButton("ถัดไป > ")
-        self.next_page_button.setFixedWidth(100)
-        self.next_page_button.clicked.connect(self.next_page)
-        pagination_layout.addWidget(self.prev_page_button)
-        pagination_layout.addWidget(self.page_label)
-        pagination_layout.addWidget(self.next_page_button)
-        self.pagination_widget.setVisible(False) # Hide by default
+        info_text = "ดับเบิลคลิกที่รายการ 'ค้างชำระ' เพื่อชำระเงิน หรือดูใบเสร็จสำหรับรายการอื่น"
+        if self.is_admin_view:
+            info_text += " (คลิกขวาสำหรับเมนูผู้ดูแล)"
+        self.info_label = QLabel(info_text)
 
         close_button = QPushButton("ปิด")
         close_button.clicked.connect(self.accept)
         
         bottom_layout.addWidget(self.info_label)
         bottom_layout.addStretch()
-        bottom_layout.addWidget(self.pagination_widget)
         bottom_layout.addWidget(close_button)
         layout.addLayout(bottom_layout)
 
@@ -132,170 +147,40 @@ class PaymentHistoryDialog(BaseDialog):
         db_signals.payment_status_updated.connect(self.on_global_payment_status_updated)
 
     def load_history(self):
-        self.all_history_records = self.db_instance.get_payment_history_for_user(self.user_data['id'])
-        total_amount = sum(record.get('amount_due', 0.0) for record in self.all_history_records)
-        self.total_summary_widget.set_total(total_amount)
-
-        self.current_page = 1
-        self.update_pagination_controls()
-        self.display_current_page()
-
-    def display_current_page(self):
-        """Clears the list and displays only the items for the current page."""
-        # --- FIX: Recreate the scroll content widget and layout to prevent any artifacts ---
-        # This is a more robust way to clear the list than iterating and deleting.
-        if self.scroll_area.widget():
-            self.scroll_area.widget().deleteLater()
-
-        self.scroll_content = QWidget()
-        self.scroll_content.setObjectName("HistoryScrollContent")
-        self.list_layout = QVBoxLayout(self.scroll_content)
-        self.list_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.scroll_area.setWidget(self.scroll_content)
-        # Filter records based on the current filter
-        filtered_records = [
-            record for record in self.all_history_records 
-            if not self.current_filter or record['payment_status'] == self.current_filter
-        ]
-
-        start_index = (self.current_page - 1) * self.items_per_page
-        end_index = start_index + self.items_per_page
-        records_to_display = filtered_records[start_index:end_index]
-
-        for record in records_to_display:
-            # Apply filter
-            if self.current_filter and record['payment_status'] != self.current_filter:
-                continue
-
-            card = self.create_history_card(record)
-            self.list_layout.addWidget(card)
-
-        self.list_layout.addStretch()
-
-    def update_pagination_controls(self):
-        """Updates the visibility and state of pagination buttons and label."""
-        filtered_records = [
-            record for record in self.all_history_records 
-            if not self.current_filter or record['payment_status'] == self.current_filter
-        ]
-        total_items = len(filtered_records)
-        total_pages = math.ceil(total_items / self.items_per_page)
-
-        if total_pages > 1:
-            self.pagination_widget.setVisible(True)
-            self.page_label.setText(f"หน้า {self.current_page} / {total_pages}")
-            self.prev_page_button.setEnabled(self.current_page > 1)
-            self.next_page_button.setEnabled(self.current_page < total_pages)
-        else:
-            self.pagination_widget.setVisible(False)
-
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.update_pagination_controls()
-            self.display_current_page()
-
-    def next_page(self):
-        self.current_page += 1
-        self.update_pagination_controls()
-        self.display_current_page()
-
-    def create_history_card(self, record):
-        current_theme_name = app_config.get('UI', 'theme', fallback='light')
-        palette = PALETTES.get(current_theme_name, PALETTES['light'])
-
-        card = QWidget()
-        card.setObjectName("HistoryCard")
-        card.setStyleSheet(f"""
-            #HistoryCard {{
-                background-color: {palette['base']};
-                border: 1px solid {palette['disabled_text']};
-                border-radius: 8px;
-            }}
-            #HistoryCard:hover {{
-                border-color: {palette['highlight']};
-            }}
-        """)
-        shadow = QGraphicsDropShadowEffect()
-        shadow.setBlurRadius(15)
-        shadow.setColor(QColor(0, 0, 0, 80))
-        shadow.setOffset(0, 2)
-        card.setGraphicsEffect(shadow)
-
-        main_layout = QHBoxLayout(card)
-        main_layout.setContentsMargins(15, 12, 15, 12)
-        main_layout.setSpacing(15)
-
-        # Left side: Details
-        details_layout = QVBoxLayout()
-        details_layout.setSpacing(4)
-        item_name_label = QLabel(f"<b>{record['item_name']}</b>")
-        item_name_label.setStyleSheet("font-size: 12pt;")
-        return_date_label = QLabel(f"วันที่คืน: {self.format_datetime(record['return_date'])}")
-        return_date_label.setStyleSheet(f"color: {palette['disabled_text']};")
-        amount_label = QLabel(f"ยอดชำระ: <b style='color:{palette['info']};'>{record['amount_due']:,.2f}</b> บาท")
-        details_layout.addWidget(item_name_label)
-        details_layout.addWidget(return_date_label)
-        details_layout.addWidget(amount_label)
-        details_layout.addStretch()
-
-        # Right side: Status and Actions
-        actions_layout = QHBoxLayout()
-        actions_layout.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-        actions_layout.setSpacing(10)
-
-        status_map = {
-            'pending': ('ค้างชำระ', palette['warning']),
-            'paid': ('ชำระแล้ว', palette['success']),
-            'waived': ('ยกเว้นค่าบริการ', palette['disabled_text'])
-        }
-        status_text, status_color = status_map.get(record['payment_status'], ('ไม่ทราบ', '#000000'))
-        status_label = QLabel(status_text)
-        status_label.setStyleSheet(f"""
-            background-color: {status_color};
-            color: white;
-            font-weight: bold;
-            padding: 4px 12px;
-            border-radius: 13px;
-            min-width: 90px;
-        """)
-        status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        actions_layout.addWidget(status_label)
-
+        """Shows the history for the current filter from the top; more rows are fetched while scrolling."""
+        db_instance = self.db_instance
+        user_id = self.user_data['id']
+        status_filter = self.current_filter
+        self.format_return_date = utc_datetime_formatter()
+        self.history_model.set_query(
+            lambda after_key, limit: db_instance.get_payment_history_page(limit, after_key=after_key, status_filter=status_filter, user_id=user_id),
+            db_instance.payment_history_key
+        )
+        self.history_table.scrollToTop()
+        self.load_total()
+
+    def refresh_history(self):
+        """Reloads the rows already shown, and the total, after a payment status changed."""
+        self.history_model.reload()
+        self.load_total()
+
+    def load_total(self):
+        db_executor.submit(self.db_instance.get_payment_total_for_user, self.user_data['id'],
+                           key=f"payment_history.total.{id(self)}", on_result=self.total_summary_widget.set_total)
+
+    def handle_double_click(self, index):
+        """Opens the payment dialog for a pending record, or the receipt for any other."""
+        record = self.history_model.record(index.row())
+        if not record:
+            return
         if record['payment_status'] == 'pending':
-            pay_button = QPushButton(" ชำระเงิน")
-            pay_button.setIcon(qta.icon('fa5s.qrcode', color='white'))
-            pay_button.clicked.connect(lambda checked=False, r=record: self.open_payment_dialog(r))
-            actions_layout.addWidget(pay_button)
+            self.open_payment_dialog(record)
         else:
-            receipt_button = QPushButton(" ดูใบเสร็จ")
-            receipt_button.setIcon(qta.icon('fa5s.receipt', color='white'))
-            receipt_button.clicked.connect(lambda checked=False, r=record: self.open_receipt_dialog(r))
-            actions_layout.addWidget(receipt_button)
-
-        # Add admin menu button if in admin view
-        if self.is_admin_view:
-            # --- FIX: Get theme color for the icon ---
-            icon_color = PALETTES[current_theme_name]['text']
-            admin_menu_button = QPushButton()
-            admin_menu_button.setIcon(qta.icon('fa5s.ellipsis-v', color=icon_color))
-            admin_menu_button.setFixedSize(28, 28)
-            admin_menu_button.setObjectName("IconButton")
-            admin_menu_button.setToolTip("เมนูสำหรับผู้ดูแล")
-            admin_menu_button.clicked.connect(lambda checked=False, r=record, b=admin_menu_button: self.show_admin_card_menu(r, b)) # type: ignore
-            actions_layout.addWidget(admin_menu_button)
-
-        main_layout.addLayout(details_layout, 3) # Give more space to details
-        main_layout.addLayout(actions_layout)
-
-        return card
+            self.open_receipt_dialog(record)
 
     def get_selected_history_record(self):
-        # This method is now only used by admin functions, which are not implemented in the new card view.
-        # It needs to be adapted if admin actions are to be performed on cards.
-        # For now, we can return None.
-        return None
+        selected_rows = self.history_table.selectionModel().selectedRows()
+        return self.history_model.record(selected_rows[0].row()) if selected_rows else None
 
     def open_receipt_dialog(self, record):
         receipt_dialog = ReceiptDialog(
@@ -329,7 +214,7 @@ class PaymentHistoryDialog(BaseDialog):
         self.db_instance.update_payment_status(record['id'], 'paid', slip_data=slip_data)
         CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บันทึกการชำระเงินเรียบร้อยแล้ว")
         
-        self.load_history() # Refresh the history list
+        self.refresh_history() # Refresh the history list
         # Notify main window to update its UI, ensuring parent() exists and has the method.
         if self.parent() and hasattr(self.parent(), 'check_pending_payments'):
             self.parent().check_pending_payments()
@@ -340,10 +225,10 @@ class PaymentHistoryDialog(BaseDialog):
         self.update_theme()
 
     def update_theme(self):
-        """Reloads history to apply new theme colors and updates toolbar icons."""
+        """Repaints the table with the new theme colors and updates toolbar icons."""
         self.filter_button.setIcon(qta.icon('fa5s.filter', color='white'))
-        # Reloading the history will recreate the cards with the new theme colors
-        self.load_history()
+        # Status colors are looked up while painting, so a repaint is enough
+        self.history_table.viewport().update()
 
     def show_filter_menu(self):
         statuses = {
@@ -360,17 +245,18 @@ class PaymentHistoryDialog(BaseDialog):
 
     def apply_filter(self, status: str | None):
         self.current_filter = status
-        self.current_page = 1 # Reset to first page when filter changes
-        self.update_pagination_controls()
-        self.display_current_page()
+        self.load_history() # Start from the top when the filter changes
         if status:
             self.filter_button.setText(f" คัดกรอง: {status.capitalize()}")
         else:
             self.filter_button.setText(" คัดกรอง")
 
-    def show_admin_card_menu(self, record, button):
-        """Shows a context menu for admin actions on a specific card."""
-        menu = QMenu(button)
+    def show_admin_context_menu(self, pos):
+        """Shows a context menu for admin actions on the right-clicked record."""
+        record = self.history_model.record(self.history_table.indexAt(pos).row())
+        if not record:
+            return
+        menu = QMenu(self.history_table)
 
         if record['payment_status'] == 'pending':
             verify_action = menu.addAction(qta.icon('fa5s.search-dollar'), "ตรวจสอบด้วย API")
@@ -385,7 +271,7 @@ class PaymentHistoryDialog(BaseDialog):
             revert_action = menu.addAction(qta.icon('fa5s.undo'), "เปลี่ยนสถานะเป็น 'ค้างชำระ'")
             revert_action.triggered.connect(lambda: self.update_status(record, 'pending'))
 
-        menu.exec(button.mapToGlobal(button.rect().bottomLeft()))
+        menu.exec(self.history_table.viewport().mapToGlobal(pos))
 
     def verify_with_api_as_admin(self, record):
         from app.custom_message_box import CustomMessageBox
@@ -401,7 +287,7 @@ class PaymentHistoryDialog(BaseDialog):
         if is_paid:
             self.db_instance.update_payment_status(record['id'], 'paid')
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"ตรวจสอบพบการชำระเงินสำหรับ {transaction_ref} เรียบร้อยแล้ว")
-            self.load_history()
+            self.refresh_history()
         else:
             CustomMessageBox.show(self, CustomMessageBox.Warning, "ยังไม่ชำระ", f"ไม่พบข้อมูลการชำระเงินสำหรับ {transaction_ref}: {message}")
 
@@ -418,19 +304,7 @@ class PaymentHistoryDialog(BaseDialog):
         
         if reply == CustomMessageBox.Yes:
             self.db_instance.update_payment_status(record['id'], new_status)
-            self.load_history()
-
-    def format_datetime(self, dt_obj, default_text="-") -> str:
-        if not dt_obj:
-            return default_text
-        dt = QDateTime.fromString(str(dt_obj).split('.')[0], "yyyy-MM-dd HH:mm:ss")
-        if not dt.isValid():
-            return default_text # Return default if parsing fails
-        dt.setTimeSpec(Qt.TimeSpec.UTC)
-        offset_hours = app_config.getint('TIME', 'utc_offset_hours', fallback=7)
-        offset_seconds = offset_hours * 3600
-        local_dt = dt.toOffsetFromUtc(offset_seconds)
-        return local_dt.toString("yyyy-MM-dd HH:mm:ss")
+            self.refresh_history()
 
     def calculate_duration_string(self, rent_date_str, return_date_str) -> str:
         """Calculates a human-readable duration string from two datetime strings."""
@@ -452,7 +326,7 @@ class PaymentHistoryDialog(BaseDialog):
     def on_global_payment_status_updated(self, user_id: int):
         """Slot to refresh the history list when a payment status changes globally."""
         if self.user_data and self.user_data['id'] == user_id:
-            self.load_history()
+            self.refresh_history()
 
     def closeEvent(self, event):
         """Disconnect signals when the dialog is closed."""
@@ -482,7 +356,7 @@ class PaymentHistoryDialog(BaseDialog):
     def on_global_payment_status_updated(self, user_id: int):
         """Slot to refresh the history list when a payment status changes globally."""
         if self.user_data and self.user_data['id'] == user_id:
-            self.load_history()
+            self.refresh_history()
 
     def closeEvent(self, event):
         """Disconnect signals when the dialog is closed."""
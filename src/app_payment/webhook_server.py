@@ -1,6 +1,6 @@
 from flask import Flask, request, jsonify
 from threading import Thread
-from app_db.db_management import get_db_instance
+from app_db.db_management import get_db_instance, release_thread_connection
 import logging
 from app_config import app_config
 import requests
@@ -54,6 +54,11 @@ class WebhookServer:
         self.server_started = False
         self.daemon = daemon
 
+        @self.app.teardown_request
+        def release_db_connection(exc=None):
+            """Return this request thread's pooled DB connection so other threads can use it."""
+            release_thread_connection()
+
         def shutdown_server():
             """Function to shutdown the Flask server."""
             func = request.environ.get('werkzeug.server.shutdown')
@@ -9,7 +9,9 @@ import qtawesome as qta
 import os
 import importlib.metadata
 from app.base_dialog import BaseDialog
-from app_db.db_management import db_manager
+from app_db.db_management import db_manager, get_db_instance
+from app_db.db_executor import db_executor
+from app_db import sqlite_tuning
 from app_config import app_config, AppConfig
 from app.custom_message_box import CustomMessageBox
 from app.utils import get_icon
@@ -327,6 +329,63 @@ class LocalSettingsDialog(BaseDialog):
         local_db_layout.addLayout(db_button_layout)
         main_layout.addWidget(local_db_group)
 
+        # --- Local DB Performance (SQLite pragmas & maintenance) ---
+        tuning = sqlite_tuning.read_local_settings(self.config)
+        tuning_group = QGroupBox("ประสิทธิภาพฐานข้อมูล Local")
+        tuning_layout = QVBoxLayout(tuning_group)
+        tuning_form = QFormLayout()
+        tuning_form.setLabelAlignment(Qt.AlignmentFlag.AlignRight)
+
+        self.local_journal_mode_combo = QComboBox()
+        self.local_journal_mode_combo.addItems(sqlite_tuning.JOURNAL_MODES)
+        self.local_journal_mode_combo.setCurrentText(tuning['journal_mode'])
+        self.local_journal_mode_combo.setToolTip("WAL (แนะนำ) ให้การอ่านและการเขียนทำงานพร้อมกันได้ ลดปัญหา 'database is locked'")
+        tuning_form.addRow("Journal mode:", self.local_journal_mode_combo)
+
+        self.local_synchronous_combo = QComboBox()
+        self.local_synchronous_combo.addItems(sqlite_tuning.SYNCHRONOUS_MODES)
+        self.local_synchronous_combo.setCurrentText(tuning['synchronous'])
+        self.local_synchronous_combo.setToolTip("NORMAL ปลอดภัยเมื่อใช้ WAL และเร็วกว่า FULL")
+        tuning_form.addRow("Synchronous:", self.local_synchronous_combo)
+
+        self.local_cache_size_spinbox = QSpinBox()
+        self.local_cache_size_spinbox.setRange(2, 1024)
+        self.local_cache_size_spinbox.setSuffix(" MB")
+        self.local_cache_size_spinbox.setValue(tuning['cache_size_mb'])
+        tuning_form.addRow("Cache size:", self.local_cache_size_spinbox)
+
+        self.local_mmap_size_spinbox = QSpinBox()
+        self.local_mmap_size_spinbox.setRange(0, 4096)
+        self.local_mmap_size_spinbox.setSuffix(" MB")
+        self.local_mmap_size_spinbox.setSpecialValueText("ปิดใช้งาน")
+        self.local_mmap_size_spinbox.setValue(tuning['mmap_size_mb'])
+        tuning_form.addRow("Memory-mapped I/O:", self.local_mmap_size_spinbox)
+
+        self.local_busy_timeout_spinbox = QSpinBox()
+        self.local_busy_timeout_spinbox.setRange(0, 60000)
+        self.local_busy_timeout_spinbox.setSingleStep(500)
+        self.local_busy_timeout_spinbox.setSuffix(" ms")
+        self.local_busy_timeout_spinbox.setValue(tuning['busy_timeout_ms'])
+        self.local_busy_timeout_spinbox.setToolTip("เวลารอสูงสุดเมื่อฐานข้อมูลถูกล็อกโดยการเขียนอื่น ก่อนจะแจ้งข้อผิดพลาด")
+        tuning_form.addRow("Busy timeout:", self.local_busy_timeout_spinbox)
+
+        self.local_maintenance_spinbox = QSpinBox()
+        self.local_maintenance_spinbox.setRange(0, 1440)
+        self.local_maintenance_spinbox.setSuffix(" นาที")
+        self.local_maintenance_spinbox.setSpecialValueText("ปิดใช้งาน")
+        self.local_maintenance_spinbox.setValue(tuning['maintenance_interval_minutes'])
+        self.local_maintenance_spinbox.setToolTip("ความถี่ในการทำ WAL checkpoint และ ANALYZE เบื้องหลัง (0 = ปิดใช้งาน)")
+        tuning_form.addRow("บำรุงรักษาทุก:", self.local_maintenance_spinbox)
+        tuning_layout.addLayout(tuning_form)
+
+        maintenance_button_layout = QHBoxLayout()
+        self.run_maintenance_button = QPushButton("บำรุงรักษาตอนนี้")
+        self.run_maintenance_button.clicked.connect(self._run_local_maintenance)
+        maintenance_button_layout.addStretch()
+        maintenance_button_layout.addWidget(self.run_maintenance_button)
+        tuning_layout.addLayout(maintenance_button_layout)
+        main_layout.addWidget(tuning_group)
+
         # --- Server DB Settings ---
         server_db_group = QGroupBox("ฐานข้อมูลเซิร์ฟเวอร์")
         # Use a QVBoxLayout to hold both the form and the test button
@@ -1079,6 +1138,25 @@ class LocalSettingsDialog(BaseDialog):
             except Exception as e:
                 CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", f"ไม่สามารถสร้างหรือเริ่มต้นฐานข้อมูลใหม่ได้: {e}")
 
+    def _run_local_maintenance(self):
+        """Runs a WAL checkpoint and ANALYZE on the local database in the background."""
+        self.run_maintenance_button.setEnabled(False)
+        db_executor.submit(
+            get_db_instance(is_remote=False).run_local_maintenance,
+            key='local_settings.maintenance',
+            on_result=self._on_local_maintenance_done,
+            on_error=lambda e: self._on_local_maintenance_done(None),
+        )
+
+    def _on_local_maintenance_done(self, result):
+        self.run_maintenance_button.setEnabled(True)
+        if result is None:
+            CustomMessageBox.show(self, CustomMessageBox.Warning, "ไม่สำเร็จ", "ไม่สามารถบำรุงรักษาฐานข้อมูล Local ได้ (ดูรายละเอียดใน log)")
+            return
+        checkpoint = result.get('checkpoint')
+        details = f"WAL checkpoint: {checkpoint[2]}/{checkpoint[1]} หน้า" if checkpoint else "ไม่ได้ใช้ WAL"
+        CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", f"บำรุงรักษาฐานข้อมูล Local เรียบร้อยแล้ว\n{details}")
+
     def _save_current_tab_settings(self):
         """Saves the settings for the currently active tab."""
         current_index = self.tab_widget.currentIndex()
@@ -1153,6 +1231,13 @@ class LocalSettingsDialog(BaseDialog):
             old_local_db_path = self._get_setting('LOCAL_DATABASE', 'path', fallback='')
             new_local_db_path = sanitize_input(self.local_db_path_input.text().strip().replace('\\', '/'))
             self.config.update_config('LOCAL_DATABASE', 'path', new_local_db_path)
+            # --- Save Local DB Performance Settings ---
+            self.config.update_config('LOCAL_DATABASE', 'journal_mode', self.local_journal_mode_combo.currentText())
+            self.config.update_config('LOCAL_DATABASE', 'synchronous', self.local_synchronous_combo.currentText())
+            self.config.update_config('LOCAL_DATABASE', 'cache_size_mb', str(self.local_cache_size_spinbox.value()))
+            self.config.update_config('LOCAL_DATABASE', 'mmap_size_mb', str(self.local_mmap_size_spinbox.value()))
+            self.config.update_config('LOCAL_DATABASE', 'busy_timeout_ms', str(self.local_busy_timeout_spinbox.value()))
+            self.config.update_config('LOCAL_DATABASE', 'maintenance_interval_minutes', str(self.local_maintenance_spinbox.value()))
             # --- Save Server DB Settings ---
             self.config.update_config('DATABASE', 'enabled', str(self.db_mode_button.isChecked()))
             self.config.update_config('DATABASE', 'db_type', self.db_type_combo.currentText())
@@ -1182,7 +1267,8 @@ class LocalSettingsDialog(BaseDialog):
                 else:
                     # If the path hasn't changed, just switch the mode if necessary.
                     # The main window will handle refreshing items if the mode changes. This is now handled by the toggle button itself.
-                    pass
+                    # Performance settings apply to the open local connection straight away.
+                    get_db_instance(is_remote=False).apply_local_settings()
     
         except Exception as e:
             CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", f"ไม่สามารถบันทึกการตั้งค่าการเชื่อมต่อได้: {e}")
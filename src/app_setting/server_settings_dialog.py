@@ -23,6 +23,8 @@ import os
 import importlib.metadata
 
 INPUT_FIELD_MIN_WIDTH = 300
+# Server setting sections shown in this dialog; loaded together when it opens.
+SERVER_SETTING_SECTIONS = ['WORKFLOW', 'PAYMENT', 'PROMPTPAY', 'SCB_API', 'KTB_API', 'SLIP_VERIFICATION', 'SLIPOK_QR_GEN', 'SMTP']
 
 class SystemSettingsDialog(BaseDialog):
     """
@@ -39,6 +41,8 @@ class SystemSettingsDialog(BaseDialog):
         self.scb_handler = SCBApiHandler(config_source=self.db_instance)
         self.ktb_handler = KTBApiHandler(config_source=self.db_instance)
         self.slipok_handler = SlipOKApiHandler(debug=True, config_source=self.db_instance)
+        # Every setting shown by the tabs, fetched in one round trip (see _get_setting).
+        self.server_settings = self._load_server_settings()
 
         # --- Dynamic Sizing ---
         # Get screen geometry to set a maximum height
@@ -824,20 +828,22 @@ class SystemSettingsDialog(BaseDialog):
 
             self.super_admin_avatar_label.setPixmap(cropped_pixmap.scaled(self.super_admin_avatar_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
 
-    def _get_setting(self, section, option, fallback=''):
-        """
-        Helper to get setting from the correct source based on mode.
-        - Hardware/UI settings always come from the local .ini file.
-        - Other settings come from the server DB if in remote mode, otherwise from local .ini.
-        """
-        # This dialog is for server settings, so it should always use the provided db_instance.
+    def _load_server_settings(self) -> dict:
+        """Fetches all settings edited by this dialog with a single get_system_settings() call."""
         if self.db_instance and self.db_instance.conn:
             try:
-                value = self.db_instance.get_system_setting(f"{section.upper()}.{option.lower()}")
-                return value if value is not None else fallback
+                return self.db_instance.get_system_settings(SERVER_SETTING_SECTIONS)
             except Exception as e:
-                print(f"Warning: Could not retrieve setting {section}.{option} from DB: {e}")
-        return fallback
+                print(f"Warning: Could not retrieve server settings from DB: {e}")
+        return {}
+
+    def _get_setting(self, section, option, fallback=''):
+        """
+        Helper to get a server setting.
+        Values come from the bulk fetch made when the dialog opened (self.server_settings).
+        """
+        value = self.server_settings.get(f"{section.upper()}.{option.lower()}")
+        return value if value is not None else fallback
 
     def _get_setting_old(self, section, option, fallback=''):
         """
@@ -854,14 +860,16 @@ class SystemSettingsDialog(BaseDialog):
                 print(f"Warning: Could not retrieve setting {section}.{option} from DB: {e}")
         return fallback
 
-    def _save_setting(self, section, option, value) -> tuple[bool, str]:
-        """Helper to save setting to the correct destination."""
-        # In server mode, always save to the server DB.
-        # The set_system_setting method in DBManagement handles the encryption internally,
-        # so we just need to call it with the correct key and value.
+    def _save_settings(self, settings_to_save) -> tuple[bool, str]:
+        """Saves a list of (section, option, value) to the server DB in one transaction."""
+        # The set_system_settings method in DBManagement handles the encryption internally,
+        # so we just need to call it with the correct keys and values.
         if self.db_instance and self.db_instance.conn:
-            setting_key = f"{section.upper()}.{option.lower()}"
-            return self.db_instance.set_system_setting(setting_key, str(value))
+            mapping = {f"{section.upper()}.{option.lower()}": str(value) for section, option, value in settings_to_save}
+            success, message = self.db_instance.set_system_settings(mapping)
+            if success:
+                self.server_settings.update(mapping)
+            return success, message
         return False, "No database instance available."
 
     def _save_super_admin_settings(self):
@@ -1010,19 +1018,12 @@ class SystemSettingsDialog(BaseDialog):
             ('SLIPOK_QR_GEN', 'api_token', self.slipok_qr_gen_api_token_input.text().strip()),
         ]
 
-        all_successful = True
-        error_messages = []
-
-        for section, option, value in settings_to_save:
-            success, message = self._save_setting(section, option, value)
-            if not success:
-                all_successful = False
-                error_messages.append(message)
+        all_successful, message = self._save_settings(settings_to_save)
 
         if all_successful:
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บันทึกการตั้งค่าการชำระเงินเรียบร้อยแล้ว")
         else:
-            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่าบางรายการได้:\n" + "\n".join(error_messages))
+            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่าบางรายการได้:\n" + message)
 
     def _save_smtp_settings(self):
         """Saves only the SMTP settings."""
@@ -1034,33 +1035,20 @@ class SystemSettingsDialog(BaseDialog):
             ('SMTP', 'password', self.smtp_password_input.text().strip()),
         ]
 
-        all_successful = True
-        error_messages = []
-
-        for section, option, value in settings_to_save:
-            success, message = self._save_setting(section, option, value)
-            if not success:
-                all_successful = False
-                error_messages.append(message)
+        all_successful, message = self._save_settings(settings_to_save)
 
         if all_successful:
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บันทึกการตั้งค่า SMTP เรียบร้อยแล้ว")
         else:
-            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่า SMTP ได้:\n" + "\n".join(error_messages))
+            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่า SMTP ได้:\n" + message)
 
     def _save_workflow_settings(self):
         """Saves only the Workflow settings."""
         settings_to_save = [
             ('WORKFLOW', 'auto_confirm_return', str(self.auto_confirm_return_checkbox.isChecked())),
         ]
-        all_successful = True
-        error_messages = []
-        for section, option, value in settings_to_save:
-            success, message = self._save_setting(section, option, value)
-            if not success:
-                all_successful = False
-                error_messages.append(message)
+        all_successful, message = self._save_settings(settings_to_save)
         if all_successful:
             CustomMessageBox.show(self, CustomMessageBox.Information, "สำเร็จ", "บันทึกการตั้งค่าการทำงานของระบบเรียบร้อยแล้ว")
         else:
-            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่าได้:\n" + "\n".join(error_messages))
\ No newline at end of file
+            CustomMessageBox.show(self, CustomMessageBox.Critical, "ผิดพลาด", "ไม่สามารถบันทึกการตั้งค่าได้:\n" + message)
\ No newline at end of file
@@ -56,6 +56,7 @@ if __name__ == "__main__":
     from app.utils import get_icon
     from build_utils import create_icon_if_needed
     from app_db.db_management import initialize_databases, db_manager
+    from app_db.db_executor import db_executor
     from app_payment.webhook_server import WebhookServer
 
     # 3. --- NEW: Automatically create .ico file if it doesn't exist ---
@@ -82,6 +83,7 @@ if __name__ == "__main__":
     # เชื่อมต่อ Signal aboutToQuit ของ QApplication เข้ากับฟังก์ชัน shutdown
     # เพื่อให้แน่ใจว่าทรัพยากรต่างๆ จะถูกปิดอย่างถูกต้องก่อนที่โปรแกรมจะจบการทำงาน
     app.aboutToQuit.connect(main_win.shutdown_child_windows)  # ปิด Console ก่อน
+    app.aboutToQuit.connect(db_executor.shutdown)  # รอให้ query เบื้องหลังทำงานเสร็จ
     app.aboutToQuit.connect(db_manager.close_all_connections)  # ปิดการเชื่อมต่อ DB
     app.aboutToQuit.connect(webhook_server.shutdown)  # ปิด Webhook Server
     app.setQuitOnLastWindowClosed(True) # โปรแกรมจะปิดเมื่อหน้าต่างสุดท้ายถูกปิด
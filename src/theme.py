@@ -197,6 +197,10 @@ STYLESHEETS = {
         #GridContainer {{
             background-color: {window};
         }}
+        QListView#ItemCatalogView {{
+            background-color: {window};
+            border: none;
+        }}
         /* ItemCard specific styles */
         ItemCard {{
             background-color: {base};
@@ -324,6 +328,8 @@ STYLESHEETS = {
 
 _font_family = 'Segoe UI' # ค่าเริ่มต้นของ Font
 _font_loaded = False
+# Colors of the applied theme, for widgets that paint themselves instead of using the stylesheet.
+current_colors = PALETTES['light']
 
 def _load_fonts_if_needed():
     """Loads custom fonts from the 'fonts' directory on first call."""
@@ -360,13 +366,14 @@ def _load_fonts_if_needed():
 
 def apply_theme(app: QApplication, theme_name: str):
     """Applies the selected theme to the application."""
-    
+    global current_colors
     _load_fonts_if_needed() # โหลด Font (ถ้ายังไม่ได้โหลด)
     default_font = QFont(_font_family)
     app.setFont(default_font) # Set default for widgets not covered by stylesheet
 
     palette = QPalette()
     colors = PALETTES[theme_name]
+    current_colors = colors
     
     # Set palette colors
     palette.setColor(QPalette.ColorRole.Window, QColor(colors["window"]))